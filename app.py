@@ -2,12 +2,15 @@ import streamlit as st
 import pandas as pd
 import requests
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from typing import Optional, Tuple, List, Dict, Any
-from msal import ConfidentialClientApplication
-import unicodedata
-import io
-from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any, Callable
+from pipeline import (
+    Config, UploadTrace, get_metrics_registry, OneDriveManager, FolderIndex, RowHashIndex, DataValidator,
+    SpreadsheetReader, ParseCache, SpreadsheetWriter, serialize_dataframe, process_upload_file,
+    DatasetConsolidator, load_published, consolidate_upload, DatasetDiff, UploadJobRunner
+)
 
 # === CONFIGURAÇÃO DE LOGGING ===
 logging.basicConfig(level=logging.INFO)
@@ -299,301 +302,39 @@ def load_custom_css():
     </style>
     """, unsafe_allow_html=True)
 
-# === CONSTANTES ===
-class Config:
-    PASTA = "Documentos Compartilhados/LimparAuto/FontedeDados"
-    MAX_FILE_SIZE_MB = 50
-    SUPPORTED_FORMATS = ["xlsx", "xls", "csv"]
-    GRAPH_API_BASE = "https://graph.microsoft.com/v1.0"
-    
-    # Schema das colunas esperadas por arquivo (baseado na planilha real)
-    EXPECTED_SCHEMAS = {
-        "faturamento_geral_consolidado_limpar.xlsx": [
-            "GRUPO", "CONCESSIONÁRIA", "LOJA", "MARCA", "UF", "MUNICIPIO", "RESPONSÁVEL", "CNPJ",
-            "VLR_DUTOS", "QTD_DUTOS", "TOTAL_DUTOS", "VLR_FREIO", "QTD_FREIO", "TOTAL_FREIO",
-            "VLR_SANITIZANTE", "QTD_SANITIZANTE", "TOTAL_SANITIZANTE", "VLR_VERNIZ", "QTD_VERNIZ", "TOTAL_VERNIZ",
-            "VLR_CX EVAP", "QTD_CX EVAP", "TOTAL_CX EVAP", "VLR_PROTEC", "QTD_PROTEC", "TOTAL_PROTEC",
-            "VLR_NITROGÊNIO", "QTD_NITROGÊNIO", "TOTAL_CX EVAP.1", "QTD_TOTAL", "VLR_TOTAL",
-            "DATA_MES", "EMPRESA", "DATA FATURA", "ATRASO", "VENCIMENTO", "FAT OU NF", "NF",
-            "RESP/ LEVA", "RECEBIDO", "VLR_RECEBIDO", "A RECEBER", "ENVIAR PARA", "OBS",
-            "IMPOSTO", "IMP TOTAL", "BONIF UNIT", "EXTRA", "BONIF TOTAL", "INDIC UNIT", "INDIC",
-            "PROV UNIT", "PROVISÃO", "BACKOFFICE (R$2)", "REEMBOLSO", "DIVERSOS", "MÁQUINAS", "GASTOS",
-            "GABRIEL", "MAN", "HYUNDAI", "JEEP", "VW", "PSA", "GWM", "LUCRO LIQ", "%", "VALOR",
-            "DESCONTOS", "A RECEBER.1", "QTD_MAQ DUTO", "QTD_MAQ FREIO", "QTD_MAQ SANITIZANTE",
-            "QTD_MAQ VERNIZ", "QTD_CX EVAP.1", "TOTAL_MAQ", "CT", "SUP", "APLC", "FACILIT",
-            "CH OFIC", "AGEND", "CONTR", "OUTROS", "GPV", "DIR", "DIR GERAL", "POR TMO", "INDICAÇÃO", "PROVIS."
-        ]
-    }
-    
-    @classmethod
-    def get_credentials(cls) -> Dict[str, str]:
-        """Obtém credenciais dos secrets do Streamlit com validação"""
-        required_secrets = ["CLIENT_ID", "CLIENT_SECRET", "TENANT_ID", "EMAIL_ONEDRIVE", "SITE_ID", "DRIVE_ID"]
-        credentials = {}
-        
-        for secret in required_secrets:
-            if secret not in st.secrets:
-                st.error(f"❌ Credencial '{secret}' não encontrada nos secrets!")
-                st.stop()
-            credentials[secret] = st.secrets[secret]
-        
-        return credentials
-    
-    @classmethod
-    def get_expected_schema(cls, filename: str) -> Optional[List[str]]:
-        """Obtém o schema esperado para um arquivo específico"""
-        filename_lower = filename.lower()
-        
-        # Busca exata primeiro
-        if filename_lower in cls.EXPECTED_SCHEMAS:
-            return cls.EXPECTED_SCHEMAS[filename_lower]
-        
-        # Busca por palavras-chave no nome do arquivo
-        for schema_file, columns in cls.EXPECTED_SCHEMAS.items():
-            schema_name = schema_file.split('.')[0]  # Remove extensão
-            if schema_name in filename_lower:
-                return columns
-        
-        return None
+# === RECURSOS COMPARTILHADOS DO PROCESSO ===
+@st.cache_resource(show_spinner=False)
+def get_onedrive_manager() -> OneDriveManager:
+    """Retorna o OneDriveManager único do processo, mantido entre reruns e sessões"""
+    try:
+        credentials = Config.get_credentials(st.secrets)
+    except ValueError as e:
+        st.error(f"❌ {str(e)} nos secrets!")
+        st.stop()
+    return OneDriveManager(credentials)
 
-# === CLASSE PARA GERENCIAR ONEDRIVE ===
-class OneDriveManager:
-    def __init__(self):
-        self.credentials = Config.get_credentials()
-        self._token_cache = None
-        self._token_expiry = None
-    
-    def get_token(self) -> Optional[str]:
-        """Obtém token de acesso com cache"""
-        try:
-            # Verifica se o token ainda está válido
-            if (self._token_cache and self._token_expiry and 
-                datetime.now() < self._token_expiry):
-                return self._token_cache
-            
-            app = ConfidentialClientApplication(
-                self.credentials["CLIENT_ID"],
-                authority=f"https://login.microsoftonline.com/{self.credentials['TENANT_ID']}",
-                client_credential=self.credentials["CLIENT_SECRET"]
-            )
-            
-            result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
-            
-            if "access_token" in result:
-                self._token_cache = result["access_token"]
-                # Define expiração para 50 minutos (tokens geralmente duram 60min)
-                from datetime import timedelta
-                self._token_expiry = datetime.now() + timedelta(minutes=50)
-                return self._token_cache
-            else:
-                logger.error(f"Erro na autenticação: {result.get('error_description', 'Erro desconhecido')}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Erro ao obter token: {str(e)}")
-            st.error(f"❌ Erro na autenticação: {str(e)}")
-            return None
-    
-    def backup_existing_file(self, nome_arquivo: str, token: str) -> bool:
-        """Move arquivo existente para backup"""
-        try:
-            url = f"{Config.GRAPH_API_BASE}/sites/{self.credentials['SITE_ID']}/drives/{self.credentials['DRIVE_ID']}/root:/{Config.PASTA}/{nome_arquivo}"
-            headers = {"Authorization": f"Bearer {token}"}
-            
-            response = requests.get(url, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                file_id = response.json().get("id")
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                file_stem = Path(nome_arquivo).stem
-                file_suffix = Path(nome_arquivo).suffix
-                novo_nome = f"{file_stem}_backup_{timestamp}{file_suffix}"
-                
-                patch_url = f"{Config.GRAPH_API_BASE}/sites/{self.credentials['SITE_ID']}/drives/{self.credentials['DRIVE_ID']}/items/{file_id}"
-                patch_body = {"name": novo_nome}
-                patch_headers = {
-                    "Authorization": f"Bearer {token}",
-                    "Content-Type": "application/json"
-                }
-                
-                patch_response = requests.patch(patch_url, headers=patch_headers, json=patch_body, timeout=30)
-                return patch_response.status_code == 200
-            
-            return True  # Se arquivo não existe, não há problema
-            
-        except requests.exceptions.Timeout:
-            st.warning("⏱️ Timeout ao fazer backup - prosseguindo com upload")
-            return True
-        except Exception as e:
-            logger.error(f"Erro no backup: {str(e)}")
-            return False
-    
-    def upload_file(self, nome_arquivo: str, conteudo: bytes, token: str, fazer_backup: bool = True) -> Tuple[bool, int, str]:
-        """Faz upload do arquivo para o OneDrive"""
-        try:
-            # Fazer backup se solicitado
-            if fazer_backup:
-                backup_success = self.backup_existing_file(nome_arquivo, token)
-                if not backup_success:
-                    st.warning("⚠️ Não foi possível fazer backup do arquivo existente")
-            
-            url = f"{Config.GRAPH_API_BASE}/sites/{self.credentials['SITE_ID']}/drives/{self.credentials['DRIVE_ID']}/root:/{Config.PASTA}/{nome_arquivo}:/content"
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/octet-stream"
-            }
-            
-            response = requests.put(url, headers=headers, data=conteudo, timeout=60)
-            return response.status_code in [200, 201], response.status_code, response.text
-            
-        except requests.exceptions.Timeout:
-            return False, 408, "Timeout durante o upload"
-        except Exception as e:
-            logger.error(f"Erro no upload: {str(e)}")
-            return False, 500, str(e)
-    
-    def list_files(self, token: str) -> List[Dict[str, Any]]:
-        """Lista arquivos na pasta do OneDrive"""
-        try:
-            url = f"{Config.GRAPH_API_BASE}/users/{self.credentials['EMAIL_ONEDRIVE']}/drive/root:/{Config.PASTA}:/children"
-            headers = {"Authorization": f"Bearer {token}"}
-            
-            response = requests.get(url, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                files = response.json().get("value", [])
-                # Filtrar apenas arquivos de planilha
-                return [f for f in files if any(f['name'].lower().endswith(f'.{ext}') for ext in Config.SUPPORTED_FORMATS)]
-            else:
-                st.error(f"❌ Erro ao listar arquivos: {response.status_code}")
-                return []
-                
-        except requests.exceptions.Timeout:
-            st.error("⏱️ Timeout ao listar arquivos")
-            return []
-        except Exception as e:
-            logger.error(f"Erro ao listar arquivos: {str(e)}")
-            st.error(f"❌ Erro ao listar arquivos: {str(e)}")
-            return []
-    
-    def delete_file(self, token: str, file_id: str) -> bool:
-        """Deleta um arquivo do OneDrive"""
-        try:
-            url = f"{Config.GRAPH_API_BASE}/users/{self.credentials['EMAIL_ONEDRIVE']}/drive/items/{file_id}"
-            headers = {"Authorization": f"Bearer {token}"}
-            
-            response = requests.delete(url, headers=headers, timeout=30)
-            return response.status_code == 204
-            
-        except Exception as e:
-            logger.error(f"Erro ao deletar arquivo: {str(e)}")
-            return False
+@st.cache_resource(show_spinner=False)
+def get_folder_index(_onedrive_manager: OneDriveManager) -> FolderIndex:
+    """Retorna o índice da pasta único do processo"""
+    return FolderIndex(_onedrive_manager)
 
-# === FUNÇÕES DE VALIDAÇÃO ===
-class DataValidator:
-    @staticmethod
-    def validate_column_names(df: pd.DataFrame) -> Tuple[bool, List[str]]:
-        """Valida nomes de colunas"""
-        invalid_columns = []
-        
-        for col in df.columns:
-            # Normaliza para ASCII
-            col_ascii = unicodedata.normalize("NFKD", str(col)).encode("ASCII", "ignore").decode()
-            
-            # Verifica se contém apenas caracteres válidos
-            if not col_ascii.replace("_", "").replace(" ", "").isalnum():
-                invalid_columns.append(col)
-        
-        return len(invalid_columns) == 0, invalid_columns
-    
-    @staticmethod
-    def analyze_data_quality(df: pd.DataFrame) -> Dict[str, Any]:
-        """Analisa qualidade dos dados"""
-        analysis = {
-            "total_rows": len(df),
-            "total_columns": len(df.columns),
-            "null_columns": df.columns[df.isnull().any()].tolist(),
-            "duplicate_rows": df.duplicated().sum(),
-            "memory_usage": df.memory_usage(deep=True).sum() / 1024 / 1024,  # MB
-            "column_types": df.dtypes.to_dict()
-        }
-        
-        return analysis
-    
-    @staticmethod
-    def validate_schema(df: pd.DataFrame, filename: str) -> Dict[str, Any]:
-        """
-        Valida se o schema das colunas está compatível com o Power BI
-        NOVA LÓGICA: Permite novas colunas, mas verifica se as colunas existentes estão corretas
-        """
-        expected_columns = Config.get_expected_schema(filename)
-        
-        if expected_columns is None:
-            return {
-                "is_valid": True,
-                "has_schema": False,
-                "message": "Schema não definido para este arquivo - upload permitido",
-                "allow_consolidation": True
-            }
-        
-        current_columns = list(df.columns)
-        
-        # NOVA LÓGICA: Verifica se todas as colunas esperadas estão presentes
-        # Permite colunas extras (novas colunas)
-        missing_columns = [col for col in expected_columns if col not in current_columns]
-        extra_columns = [col for col in current_columns if col not in expected_columns]
-        
-        # Válido se não há colunas faltando (colunas extras são permitidas)
-        is_valid = len(missing_columns) == 0
-        allow_consolidation = is_valid  # Permite consolidação se não há colunas faltando
-        
-        if is_valid and extra_columns:
-            message = f"Schema compatível com novas colunas detectadas: {', '.join(extra_columns)}"
-        elif is_valid:
-            message = "Schema totalmente compatível"
-        else:
-            message = f"Schema incompatível - colunas obrigatórias ausentes: {', '.join(missing_columns)}"
-        
-        return {
-            "is_valid": is_valid,
-            "has_schema": True,
-            "expected_columns": expected_columns,
-            "current_columns": current_columns,
-            "missing_columns": missing_columns,
-            "extra_columns": extra_columns,
-            "allow_consolidation": allow_consolidation,
-            "message": message
-        }
-    
-    @staticmethod
-    def get_duplicate_analysis(df: pd.DataFrame) -> Dict[str, Any]:
-        if df.duplicated().sum() == 0:
-            return {"has_duplicates": False}
-        
-        # Identifica todas as linhas duplicadas (incluindo a primeira ocorrência)
-        duplicated_mask = df.duplicated(keep=False)
-        duplicated_df = df[duplicated_mask].copy()
-        
-        # Adiciona índice original para referência
-        duplicated_df['🔢 Linha Original'] = df[duplicated_mask].index + 1
-        
-        # Agrupa por valores duplicados
-        duplicate_groups = []
-        for group_idx, (_, group) in enumerate(df[duplicated_mask].groupby(df.columns.tolist())):
-            duplicate_groups.append({
-                "group_id": group_idx + 1,
-                "count": len(group),
-                "original_indices": (group.index + 1).tolist(),
-                "data": group.iloc[0].to_dict()  # Primeira ocorrência do grupo
-            })
-        
-        return {
-            "has_duplicates": True,
-            "total_duplicated_rows": duplicated_mask.sum(),
-            "unique_duplicate_patterns": len(duplicate_groups),
-            "duplicate_groups": duplicate_groups,
-            "duplicated_df": duplicated_df
-        }
+@st.cache_resource(show_spinner=False)
+def get_parse_cache() -> ParseCache:
+    """Retorna o cache de leitura único do processo"""
+    return ParseCache(Config.PARSE_CACHE_MAX_MB * 1024 * 1024)
+
+def get_content_hash(uploaded_file) -> str:
+    """Hash do conteúdo do arquivo enviado, calculado uma vez por arquivo na sessão"""
+    hashes = st.session_state.setdefault("content_hashes", {})
+    file_key = getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+    if file_key not in hashes:
+        hashes[file_key] = ParseCache.content_hash(uploaded_file.getvalue())
+    return hashes[file_key]
+
+@st.cache_resource(show_spinner=False)
+def get_upload_job_runner() -> UploadJobRunner:
+    """Retorna o executor de uploads único do processo"""
+    return UploadJobRunner(metrics=get_metrics_registry())
 
 # === FUNÇÕES DA INTERFACE ===
 def show_header():
@@ -730,9 +471,10 @@ def show_schema_validation(df: pd.DataFrame, filename: str) -> bool:
     
     return False
 
-def show_duplicate_analysis(df: pd.DataFrame) -> str:
+def show_duplicate_analysis(df: pd.DataFrame, duplicate_info: Optional[Dict[str, Any]] = None) -> str:
     """Exibe análise de duplicatas melhorada"""
-    duplicate_info = DataValidator.get_duplicate_analysis(df)
+    if duplicate_info is None:
+        duplicate_info = DataValidator.get_duplicate_analysis(df)
     
     if not duplicate_info["has_duplicates"]:
         return "keep_all"
@@ -782,18 +524,332 @@ def show_duplicate_analysis(df: pd.DataFrame) -> str:
         st.markdown("#### 🔍 Duplicatas Detectadas")
         
         # Mostra apenas as primeiras duplicatas para não sobrecarregar
-        preview_df = duplicate_info["duplicated_df"].head(20)
+        positions = duplicate_info["duplicated_positions"]
+        preview_df = df.iloc[positions[:20]].copy()
+        preview_df['🔢 Linha Original'] = preview_df.index + 1
         st.dataframe(preview_df, use_container_width=True)
         
-        if len(duplicate_info["duplicated_df"]) > 20:
-            st.info(f"Mostrando 20 de {len(duplicate_info['duplicated_df'])} linhas duplicadas")
+        if len(positions) > 20:
+            st.info(f"Mostrando 20 de {len(positions)} linhas duplicadas")
+    
+    # Grupos montados sob demanda, uma página por vez
+    if st.checkbox("🧩 Visualizar grupos de duplicatas"):
+        total_groups = duplicate_info["unique_duplicate_patterns"]
+        page_size = 10
+        total_pages = (total_groups + page_size - 1) // page_size
+        page = 1
+        if total_pages > 1:
+            page = st.number_input(f"Página (de {total_pages})", min_value=1, max_value=total_pages, value=1, key="duplicate_groups_page")
+        start = (page - 1) * page_size
+        stop = min(start + page_size, total_groups)
+        
+        st.dataframe(
+            DataValidator.get_duplicate_groups_page(df, duplicate_info, start, stop),
+            use_container_width=True,
+            hide_index=True
+        )
+        st.caption(f"Grupos {start + 1}-{stop} de {total_groups}")
     
     return action
 
+def show_published_diff(onedrive_manager: OneDriveManager, df: pd.DataFrame, filename: str, cache_key: tuple):
+    """Compara o arquivo enviado com a versão publicada no OneDrive (sob demanda)"""
+    st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
+    st.markdown("### 🔍 Comparação com o Arquivo Publicado")
+    
+    if st.button("🔍 Comparar com a versão no OneDrive", type="secondary"):
+        token = onedrive_manager.get_token()
+        if not token:
+            show_custom_alert("Erro na autenticação", "error", "❌")
+            return
+        try:
+            with st.spinner("🔍 Comparando com o arquivo publicado..."):
+                published = load_published(onedrive_manager, token, filename, get_parse_cache())
+                if published is None:
+                    st.session_state["published_diff"] = {"key": cache_key, "result": None}
+                else:
+                    start = time.perf_counter()
+                    result = DatasetDiff.compare(published["df"], df)
+                    # Guarda só amostras pequenas na sessão, não os DataFrames inteiros
+                    samples = {
+                        "✏️ Alteradas (versão enviada)": df.iloc[result["changed_positions"]],
+                        "➕ Novas": df.iloc[result["added_positions"]],
+                        "➖ Removidas (versão publicada)": published["df"].iloc[result["removed_positions"]],
+                    }
+                    st.session_state["published_diff"] = {
+                        "key": cache_key, "result": result, "samples": samples,
+                        "seconds": time.perf_counter() - start,
+                        "modified": published["item"].get("lastModifiedDateTime", "")
+                    }
+        except Exception as e:
+            logger.error(f"Erro ao comparar {filename}: {str(e)}")
+            show_custom_alert(f"Erro ao comparar com o arquivo publicado: {str(e)}", "error", "❌")
+            return
+    
+    diff = st.session_state.get("published_diff")
+    if not diff or diff["key"] != cache_key:
+        return
+    
+    result = diff["result"]
+    if result is None:
+        show_custom_alert("Ainda não existe arquivo com este nome no OneDrive - tudo será novo", "info", "🆕")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        show_custom_metric("Novas", f"{result['added']:,}", "➕")
+    with col2:
+        show_custom_metric("Alteradas", f"{result['changed']:,}", "✏️")
+    with col3:
+        show_custom_metric("Removidas", f"{result['removed']:,}", "➖")
+    with col4:
+        show_custom_metric("Iguais", f"{result['unchanged']:,}", "🟰")
+    
+    if result["by_key"]:
+        st.caption(f"Linhas pareadas por {' + '.join(result['keys'])} | comparação em {diff['seconds']:.2f}s")
+    else:
+        show_custom_alert(
+            f"Sem as colunas-chave ({', '.join(Config.CONSOLIDATION_KEYS)}): linhas comparadas pelo conteúdo inteiro, "
+            "alterações aparecem como remoção + inclusão",
+            "info", "ℹ️"
+        )
+    
+    if result["added_columns"]:
+        show_custom_alert(f"Colunas novas: {', '.join(map(str, result['added_columns']))}", "info", "➕")
+    if result["removed_columns"]:
+        show_custom_alert(f"Colunas ausentes no envio: {', '.join(map(str, result['removed_columns']))}", "warning", "⚠️")
+    
+    if result["column_changes"]:
+        st.markdown("#### 📊 Alterações por Coluna")
+        st.dataframe(
+            pd.DataFrame({"Coluna": list(result["column_changes"]), "Linhas alteradas": list(result["column_changes"].values())}),
+            use_container_width=True, hide_index=True
+        )
+    
+    for label, sample in diff["samples"].items():
+        if len(sample) and st.checkbox(f"👀 Visualizar linhas: {label}", key=f"diff_sample_{label}"):
+            preview = sample.copy()
+            preview['🔢 Linha Original'] = preview.index + 1
+            st.dataframe(preview, use_container_width=True)
+
+def select_output_mode(key: str) -> str:
+    """Escolha do formato enviado: planilha, planilha + Parquet ou só Parquet"""
+    if not SpreadsheetWriter.parquet_available():
+        st.caption("🧱 Cópia Parquet indisponível: instale o pyarrow para habilitar")
+        return "planilha"
+    
+    return st.radio(
+        "📦 Formato de saída:",
+        options=list(Config.OUTPUT_MODES),
+        format_func=Config.OUTPUT_MODES.get,
+        horizontal=True,
+        key=key,
+        help="A cópia Parquet (mesmo nome, extensão .parquet) tem tipos definidos pelo schema e carrega bem mais rápido no Power BI"
+    )
+
+def show_multi_upload(onedrive_manager: OneDriveManager):
+    """Envio de vários arquivos em paralelo, com status por arquivo e resumo final"""
+    uploaded_files = st.file_uploader(
+        "📁 Selecione as planilhas",
+        type=Config.SUPPORTED_FORMATS,
+        accept_multiple_files=True,
+        help=f"Cada arquivo é lido, validado e enviado em paralelo | Tamanho máximo por arquivo: {Config.MAX_FILE_SIZE_MB}MB",
+        key="multi_files"
+    )
+    
+    if not uploaded_files:
+        show_custom_alert("Selecione um ou mais arquivos. Arquivos Excel usam a primeira aba.", "info", "📚")
+        return
+    
+    show_custom_alert(f"{len(uploaded_files)} arquivo(s) selecionado(s)", "info", "📚")
+    
+    remove_duplicates = st.checkbox("🧹 Remover linhas duplicadas de cada arquivo")
+    output_mode = select_output_mode("multi_output_mode")
+    confirmar_upload = st.checkbox("✅ Confirmo que os dados estão corretos e autorizo o upload", key="multi_confirm")
+    
+    if not confirmar_upload:
+        show_custom_alert("Marque a confirmação para habilitar o upload", "warning", "⚠️")
+        return
+    
+    if not st.button("📤 Enviar Todos", type="primary", use_container_width=True):
+        return
+    
+    token = onedrive_manager.get_token()
+    if not token:
+        show_custom_alert("Erro na autenticação", "error", "❌")
+        return
+    
+    status_icons = {"enviado": "✅ Enviado", "sem alterações": "♻️ Sem alterações", "schema inválido": "🚫 Schema inválido", "erro": "❌ Erro"}
+    stage_labels = {"lendo": "📖 Lendo", "validando": "🔍 Validando", "enviando": "📤 Enviando"}
+    
+    progress = [{"etapa": "na fila"} for _ in uploaded_files]
+    results: Dict[int, Dict[str, Any]] = {}
+    table = st.empty()
+    start = time.perf_counter()
+    
+    # Dois arquivos com o mesmo nome iriam para o mesmo destino no OneDrive (mesma regra do run_batch)
+    seen_names = set()
+    for i, f in enumerate(uploaded_files):
+        if f.name in seen_names:
+            results[i] = {"arquivo": f.name, "status": "erro", "linhas": None, "removidas": 0, "segundos": 0.0,
+                          "mensagem": "Outro arquivo com o mesmo nome já está nesta seleção"}
+        seen_names.add(f.name)
+    
+    def render():
+        rows = []
+        for i, f in enumerate(uploaded_files):
+            result = results.get(i)
+            rows.append({
+                "📄 Arquivo": f.name,
+                "Status": status_icons[result["status"]] if result else stage_labels.get(progress[i]["etapa"], "⏳ Na fila"),
+                "Linhas": result["linhas"] if result else None,
+                "Duplicatas removidas": result["removidas"] if result else None,
+                "Tempo (s)": result["segundos"] if result else None,
+                "Mensagem": result["mensagem"] if result else ""
+            })
+        table.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    
+    with ThreadPoolExecutor(max_workers=Config.MAX_PARALLEL_UPLOADS) as executor:
+        futures = {
+            executor.submit(
+                process_upload_file, onedrive_manager, token, f.name, f.getvalue(), remove_duplicates, progress[i],
+                output_mode, get_metrics_registry()
+            ): i
+            for i, f in enumerate(uploaded_files) if i not in results
+        }
+        pending = set(futures)
+        while pending:
+            render()
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+    render()
+    
+    if any(r["status"] == "enviado" for r in results.values()):
+        get_folder_index(onedrive_manager).invalidate()
+    
+    elapsed = time.perf_counter() - start
+    counts = {status: sum(r["status"] == status for r in results.values()) for status in status_icons}
+    
+    st.markdown("### 📊 Resumo")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        show_custom_metric("Enviados", str(counts["enviado"]), "✅")
+    with col2:
+        show_custom_metric("Sem Alterações", str(counts["sem alterações"]), "♻️")
+    with col3:
+        show_custom_metric("Com Problemas", str(counts["schema inválido"] + counts["erro"]), "❌")
+    with col4:
+        show_custom_metric("Tempo Total", f"{elapsed:.1f}s", "⏱️")
+    
+    st.caption(f"Soma dos tempos individuais: {sum(r['segundos'] for r in results.values()):.1f}s")
+    logger.info(f"Upload múltiplo: {len(results)} arquivo(s) em {elapsed:.2f}s - {counts}")
+
+def show_upload_jobs():
+    """Painel dos uploads em segundo plano desta sessão (atualiza sozinho enquanto houver envios)"""
+    job_ids = st.session_state.get("upload_jobs", [])
+    if not job_ids:
+        return
+    
+    runner = get_upload_job_runner()
+    state_labels = {
+        "na fila": "⏳ Na fila", "preparando": "🔀 Preparando", "backup": "📦 Fazendo backup", "enviando": "📤 Enviando",
+        "concluído": "✅ Concluído", "falhou": "❌ Falhou"
+    }
+    
+    def active_jobs(jobs: List[Dict[str, Any]]) -> bool:
+        return any(job["estado"] in runner.ACTIVE_STATES for job in jobs)
+    
+    polling = active_jobs([job for job in map(runner.get, job_ids) if job])
+    
+    @st.fragment(run_every=1 if polling else None)
+    def render():
+        jobs = [job for job in map(runner.get, job_ids) if job]
+        st.markdown("### 🚚 Envios em Andamento" if active_jobs(jobs) else "### 🚚 Envios Recentes")
+        
+        for job in reversed(jobs):
+            st.markdown(f"**📄 {job['nome']}** — {state_labels[job['estado']]}")
+            if job["estado"] == "preparando":
+                st.caption("Gerando o conteúdo a enviar...")
+            elif job["estado"] in runner.ACTIVE_STATES:
+                st.progress(
+                    job["enviados"] / max(job["total"], 1),
+                    text=f"{job['enviados'] / (1024 * 1024):.1f} de {job['total'] / (1024 * 1024):.1f} MB"
+                )
+            elif job["estado"] == "concluído":
+                st.caption(" | ".join(filter(None, [job["mensagem"], job["detalhes"], f"{job['segundos']:.1f}s"])))
+            else:
+                show_custom_alert(f"Erro no upload (Código: {job['status']})", "error", "❌")
+                st.code(job["mensagem"], language="text")
+        
+        if polling and not active_jobs(jobs):
+            # Todos encerraram: recarrega a página para parar a atualização e refletir os arquivos novos
+            st.rerun()
+    
+    render()
+    
+    if not polling and st.button("🧹 Limpar lista de envios", type="secondary"):
+        st.session_state["upload_jobs"] = []
+        st.rerun()
+    
+    st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
+
+def submit_consolidation(onedrive_manager: OneDriveManager, token: str, filename: str, df: pd.DataFrame,
+                         output_mode: str, trace: Optional[UploadTrace] = None):
+    """Enfileira a consolidação: download, junção e gravação rodam dentro do job, não no script"""
+    parse_cache = get_parse_cache()
+    if output_mode == "parquet":
+        # A planilha publicada é a base da próxima consolidação: precisa ser atualizada junto
+        output_mode = "ambos"
+    runner = get_upload_job_runner()
+    holder: Dict[str, Any] = {}
+    
+    def describe(info: Dict[str, Any]) -> str:
+        sem_chave = f", {info['sem_chave']:,} sem chave completa" if info["sem_chave"] else ""
+        return (f"{info['novas']:,} novas, {info['atualizadas']:,} atualizadas{sem_chave}, "
+                f"{info['mantidas']:,} mantidas → {info['total']:,} linhas")
+    
+    def build_spreadsheet() -> Tuple[bytes, str, str]:
+        # Refeita a cada tentativa: se outra consolidação publicou antes, junta sobre a versão nova
+        result, info = consolidate_upload(onedrive_manager, token, filename, df, parse_cache)
+        holder["value"] = result, info
+        content = serialize_dataframe(result, filename, info["sheet_name"], info["read_info"])
+        return content, describe(info), info["etag"]
+    
+    def build_parquet() -> Tuple[bytes, str, None]:
+        # A cópia Parquet sai da junção que a planilha efetivamente publicou
+        job = runner.wait(spreadsheet_job)
+        if not job or job["estado"] != "concluído" or "value" not in holder:
+            raise RuntimeError("A planilha consolidada não foi publicada - cópia Parquet não enviada")
+        result, info = holder["value"]
+        return SpreadsheetWriter.write_parquet(result), describe(info), None
+    
+    builders = [(filename, build_spreadsheet)]
+    if output_mode != "planilha":
+        builders.append((SpreadsheetWriter.parquet_name(filename), build_parquet))
+    
+    for i, (nome, build) in enumerate(builders):
+        job_id = runner.submit(
+            onedrive_manager, token, nome, build,
+            fazer_backup=True,
+            on_success=get_folder_index(onedrive_manager).invalidate,
+            trace=trace if i == 0 else UploadTrace(nome, "consolidacao", runner.metrics)
+        )
+        if i == 0:
+            spreadsheet_job = job_id
+        st.session_state.setdefault("upload_jobs", []).append(job_id)
+        logger.info(f"Consolidação enfileirada: {nome} ({len(df):,} linhas enviadas)")
+
 def show_upload_tab(onedrive_manager: OneDriveManager):
     """Interface de upload melhorada"""
     st.markdown("## 📤 Upload de Planilha")
     
+    show_upload_jobs()
+    
+    if st.toggle("📚 Enviar vários arquivos de uma vez", key="multi_upload_mode"):
+        show_multi_upload(onedrive_manager)
+        return
+    
     # Upload de arquivo com design melhorado
     uploaded_file = st.file_uploader(
         "📁 Selecione sua planilha",
@@ -844,24 +900,54 @@ def show_upload_tab(onedrive_manager: OneDriveManager):
     with col3:
         show_custom_metric("Tipo", uploaded_file.type or "Desconhecido", "🔧")
     
-    # Leitura do arquivo
+    # Leitura do arquivo (reaproveita o DataFrame já lido em reruns anteriores)
+    parse_cache = get_parse_cache()
+    content_hash = get_content_hash(uploaded_file)
+    
+    # Etapas antes do envio: o tempo entra nas métricas só quando a etapa roda de fato;
+    # resultado vindo do cache conta como acerto de cache, sem repetir o tempo da primeira vez
+    metrics = get_metrics_registry()
+    ran_stages = set()
+    
+    def timed(stage: str, compute: Callable[[], Any]) -> Callable[[], Any]:
+        def run():
+            start = time.perf_counter()
+            value = compute()
+            metrics.observe("upload_stage_seconds", time.perf_counter() - start, etapa=stage)
+            ran_stages.add(stage)
+            return value
+        return run
+    
     try:
         if uploaded_file.name.lower().endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
             sheet_name = None
+            cache_key = ParseCache.make_key(content_hash, None, reader="csv", engines=tuple(SpreadsheetReader.csv_engines()))
+            df, read_info = parse_cache.get_or_load(
+                cache_key, timed("leitura", lambda: SpreadsheetReader.read_csv(uploaded_file.getvalue()))
+            )["value"]
         else:
-            # Para arquivos Excel, verificar múltiplas abas
-            excel_file = pd.ExcelFile(uploaded_file)
-            sheets = excel_file.sheet_names
+            # Para arquivos Excel, abre a pasta de trabalho uma vez e lê só a aba escolhida
+            workbook = parse_cache.get_or_load(
+                ParseCache.make_key(content_hash, None, reader="workbook", engines=tuple(SpreadsheetReader.excel_engines())),
+                timed("leitura", lambda: SpreadsheetReader.open_workbook(uploaded_file.getvalue()))
+            )["value"]
+            sheets = workbook.sheet_names
+            
+            def format_sheet(name: str) -> str:
+                dims = workbook.sheet_dimensions(name)
+                return f"{name} ({dims[0]:,} linhas × {dims[1]} colunas)" if dims else name
             
             if len(sheets) > 1:
                 st.markdown("#### 📋 Seleção de Aba")
-                sheet_name = st.selectbox("Escolha a aba:", sheets)
+                sheet_name = st.selectbox("Escolha a aba:", sheets, format_func=format_sheet)
             else:
                 sheet_name = sheets[0]
-                show_custom_alert(f"Aba selecionada: {sheet_name}", "info", "📋")
+                show_custom_alert(f"Aba selecionada: {format_sheet(sheet_name)}", "info", "📋")
             
-            df = pd.read_excel(uploaded_file, sheet_name=sheet_name)
+            cache_key = ParseCache.make_key(content_hash, sheet_name, reader="excel", engine=workbook.engine)
+            df, read_info = parse_cache.get_or_load(
+                cache_key, timed("leitura", lambda: SpreadsheetReader.read_sheet(workbook, sheet_name))
+            )["value"]
     
     except Exception as e:
         show_custom_alert(f"Erro ao ler arquivo: {str(e)}", "error", "❌")
@@ -881,12 +967,20 @@ def show_upload_tab(onedrive_manager: OneDriveManager):
         
         if len(df) > 10:
             st.caption(f"Mostrando 10 de {len(df)} linhas")
+        st.caption(f"⚡ Leitura: engine {read_info['engine'] or 'padrão'} em {read_info['seconds']:.2f}s")
     
     # Análise de qualidade dos dados com métricas modernas
     st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
     st.markdown("### 📊 Análise de Qualidade")
     
-    analysis = DataValidator.analyze_data_quality(df)
+    # Hashes de linha calculados uma vez e compartilhados por análise, preview e remoção
+    row_index = parse_cache.memoize(cache_key, "row_index", timed("hashes", lambda: RowHashIndex.from_dataframe(df)))
+    analysis = parse_cache.memoize(
+        cache_key, "analysis", timed("qualidade", lambda: DataValidator.analyze_data_quality(df, row_index))
+    )
+    for stage in ("leitura", "hashes", "qualidade"):
+        if stage not in ran_stages:
+            metrics.inc("parse_cache_hits_total", etapa=stage)
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -915,7 +1009,9 @@ def show_upload_tab(onedrive_manager: OneDriveManager):
         )
     
     # VALIDAÇÃO DE SCHEMA MELHORADA
+    start = time.perf_counter()
     schema_valid = show_schema_validation(df, uploaded_file.name)
+    schema_seconds = time.perf_counter() - start
     
     # Se schema inválido, bloquear upload
     if not schema_valid:
@@ -925,7 +1021,10 @@ def show_upload_tab(onedrive_manager: OneDriveManager):
     duplicate_action = "keep_all"  # Valor padrão
     
     if analysis["duplicate_rows"] > 0:
-        duplicate_action = show_duplicate_analysis(df)
+        duplicate_info = parse_cache.memoize(cache_key, "duplicates", lambda: DataValidator.get_duplicate_analysis(df, row_index))
+        duplicate_action = show_duplicate_analysis(df, duplicate_info)
+    
+    show_published_diff(onedrive_manager, df, uploaded_file.name, cache_key)
     
     # Opções de upload com design moderno
     st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
@@ -936,6 +1035,45 @@ def show_upload_tab(onedrive_manager: OneDriveManager):
         "info", "📦"
     )
     
+    output_mode = select_output_mode("output_mode")
+    
+    # Consolidação por chave: só para arquivos com schema e com todas as colunas-chave
+    consolidar = False
+    schema_result = DataValidator.validate_schema(df, uploaded_file.name)
+    if schema_result["has_schema"] and schema_result["allow_consolidation"] and not DatasetConsolidator.missing_keys(df):
+        consolidar = st.radio(
+            "🔀 Modo de envio:",
+            options=[False, True],
+            format_func=lambda value: (
+                f"🔀 Consolidar por chave ({' + '.join(Config.CONSOLIDATION_KEYS)})" if value
+                else "♻️ Substituir o arquivo inteiro"
+            ),
+            horizontal=True,
+            key="consolidation_mode",
+            help="Na consolidação, as linhas enviadas entram no arquivo publicado ou substituem as de mesma chave; o restante do histórico é mantido"
+        )
+    
+    if consolidar:
+        # Mesmas linhas que a consolidação vai receber (sem as duplicatas exatas, se forem removidas)
+        keys = df[Config.CONSOLIDATION_KEYS]
+        if duplicate_action == "remove_all":
+            keys = row_index.drop_duplicates(keys)
+        issues = DatasetConsolidator.key_issues(keys)
+        chave = " + ".join(Config.CONSOLIDATION_KEYS)
+        if issues["chave_repetida"]:
+            show_custom_alert(
+                f"{issues['chave_repetida']:,} linhas repetem a chave ({chave}) de outra linha do envio - "
+                f"a consolidação não escolhe entre elas. Corrija as repetições ou substitua o arquivo inteiro",
+                "error", "🚫"
+            )
+            return
+        if issues["sem_chave"]:
+            show_custom_alert(
+                f"{issues['sem_chave']:,} linhas têm parte da chave ({chave}) em branco: "
+                f"serão acrescentadas sem substituir nenhuma linha publicada",
+                "warning", "⚠️"
+            )
+    
     confirmar_upload = st.checkbox("✅ Confirmo que os dados estão corretos e autorizo o upload")
     
     # Botão de upload
@@ -949,60 +1087,55 @@ def show_upload_tab(onedrive_manager: OneDriveManager):
             show_custom_alert("Erro na autenticação", "error", "❌")
             return
         
-        with st.spinner("📤 Enviando arquivo..."):
-            progress_bar = st.progress(0)
-            
-            # Processa o arquivo baseado na ação escolhida para duplicatas
-            df_final = df.copy()
-            
-            if duplicate_action == "remove_all" and analysis["duplicate_rows"] > 0:
-                df_final = df.drop_duplicates()
-                show_custom_alert(
-                    f"Duplicatas removidas: {len(df) - len(df_final)} linhas eliminadas",
-                    "info", "🧹"
-                )
-            
-            # Salva o arquivo processado
-            buffer = io.BytesIO()
-            if uploaded_file.name.lower().endswith('.csv'):
-                df_final.to_csv(buffer, index=False)
+        # Um registro de métricas por arquivo enviado; leitura e análise já foram medidas quando rodaram
+        trace = UploadTrace(uploaded_file.name, "consolidacao" if consolidar else "individual", metrics)
+        trace.add_stage("schema", schema_seconds)
+        trace.count(bytes_arquivo=uploaded_file.size, linhas=len(df), colunas=len(df.columns))
+        
+        # Processa o arquivo baseado na ação escolhida para duplicatas
+        df_final = df
+        detalhes = ""
+        
+        if duplicate_action == "remove_all" and analysis["duplicate_rows"] > 0:
+            with trace.stage("duplicatas"):
+                df_final = row_index.drop_duplicates(df)
+            trace.count(duplicatas_removidas=len(df) - len(df_final))
+            detalhes = f"{len(df):,} → {len(df_final):,} linhas ({len(df) - len(df_final):,} duplicatas removidas)"
+        
+        if consolidar:
+            submit_consolidation(onedrive_manager, token, uploaded_file.name, df_final, output_mode, trace)
+            st.rerun()
+        
+        outputs = []
+        if output_mode != "parquet":
+            if len(df_final) == len(df):
+                # Nada foi alterado: envia os bytes originais (mantém todas as abas e formatação)
+                file_content = uploaded_file.getvalue()
             else:
-                df_final.to_excel(buffer, index=False, sheet_name=sheet_name or 'Sheet1')
-            file_content = buffer.getvalue()
-            
-            progress_bar.progress(50)
-            
-            sucesso, status, resposta = onedrive_manager.upload_file(
-                uploaded_file.name, 
-                file_content, 
-                token, 
-                True  # Sempre fazer backup
+                # Salva o arquivo processado
+                with st.spinner("🧹 Preparando arquivo..."), trace.activate():
+                    file_content = serialize_dataframe(df_final, uploaded_file.name, sheet_name, read_info)
+            outputs.append((uploaded_file.name, file_content, trace))
+        
+        if output_mode != "planilha":
+            parquet_name = SpreadsheetWriter.parquet_name(uploaded_file.name)
+            parquet_trace = UploadTrace(parquet_name, "individual", metrics) if outputs else trace
+            with st.spinner("🧱 Gerando cópia Parquet..."), parquet_trace.activate():
+                outputs.append((parquet_name, SpreadsheetWriter.write_parquet(df_final), parquet_trace))
+        
+        # O envio roda em segundo plano: a sessão continua livre e o progresso aparece no topo da aba
+        runner = get_upload_job_runner()
+        for nome, content, output_trace in outputs:
+            job_id = runner.submit(
+                onedrive_manager, token, nome, content,
+                fazer_backup=True,  # Sempre fazer backup
+                on_success=get_folder_index(onedrive_manager).invalidate,
+                detalhes=detalhes,
+                trace=output_trace
             )
-            
-            progress_bar.progress(100)
-            
-            if sucesso:
-                show_custom_alert("🎉 Arquivo enviado com sucesso!", "success", "🎉")
-                
-                # Mostra estatísticas do upload
-                if duplicate_action == "remove_all" and analysis["duplicate_rows"] > 0:
-                    st.markdown(
-                        f"""
-                        **📊 Estatísticas do Upload:**
-                        - Linhas originais: {len(df):,}
-                        - Linhas enviadas: {len(df_final):,}
-                        - Duplicatas removidas: {len(df) - len(df_final):,}
-                        """
-                    )
-                
-                st.balloons()
-                
-                # Log da operação
-                logger.info(f"Upload bem-sucedido: {uploaded_file.name} ({file_size_mb:.2f}MB)")
-                
-            else:
-                show_custom_alert(f"Erro no upload (Código: {status})", "error", "❌")
-                st.code(resposta, language="text")
+            st.session_state.setdefault("upload_jobs", []).append(job_id)
+            logger.info(f"Upload enfileirado: {nome} ({len(content) / (1024 * 1024):.2f}MB)")
+        st.rerun()
 
 def show_management_tab(onedrive_manager: OneDriveManager):
     """Interface para gerenciar arquivos melhorada"""
@@ -1010,16 +1143,37 @@ def show_management_tab(onedrive_manager: OneDriveManager):
     
     col1, col2 = st.columns([3, 1])
     with col2:
-        if st.button("🔄 Atualizar Lista", type="secondary"):
-            st.rerun()
+        force_sync = st.button("🔄 Atualizar Lista", type="secondary")
     
     token = onedrive_manager.get_token()
     if not token:
         show_custom_alert("Erro na autenticação", "error", "❌")
         return
     
-    with st.spinner("📂 Carregando arquivos..."):
-        arquivos = onedrive_manager.list_files(token)
+    folder_index = get_folder_index(onedrive_manager)
+    loading = st.empty()
+    
+    def show_loaded(files: List[Dict[str, Any]]):
+        # Pastas grandes: mostra os arquivos conforme as páginas chegam
+        with loading.container():
+            st.caption(f"📂 Carregando... {len(files)} arquivo(s) até agora")
+            st.dataframe(
+                pd.DataFrame([{"📄 Nome": f["name"], "📊 Tamanho": f"{f['size'] / 1024:.1f} KB"} for f in files]),
+                use_container_width=True, hide_index=True
+            )
+    
+    try:
+        with st.spinner("📂 Carregando arquivos..."):
+            arquivos = folder_index.get_files(token, force_sync=force_sync, on_page=show_loaded)
+    except requests.exceptions.Timeout:
+        show_custom_alert("Timeout ao listar arquivos", "error", "⏱️")
+        return
+    except Exception as e:
+        logger.error(f"Erro ao listar arquivos: {str(e)}")
+        show_custom_alert(f"Erro ao listar arquivos: {str(e)}", "error", "❌")
+        return
+    finally:
+        loading.empty()
     
     if not arquivos:
         st.markdown(
@@ -1079,7 +1233,7 @@ def show_management_tab(onedrive_manager: OneDriveManager):
         
         with col1:
             if st.button("🔗 Abrir Arquivo", use_container_width=True):
-                download_url = arq.get('@microsoft.graph.downloadUrl')
+                download_url = arq.get('@microsoft.graph.downloadUrl') or onedrive_manager.get_download_url(token, arq['id'])
                 if download_url:
                     st.markdown(f"[📎 Clique aqui para baixar]({download_url})")
                 else:
@@ -1087,7 +1241,7 @@ def show_management_tab(onedrive_manager: OneDriveManager):
         
         with col2:
             if st.button("📋 Copiar Link", use_container_width=True):
-                download_url = arq.get('@microsoft.graph.downloadUrl')
+                download_url = arq.get('@microsoft.graph.downloadUrl') or onedrive_manager.get_download_url(token, arq['id'])
                 if download_url:
                     st.code(download_url)
                     show_custom_alert("Link exibido acima", "success", "✅")
@@ -1099,9 +1253,84 @@ def show_management_tab(onedrive_manager: OneDriveManager):
                         sucesso = onedrive_manager.delete_file(token, arq['id'])
                         if sucesso:
                             show_custom_alert("Arquivo deletado!", "success", "✅")
+                            get_folder_index(onedrive_manager).invalidate()
                             st.rerun()
                         else:
                             show_custom_alert("Erro ao deletar arquivo", "error", "❌")
+    
+    show_bulk_actions(onedrive_manager, token, arquivos)
+
+def show_bulk_actions(onedrive_manager: OneDriveManager, token: str, arquivos: List[Dict[str, Any]]):
+    """Ações em lote (exclusão e movimentação) sobre vários arquivos via $batch"""
+    st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
+    st.markdown("### 📦 Ações em Lote")
+    
+    # Resultado da última ação em lote (a lista é recarregada após a ação)
+    bulk_result = st.session_state.pop("bulk_result", None)
+    if bulk_result:
+        if bulk_result["failures"]:
+            show_custom_alert(
+                f"{bulk_result['action']}: {bulk_result['ok']} arquivo(s) ok, {len(bulk_result['failures'])} com erro",
+                "warning", "⚠️"
+            )
+            st.dataframe(pd.DataFrame(bulk_result["failures"]), use_container_width=True, hide_index=True)
+        else:
+            show_custom_alert(f"{bulk_result['action']}: {bulk_result['ok']} arquivo(s) processado(s)", "success", "✅")
+    
+    nomes = {arq['id']: arq['name'] for arq in arquivos}
+    backup_ids = [arq['id'] for arq in arquivos if "_backup_" in arq['name']]
+    
+    def select_backups():
+        st.session_state["bulk_selection"] = backup_ids
+    
+    st.button(f"🗂️ Selecionar todos os backups ({len(backup_ids)})", on_click=select_backups, disabled=not backup_ids)
+    
+    # Remove da seleção arquivos que não existem mais
+    if "bulk_selection" in st.session_state:
+        st.session_state["bulk_selection"] = [i for i in st.session_state["bulk_selection"] if i in nomes]
+    
+    selecionados = st.multiselect(
+        "Selecione os arquivos:",
+        options=list(nomes),
+        format_func=lambda file_id: f"📄 {nomes[file_id]}",
+        key="bulk_selection"
+    )
+    
+    if not selecionados:
+        return
+    
+    def error_message(result: Dict[str, Any]) -> str:
+        body = result.get("body")
+        if isinstance(body, dict):
+            return body.get("error", {}).get("message", "")
+        return str(body or "")
+    
+    def finish(action: str, results: List[Dict[str, Any]], expected_status: Tuple[int, ...]):
+        failures = [
+            {"📄 Nome": nomes[file_id], "Status": result["status"], "Erro": error_message(result)}
+            for file_id, result in zip(selecionados, results)
+            if result["status"] not in expected_status
+        ]
+        st.session_state["bulk_result"] = {"action": action, "ok": len(results) - len(failures), "failures": failures}
+        st.session_state.pop("bulk_selection", None)
+        get_folder_index(onedrive_manager).invalidate()
+        st.rerun()
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        confirmar = st.checkbox(f"⚠️ Confirmar exclusão de {len(selecionados)} arquivo(s)")
+        if st.button("🗑️ Deletar Selecionados", use_container_width=True, disabled=not confirmar):
+            with st.spinner("🗑️ Deletando..."):
+                results = onedrive_manager.delete_files(token, selecionados)
+            finish("Exclusão", results, (204,))
+    
+    with col2:
+        destino = st.text_input("Pasta de destino:", value=f"{Config.PASTA}/Backups")
+        if st.button("📁 Mover Selecionados", use_container_width=True, disabled=not destino.strip()):
+            with st.spinner("📁 Movendo..."):
+                results = onedrive_manager.move_files(token, selecionados, destino)
+            finish("Movimentação", results, (200,))
 
 # === FUNÇÃO PRINCIPAL ===
 def main():
@@ -1112,8 +1341,8 @@ def main():
     # Exibe cabeçalho moderno
     show_header()
     
-    # Inicializa o gerenciador OneDrive
-    onedrive_manager = OneDriveManager()
+    # Obtém o gerenciador OneDrive compartilhado (token e cliente MSAL sobrevivem aos reruns)
+    onedrive_manager = get_onedrive_manager()
     
     # Sidebar moderna para navegação
     with st.sidebar:
@@ -1189,6 +1418,26 @@ def main():
                         st.markdown(f"... e mais {len(columns) - 5} colunas")
         else:
             st.info("Nenhum schema configurado")
+        
+        # Tempos das últimas chamadas ao Graph
+        timings = onedrive_manager.graph.recent_timings()
+        if timings:
+            st.markdown("---")
+            with st.expander("⏱️ Latência do Graph", expanded=False):
+                df_timings = pd.DataFrame(timings[::-1])
+                st.caption(f"Mediana: {df_timings['elapsed_ms'].median():.0f} ms | Limite de concorrência: {onedrive_manager.graph.limiter.limit}")
+                st.dataframe(df_timings[["method", "path", "status", "elapsed_ms", "attempt"]], use_container_width=True, hide_index=True)
+            
+            # Histogramas agregados entre sessões, no formato texto do Prometheus
+            with st.expander("📈 Métricas (Prometheus)", expanded=False):
+                metrics_text = get_metrics_registry().render()
+                st.download_button(
+                    "⬇️ Baixar métricas", metrics_text, file_name="dsview_metrics.prom",
+                    mime="text/plain", use_container_width=True
+                )
+                if Config.METRICS_TEXTFILE:
+                    st.caption(f"Também gravadas em {Config.METRICS_TEXTFILE} a cada upload")
+                st.code(metrics_text, language="text")
     
     # Exibe a aba selecionada
     if aba == "📤 Upload de Planilha":
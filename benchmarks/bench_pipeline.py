@@ -0,0 +1,164 @@
+"""
+Mede cada etapa do pipeline de upload fora do Streamlit com planilhas sintéticas no schema de
+faturamento: leitura, qualidade, duplicatas, schema, serialização e envio ao stand-in local do
+Graph (tools/graph_standin.py). Cada execução é anexada a benchmarks/results/pipeline.jsonl com
+o commit atual, e --compare mostra a variação em relação à execução anterior do mesmo cenário.
+
+Uso: python benchmarks/bench_pipeline.py --rows 1000 10000 100000 1000000 --formats xlsx csv --compare
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "tools"))
+from pipeline import (Config, DataValidator, OneDriveManager, RowHashIndex,  # noqa: E402
+                      SpreadsheetReader, serialize_dataframe)
+from generate_faturamento import SCHEMA_FILE, generate, to_bytes  # noqa: E402
+from graph_standin import GraphStandIn  # noqa: E402
+
+RESULTS_FILE = ROOT / "benchmarks" / "results" / "pipeline.jsonl"
+STAGES = ["leitura", "qualidade", "duplicatas", "schema", "serializacao", "envio"]
+BENCH_CREDENTIALS = {
+    "CLIENT_ID": "benchmark", "CLIENT_SECRET": "benchmark", "TENANT_ID": "benchmark",
+    "EMAIL_ONEDRIVE": "benchmark@example.com", "SITE_ID": "benchmark-site", "DRIVE_ID": "benchmark-drive"
+}
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        # Qualquer alteração na árvore (pipeline.py, app.py, benchmarks) marca o resultado como "-dirty"
+        dirty = subprocess.run(["git", "status", "--porcelain"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+def run_pipeline(manager: OneDriveManager, filename: str, data: bytes) -> Dict[str, float]:
+    """Executa as etapas na mesma ordem da aba de upload; retorna os segundos de cada uma"""
+    timings = {}
+
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    df, read_info, sheet_name = timed("leitura", SpreadsheetReader.read_table, filename, data)
+    # O hash por linha é calculado junto da análise de qualidade, como na aba de upload
+    start = time.perf_counter()
+    row_index = RowHashIndex.from_dataframe(df)
+    DataValidator.analyze_data_quality(df, row_index)
+    timings["qualidade"] = time.perf_counter() - start
+    timed("duplicatas", DataValidator.get_duplicate_analysis, df, row_index)
+    timed("schema", DataValidator.validate_schema, df, filename)
+    content = timed("serializacao", serialize_dataframe, row_index.drop_duplicates(df), filename, sheet_name, read_info)
+    # Sem a verificação de conteúdo idêntico: toda execução transfere o arquivo (com backup)
+    success, status, _ = timed("envio", manager.upload_file, filename, content, "benchmark", True, False)
+    if not success:
+        raise RuntimeError(f"Envio ao stand-in falhou com status {status}")
+    return timings
+
+def measure_peak(manager: OneDriveManager, filename: str, data: bytes) -> float:
+    """Pico de memória do pipeline completo em MB (execução separada: o tracemalloc distorce o tempo)"""
+    tracemalloc.start()
+    run_pipeline(manager, filename, data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+def previous_result(results: List[Dict[str, Any]], scenario: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    for record in reversed(results):
+        if record["scenario"] == scenario:
+            return record
+    return None
+
+def load_results() -> List[Dict[str, Any]]:
+    if not RESULTS_FILE.exists():
+        return []
+    with RESULTS_FILE.open(encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+def format_delta(current: float, previous: Optional[float]) -> str:
+    if not previous:
+        return ""
+    return f"({(current - previous) / previous:+.0%})"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--formats", nargs="+", choices=["xlsx", "csv"], default=["xlsx", "csv"])
+    parser.add_argument("--extra-columns", type=int, default=0)
+    parser.add_argument("--duplicates", type=float, default=0.02, help="fração de linhas duplicadas")
+    parser.add_argument("--nulls", type=float, default=0.05, help="fração de células vazias")
+    parser.add_argument("--repeat", type=int, default=3, help="execuções por cenário (vale a mediana)")
+    parser.add_argument("--memory", action="store_true", help="mede também o pico de memória")
+    parser.add_argument("--label", default="", help="rótulo livre gravado junto do resultado")
+    parser.add_argument("--compare", action="store_true", help="mostra a variação contra a execução anterior")
+    parser.add_argument("--no-save", action="store_true", help="não grava em benchmarks/results")
+    args = parser.parse_args()
+
+    standin = GraphStandIn().start()
+    Config.GRAPH_API_BASE = standin.graph_base
+    manager = OneDriveManager(BENCH_CREDENTIALS)
+    history = load_results() if args.compare else []
+    revision = git_revision()
+    records = []
+
+    print(f"{'linhas':>9} {'formato':<7} " + " ".join(f"{stage:>13}" for stage in STAGES) + f" {'total':>9}")
+    try:
+        for rows in args.rows:
+            df = generate(rows, args.extra_columns, args.duplicates, args.nulls)
+            for fmt in args.formats:
+                data = to_bytes(df, fmt)
+                filename = SCHEMA_FILE if fmt == "xlsx" else Path(SCHEMA_FILE).with_suffix(".csv").name
+                scenario = {
+                    "rows": rows, "format": fmt, "extra_columns": args.extra_columns,
+                    "duplicates": args.duplicates, "nulls": args.nulls
+                }
+
+                runs = [run_pipeline(manager, filename, data) for _ in range(args.repeat)]
+                stages = {stage: float(pd.Series([run[stage] for run in runs]).median()) for stage in STAGES}
+                record = {
+                    "timestamp": datetime.now().isoformat(timespec="seconds"),
+                    "revision": revision,
+                    "label": args.label,
+                    "python": platform.python_version(),
+                    "pandas": pd.__version__,
+                    "scenario": scenario,
+                    "input_mb": round(len(data) / (1024 * 1024), 3),
+                    "stages": stages,
+                    "total": sum(stages.values())
+                }
+                if args.memory:
+                    record["peak_mb"] = round(measure_peak(manager, filename, data), 1)
+                records.append(record)
+
+                previous = previous_result(history, scenario)
+                cells = [f"{stages[stage]:>7.3f}{format_delta(stages[stage], previous and previous['stages'].get(stage)):>6}"
+                         for stage in STAGES]
+                print(f"{rows:>9} {fmt:<7} " + " ".join(cells) +
+                      f" {record['total']:>9.3f} {format_delta(record['total'], previous and previous['total'])}")
+    finally:
+        standin.stop()
+
+    if records and not args.no_save:
+        RESULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with RESULTS_FILE.open("a", encoding="utf-8") as handle:
+            for record in records:
+                handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"Resultados anexados a {RESULTS_FILE.relative_to(ROOT)} (revisão {revision})")
+
+if __name__ == "__main__":
+    main()
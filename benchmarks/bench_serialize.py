@@ -0,0 +1,84 @@
+"""
+Compara a gravação de XLSX do pipeline de upload:
+
+- pandas to_excel (openpyxl), o caminho usado antes do SpreadsheetWriter
+- SpreadsheetWriter com openpyxl write-only
+- SpreadsheetWriter com xlsxwriter em constant_memory (se instalado)
+
+Uso: python benchmarks/bench_serialize.py --rows 10000 100000 --cols 20
+"""
+import argparse
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from pipeline import Config, SpreadsheetReader, SpreadsheetWriter  # noqa: E402
+
+def make_frame(rows: int, cols: int, seed: int = 0) -> pd.DataFrame:
+    """DataFrame largo com texto, números, datas e alguns nulos"""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        kind = i % 4
+        if kind == 0:
+            data[f"TXT_{i}"] = rng.choice(["ALFA", "BETA", "GAMA", "DELTA"], rows)
+        elif kind == 1:
+            values = rng.normal(1000, 250, rows).round(2)
+            values[rng.random(rows) < 0.05] = np.nan
+            data[f"VLR_{i}"] = values
+        elif kind == 2:
+            data[f"QTD_{i}"] = rng.integers(0, 500, rows)
+        else:
+            data[f"DATA_{i}"] = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D")
+    return pd.DataFrame(data)
+
+def pandas_to_excel(df: pd.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False, sheet_name="Sheet1")
+    return buffer.getvalue()
+
+def writer_with(fast: bool):
+    def write(df: pd.DataFrame) -> bytes:
+        Config.USE_FAST_WRITER = fast
+        return SpreadsheetWriter.write_xlsx(df, "Sheet1")
+    return write
+
+def measure(write, df: pd.DataFrame):
+    # Tempo e memória em execuções separadas: o tracemalloc deixa a gravação várias vezes mais lenta
+    start = time.perf_counter()
+    content = write(df)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    write(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024), len(content) / (1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--cols", type=int, default=20)
+    args = parser.parse_args()
+
+    writers = {"pandas.to_excel": pandas_to_excel, "openpyxl write-only": writer_with(False)}
+    if SpreadsheetReader.is_available("xlsxwriter"):
+        writers["xlsxwriter constant_memory"] = writer_with(True)
+    else:
+        print("xlsxwriter não instalado: comparação sem o modo constant_memory")
+
+    print(f"{'linhas':>9} {'writer':<28} {'tempo (s)':>10} {'pico (MB)':>10} {'arquivo (MB)':>13}")
+    for rows in args.rows:
+        df = make_frame(rows, args.cols)
+        for name, write in writers.items():
+            elapsed, peak_mb, size_mb = measure(write, df)
+            print(f"{rows:>9} {name:<28} {elapsed:>10.2f} {peak_mb:>10.1f} {size_mb:>13.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Gera planilhas sintéticas no schema de faturamento_geral_consolidado_limpar.xlsx
+(Config.EXPECTED_SCHEMAS), com duplicatas, nulos e colunas extras configuráveis.
+
+Uso: python benchmarks/generate_faturamento.py --rows 100000 --extra-columns 5 --output /tmp/faturamento.xlsx
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from pipeline import Config, SpreadsheetWriter  # noqa: E402
+
+SCHEMA_FILE = "faturamento_geral_consolidado_limpar.xlsx"
+
+GRUPOS = ["GRUPO NORTE", "GRUPO SUL", "GRUPO LESTE", "GRUPO OESTE", "GRUPO CENTRAL"]
+MARCAS = ["HYUNDAI", "JEEP", "VW", "PSA", "GWM", "MAN", "FIAT", "TOYOTA"]
+UFS = ["SP", "RJ", "MG", "PR", "SC", "RS", "BA", "GO", "DF", "PE"]
+MUNICIPIOS = ["SÃO PAULO", "RIO DE JANEIRO", "BELO HORIZONTE", "CURITIBA", "FLORIANÓPOLIS",
+              "PORTO ALEGRE", "SALVADOR", "GOIÂNIA", "BRASÍLIA", "RECIFE"]
+PESSOAS = ["ANA", "BRUNO", "CARLA", "DIEGO", "ELISA", "FÁBIO", "GABRIEL", "HELENA"]
+
+def column_kind(col: str) -> str:
+    """Tipo do valor gerado para cada coluna do schema (mesmas regras do Parquet tipado)"""
+    kind = SpreadsheetWriter.column_type(col)
+    if kind:
+        return kind
+    if col == "RECEBIDO":
+        return "numeric"
+    return "category"
+
+def generate(rows: int, extra_columns: int = 0, duplicate_ratio: float = 0.02,
+             null_ratio: float = 0.05, seed: int = 0) -> pd.DataFrame:
+    """
+    DataFrame com as colunas esperadas na ordem do schema. duplicate_ratio das linhas são cópias
+    exatas de outras linhas; null_ratio das células das colunas não-chave ficam vazias.
+    """
+    rng = np.random.default_rng(seed)
+    unique_rows = max(1, rows - int(rows * duplicate_ratio))
+    keys = set(Config.CONSOLIDATION_KEYS)
+    base_date = np.datetime64("2023-01-01")
+    lojas = [f"LOJA {i:03d}" for i in range(200)]
+    data = {}
+
+    for col in Config.EXPECTED_SCHEMAS[SCHEMA_FILE]:
+        kind = column_kind(col)
+        if col == "CNPJ":
+            values = rng.integers(10**13, 10**14 - 1, unique_rows, dtype=np.int64).astype(np.float64)
+        elif col == "NF":
+            # Sequencial: CNPJ + NF + DATA_MES não se repetem entre as linhas únicas
+            values = np.arange(1, unique_rows + 1, dtype=np.float64)
+        elif col == "DATA_MES":
+            values = (base_date.astype("datetime64[M]") + rng.integers(0, 24, unique_rows)).astype("datetime64[ns]")
+        elif kind == "date":
+            values = (base_date + rng.integers(0, 730, unique_rows)).astype("datetime64[ns]")
+        elif kind == "numeric":
+            values = rng.gamma(2.0, 500.0, unique_rows).round(2)
+            if col.startswith("QTD_"):
+                values = values.round(0)
+        elif col in ("GRUPO", "EMPRESA"):
+            values = rng.choice(GRUPOS, unique_rows)
+        elif col in ("MARCA",):
+            values = rng.choice(MARCAS, unique_rows)
+        elif col == "UF":
+            values = rng.choice(UFS, unique_rows)
+        elif col == "MUNICIPIO":
+            values = rng.choice(MUNICIPIOS, unique_rows)
+        elif col in ("CONCESSIONÁRIA", "LOJA"):
+            values = rng.choice(lojas, unique_rows)
+        else:
+            values = rng.choice(PESSOAS, unique_rows).astype(object)
+
+        if col not in keys and null_ratio > 0:
+            values = pd.Series(values)
+            values[rng.random(unique_rows) < null_ratio] = None
+        data[col] = values
+
+    for i in range(extra_columns):
+        data[f"EXTRA_{i + 1}"] = rng.normal(100, 30, unique_rows).round(2)
+
+    df = pd.DataFrame(data)
+    if rows > unique_rows:
+        # Cópias exatas espalhadas pelo arquivo
+        copies = df.iloc[rng.integers(0, unique_rows, rows - unique_rows)]
+        df = pd.concat([df, copies], ignore_index=True)
+        df = df.iloc[rng.permutation(rows)].reset_index(drop=True)
+    return df
+
+def to_bytes(df: pd.DataFrame, fmt: str) -> bytes:
+    """Serializa como o usuário enviaria: XLSX com uma aba ou CSV no padrão brasileiro"""
+    if fmt == "csv":
+        return df.to_csv(index=False, sep=";", decimal=",").encode("utf-8")
+    return SpreadsheetWriter.write_xlsx(df, "Sheet1")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--extra-columns", type=int, default=0)
+    parser.add_argument("--duplicates", type=float, default=0.02, help="fração de linhas duplicadas")
+    parser.add_argument("--nulls", type=float, default=0.05, help="fração de células vazias")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=SCHEMA_FILE, help="caminho .xlsx ou .csv")
+    args = parser.parse_args()
+
+    df = generate(args.rows, args.extra_columns, args.duplicates, args.nulls, args.seed)
+    fmt = "csv" if args.output.lower().endswith(".csv") else "xlsx"
+    Path(args.output).write_bytes(to_bytes(df, fmt))
+    print(f"{args.output}: {len(df)} linhas, {len(df.columns)} colunas")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2417 @@
+"""
+Pipeline de upload sem Streamlit: leitura, validação, remoção de duplicatas, backup e envio
+das planilhas para o OneDrive/SharePoint. O app (app.py) importa daqui; cargas automáticas
+usam a linha de comando:
+
+    python pipeline.py exportacao/ --workers 4 > resultado.json
+"""
+import pandas as pd
+import numpy as np
+import requests
+import argparse
+import glob
+import logging
+import threading
+import time
+import random
+import uuid
+import json
+import tempfile
+import zipfile
+import shutil
+import hashlib
+import base64
+import importlib.util
+import codecs
+import csv
+import re
+import sys
+import os
+import contextvars
+from collections import deque, OrderedDict
+from functools import cached_property, lru_cache
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Optional, Tuple, List, Dict, Any, Callable, Iterator, Union, Mapping
+from msal import ConfidentialClientApplication
+from requests.adapters import HTTPAdapter
+import unicodedata
+import io
+from pathlib import Path
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# === CONSTANTES ===
+class Config:
+    PASTA = "Documentos Compartilhados/LimparAuto/FontedeDados"
+    MAX_FILE_SIZE_MB = 50
+    SUPPORTED_FORMATS = ["xlsx", "xls", "csv"]
+    # Endpoints do Graph e da autoridade de tokens; as variáveis de ambiente permitem apontá-los
+    # para um serviço local (tools/graph_standin.py) em testes de carga
+    GRAPH_API_BASE = os.environ.get("GRAPH_API_BASE", "https://graph.microsoft.com/v1.0")
+    AUTHORITY_BASE = os.environ.get("GRAPH_AUTHORITY_BASE", "https://login.microsoftonline.com")
+    # Certificado (PEM) aceito nas conexões HTTPS, ex.: o autoassinado do stand-in
+    GRAPH_CA_BUNDLE: Optional[str] = os.environ.get("GRAPH_CA_BUNDLE")
+    GRAPH_SCOPES = ["https://graph.microsoft.com/.default"]
+    # Renova o token alguns minutos antes de expirar (mesma folga usada pelo MSAL)
+    TOKEN_REFRESH_MARGIN_SECONDS = 300
+    
+    # Sessão HTTP compartilhada com o Graph
+    GRAPH_POOL_SIZE = 16
+    GRAPH_MAX_CONCURRENCY = 8
+    GRAPH_MAX_RETRIES = 4
+    GRAPH_BACKOFF_BASE_SECONDS = 0.5
+    GRAPH_BACKOFF_MAX_SECONDS = 30
+    GRAPH_TIMING_HISTORY = 200
+    GRAPH_BATCH_MAX_REQUESTS = 20  # Limite do endpoint $batch
+    
+    # Upload: PUT simples até 4MB, acima disso sessão de upload em blocos
+    SIMPLE_UPLOAD_MAX_BYTES = 4 * 1024 * 1024
+    UPLOAD_CHUNK_UNIT_BYTES = 320 * 1024  # Blocos devem ser múltiplos de 320 KiB
+    UPLOAD_CHUNK_MIN_BYTES = 5 * 320 * 1024
+    UPLOAD_CHUNK_MAX_BYTES = 60 * 320 * 1024
+    UPLOAD_TARGET_CHUNKS = 8
+    UPLOAD_CHUNK_TARGET_SECONDS = 10
+    UPLOAD_MAX_RESUMES = 5
+    # Tentativas quando outro upload publica o mesmo arquivo entre o backup e o envio
+    UPLOAD_CONFLICT_RETRIES = 3
+    
+    # Índice da pasta: após a listagem inicial, sincroniza só as mudanças via /delta
+    FOLDER_INDEX_TTL_SECONDS = 60
+    
+    # Listagem paginada: só os campos usados na aba de gerenciamento
+    LIST_PAGE_SIZE = 200
+    LIST_SELECT_FIELDS = "id,name,size,lastModifiedDateTime,file,folder,parentReference,@microsoft.graph.downloadUrl"
+    
+    # Envio de vários arquivos em paralelo
+    MAX_PARALLEL_UPLOADS = 4
+    
+    # Uploads em segundo plano (a interface apenas acompanha o estado de cada job)
+    UPLOAD_JOB_WORKERS = 4
+    UPLOAD_JOB_HISTORY = 100
+    
+    # Cache de planilhas lidas (compartilhado entre reruns e sessões)
+    PARSE_CACHE_MAX_MB = 512
+    
+    # Usa engines de leitura mais rápidos (python-calamine, pyarrow) quando instalados
+    USE_FAST_READERS = True
+    
+    # Gravação de XLSX linha a linha (xlsxwriter em modo constant_memory, se instalado)
+    USE_FAST_WRITER = True
+    SERIALIZE_SPOOL_MAX_MB = 64
+    
+    # Leitura de CSV: amostra usada para detectar codificação, separador e formato dos números
+    CSV_SNIFF_BYTES = 64 * 1024
+    
+    # Cópia Parquet tipada (opcional, requer pyarrow) para o refresh do Power BI
+    PARQUET_COMPRESSION = "snappy"
+    OUTPUT_MODES = {
+        "planilha": "📊 Só a planilha",
+        "ambos": "📊 Planilha + 🧱 Parquet",
+        "parquet": "🧱 Só Parquet"
+    }
+    
+    # Tipos das colunas na cópia Parquet (as demais mantêm o tipo lido, texto se misto)
+    COLUMN_TYPE_RULES = {
+        "numeric_prefixes": ["VLR_", "QTD_", "TOTAL_"],
+        "numeric_columns": [
+            "IMPOSTO", "IMP TOTAL", "BONIF UNIT", "BONIF TOTAL", "INDIC UNIT", "INDIC", "PROV UNIT",
+            "PROVISÃO", "BACKOFFICE (R$2)", "REEMBOLSO", "DIVERSOS", "GASTOS", "LUCRO LIQ", "VALOR",
+            "DESCONTOS", "A RECEBER", "A RECEBER.1", "ATRASO"
+        ],
+        "date_columns": ["DATA_MES", "DATA FATURA", "VENCIMENTO"],
+        "text_columns": ["CNPJ", "NF", "FAT OU NF", "UF"]
+    }
+    
+    # Métricas: um registro JSON por upload no log e histogramas no formato texto do Prometheus
+    METRICS_TEXTFILE: Optional[str] = None  # ex.: coletor textfile do node_exporter
+    METRICS_BUCKETS_SECONDS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+    
+    # Consolidação incremental: linhas enviadas substituem as do arquivo publicado com a mesma chave
+    CONSOLIDATION_KEYS = ["CNPJ", "NF", "DATA_MES"]
+    
+    # Schema das colunas esperadas por arquivo (baseado na planilha real)
+    EXPECTED_SCHEMAS = {
+        "faturamento_geral_consolidado_limpar.xlsx": [
+            "GRUPO", "CONCESSIONÁRIA", "LOJA", "MARCA", "UF", "MUNICIPIO", "RESPONSÁVEL", "CNPJ",
+            "VLR_DUTOS", "QTD_DUTOS", "TOTAL_DUTOS", "VLR_FREIO", "QTD_FREIO", "TOTAL_FREIO",
+            "VLR_SANITIZANTE", "QTD_SANITIZANTE", "TOTAL_SANITIZANTE", "VLR_VERNIZ", "QTD_VERNIZ", "TOTAL_VERNIZ",
+            "VLR_CX EVAP", "QTD_CX EVAP", "TOTAL_CX EVAP", "VLR_PROTEC", "QTD_PROTEC", "TOTAL_PROTEC",
+            "VLR_NITROGÊNIO", "QTD_NITROGÊNIO", "TOTAL_CX EVAP.1", "QTD_TOTAL", "VLR_TOTAL",
+            "DATA_MES", "EMPRESA", "DATA FATURA", "ATRASO", "VENCIMENTO", "FAT OU NF", "NF",
+            "RESP/ LEVA", "RECEBIDO", "VLR_RECEBIDO", "A RECEBER", "ENVIAR PARA", "OBS",
+            "IMPOSTO", "IMP TOTAL", "BONIF UNIT", "EXTRA", "BONIF TOTAL", "INDIC UNIT", "INDIC",
+            "PROV UNIT", "PROVISÃO", "BACKOFFICE (R$2)", "REEMBOLSO", "DIVERSOS", "MÁQUINAS", "GASTOS",
+            "GABRIEL", "MAN", "HYUNDAI", "JEEP", "VW", "PSA", "GWM", "LUCRO LIQ", "%", "VALOR",
+            "DESCONTOS", "A RECEBER.1", "QTD_MAQ DUTO", "QTD_MAQ FREIO", "QTD_MAQ SANITIZANTE",
+            "QTD_MAQ VERNIZ", "QTD_CX EVAP.1", "TOTAL_MAQ", "CT", "SUP", "APLC", "FACILIT",
+            "CH OFIC", "AGEND", "CONTR", "OUTROS", "GPV", "DIR", "DIR GERAL", "POR TMO", "INDICAÇÃO", "PROVIS."
+        ]
+    }
+    
+    REQUIRED_CREDENTIALS = ["CLIENT_ID", "CLIENT_SECRET", "TENANT_ID", "EMAIL_ONEDRIVE", "SITE_ID", "DRIVE_ID"]
+    
+    @classmethod
+    def get_credentials(cls, secrets: Optional[Mapping[str, Any]] = None) -> Dict[str, str]:
+        """Obtém credenciais de secrets (ex.: st.secrets) ou, se não informados, das variáveis de ambiente"""
+        source = os.environ if secrets is None else secrets
+        missing = [name for name in cls.REQUIRED_CREDENTIALS if name not in source]
+        if missing:
+            raise ValueError(f"Credenciais não encontradas: {', '.join(missing)}")
+        return {name: source[name] for name in cls.REQUIRED_CREDENTIALS}
+    
+    @classmethod
+    def get_expected_schema(cls, filename: str) -> Optional[List[str]]:
+        """Obtém o schema esperado para um arquivo específico"""
+        filename_lower = filename.lower()
+        
+        # Busca exata primeiro
+        if filename_lower in cls.EXPECTED_SCHEMAS:
+            return cls.EXPECTED_SCHEMAS[filename_lower]
+        
+        # Busca por palavras-chave no nome do arquivo
+        for schema_file, columns in cls.EXPECTED_SCHEMAS.items():
+            schema_name = schema_file.split('.')[0]  # Remove extensão
+            if schema_name in filename_lower:
+                return columns
+        
+        return None
+
+# === MÉTRICAS ===
+class MetricsRegistry:
+    """Contadores e histogramas agregados entre sessões, exportados no formato texto do Prometheus"""
+    
+    PREFIX = "dsview"
+    HELP = {
+        "upload_total": ("counter", "Uploads concluídos por status"),
+        "upload_seconds": ("histogram", "Duração total do upload"),
+        "upload_stage_seconds": ("histogram", "Duração de cada etapa do upload"),
+        "upload_bytes_total": ("counter", "Bytes enviados ao OneDrive"),
+        "upload_rows_total": ("counter", "Linhas processadas"),
+        "parse_cache_hits_total": ("counter", "Etapas antes do envio servidas pelo cache de leitura, por etapa"),
+        "graph_requests_total": ("counter", "Respostas do Graph por método e status (0 = falha de conexão)"),
+        "graph_request_seconds": ("histogram", "Tempo de resposta do Graph por método"),
+        "graph_retries_total": ("counter", "Novas tentativas de requisições ao Graph"),
+    }
+    
+    def __init__(self, buckets: Tuple[float, ...] = Config.METRICS_BUCKETS_SECONDS):
+        self.buckets = buckets
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._histograms: Dict[Tuple[str, tuple], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+    
+    def observe_graph(self, method: str, status: Optional[int], seconds: float, attempt: int):
+        self.inc("graph_requests_total", method=method, status=str(status or 0))
+        self.observe("graph_request_seconds", seconds, method=method)
+        if attempt > 0:
+            self.inc("graph_retries_total", method=method)
+    
+    def record_upload(self, record: Dict[str, Any]):
+        """Agrega o registro de um upload (ver UploadTrace)"""
+        self.inc("upload_total", modo=record["modo"], status=record["status"])
+        self.observe("upload_seconds", record["segundos"], modo=record["modo"])
+        for stage, seconds in record["etapas"].items():
+            self.observe("upload_stage_seconds", seconds, etapa=stage)
+        self.inc("upload_bytes_total", record["contadores"].get("bytes_enviados", 0))
+        self.inc("upload_rows_total", record["contadores"].get("linhas", 0))
+    
+    @staticmethod
+    def _labels(labels: tuple, **extra) -> str:
+        items = list(labels) + list(extra.items())
+        if not items:
+            return ""
+        # Formato texto do Prometheus: barra, aspas e quebra de linha escapadas nos valores
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + "}"
+    
+    def render(self) -> str:
+        """Exposição em texto do Prometheus"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: {**value, "buckets": list(value["buckets"])} for key, value in self._histograms.items()}
+        
+        lines = []
+        for name, (kind, help_text) in self.HELP.items():
+            full_name = f"{self.PREFIX}_{name}"
+            lines += [f"# HELP {full_name} {help_text}", f"# TYPE {full_name} {kind}"]
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{full_name}{self._labels(labels)} {value:g}")
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    lines.append(f"{full_name}_bucket{self._labels(labels, le=f'{bound:g}')} {count}")
+                lines.append(f"{full_name}_bucket{self._labels(labels, le='+Inf')} {histogram['count']}")
+                lines.append(f"{full_name}_sum{self._labels(labels)} {histogram['sum']:.6f}")
+                lines.append(f"{full_name}_count{self._labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+    
+    def write_textfile(self, path: str):
+        """Grava atomicamente (arquivo temporário + rename), como pede o coletor textfile"""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        temp.write_text(self.render(), encoding="utf-8")
+        os.replace(temp, target)
+
+@lru_cache(maxsize=None)
+def get_metrics_registry() -> MetricsRegistry:
+    """Retorna o registro de métricas único do processo"""
+    return MetricsRegistry()
+
+class UploadTrace:
+    """
+    Cronômetros por etapa e contadores de um upload. Enquanto ativo (contextvar), também conta as
+    respostas do Graph; ao final vira um registro JSON no log e é agregado no MetricsRegistry.
+    """
+    
+    _current: contextvars.ContextVar = contextvars.ContextVar("upload_trace", default=None)
+    
+    def __init__(self, filename: str, mode: str, metrics: Optional[MetricsRegistry] = None):
+        self.metrics = metrics
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.record: Dict[str, Any] = {
+            "evento": "upload",
+            "arquivo": filename,
+            "modo": mode,
+            "inicio": datetime.now().isoformat(timespec="seconds"),
+            "status": None,
+            "segundos": None,
+            "etapas": {},
+            "contadores": {},
+            "graph": {"requisicoes": 0, "tentativas_extras": 0, "status": {}},
+        }
+    
+    @classmethod
+    def current(cls) -> Optional["UploadTrace"]:
+        return cls._current.get()
+    
+    @contextmanager
+    def activate(self):
+        """Torna este o trace corrente da thread (as threads filhas herdam via copy_context)"""
+        token = self._current.set(self)
+        try:
+            yield self
+        finally:
+            self._current.reset(token)
+    
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.record["etapas"][name] = round(self.record["etapas"].get(name, 0) + seconds, 4)
+    
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+    
+    def count(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                self.record["contadores"][name] = self.record["contadores"].get(name, 0) + value
+    
+    def on_graph_response(self, status: Optional[int], attempt: int):
+        with self._lock:
+            graph = self.record["graph"]
+            graph["requisicoes"] += 1
+            graph["tentativas_extras"] += attempt > 0
+            graph["status"][str(status or 0)] = graph["status"].get(str(status or 0), 0) + 1
+    
+    def finish(self, status: str) -> Dict[str, Any]:
+        """Fecha o registro, grava uma linha JSON no log e agrega nas métricas"""
+        with self._lock:
+            self.record["status"] = status
+            self.record["segundos"] = round(time.perf_counter() - self._start, 4)
+            record = json.loads(json.dumps(self.record))
+        logger.info(json.dumps(record, ensure_ascii=False))
+        if self.metrics:
+            self.metrics.record_upload(record)
+            if Config.METRICS_TEXTFILE:
+                try:
+                    self.metrics.write_textfile(Config.METRICS_TEXTFILE)
+                except OSError as e:
+                    logger.warning(f"Não foi possível gravar as métricas em {Config.METRICS_TEXTFILE}: {str(e)}")
+        return record
+
+@contextmanager
+def trace_stage(name: str):
+    """Cronometra a etapa no trace corrente (sem efeito fora de um upload)"""
+    trace = UploadTrace.current()
+    if trace is None:
+        yield
+    else:
+        with trace.stage(name):
+            yield
+
+# === CLIENTE HTTP DO MICROSOFT GRAPH ===
+class AdaptiveConcurrencyLimiter:
+    """Limita requisições simultâneas ao Graph, reduzindo o limite quando há throttling (AIMD)"""
+    
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+    
+    def __enter__(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+    
+    def on_throttle(self):
+        """Reduz o limite pela metade ao receber 429/503"""
+        with self._cond:
+            self.limit = max(self.min_limit, self.limit // 2)
+            self._successes = 0
+    
+    def on_success(self):
+        """Aumenta o limite em uma unidade a cada janela de respostas bem-sucedidas"""
+        with self._cond:
+            if self.limit >= self.max_limit:
+                return
+            self._successes += 1
+            if self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+class GraphClient:
+    """Sessão HTTP compartilhada com keep-alive, retentativas com backoff e respeito ao Retry-After"""
+    
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    THROTTLE_STATUS = {429, 503}
+    
+    def __init__(self, metrics: Optional[MetricsRegistry] = None):
+        self.metrics = metrics
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=Config.GRAPH_POOL_SIZE,
+            max_retries=0  # Retentativas tratadas em request() para respeitar o Retry-After
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if Config.GRAPH_CA_BUNDLE:
+            # Sem trust_env, o REQUESTS_CA_BUNDLE do ambiente não substitui o certificado configurado
+            self.session.verify = Config.GRAPH_CA_BUNDLE
+            self.session.trust_env = False
+        self.limiter = AdaptiveConcurrencyLimiter(Config.GRAPH_MAX_CONCURRENCY)
+        self._timings = deque(maxlen=Config.GRAPH_TIMING_HISTORY)
+        self._timings_lock = threading.Lock()
+    
+    @staticmethod
+    def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+        """Interpreta o header Retry-After (segundos ou data HTTP)"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max((retry_at - datetime.now(retry_at.tzinfo)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            return None
+    
+    @staticmethod
+    def _backoff_seconds(attempt: int) -> float:
+        """Backoff exponencial com jitter"""
+        delay = Config.GRAPH_BACKOFF_BASE_SECONDS * (2 ** attempt)
+        return min(delay, Config.GRAPH_BACKOFF_MAX_SECONDS) * random.uniform(0.5, 1.0)
+    
+    def _record(self, method: str, url: str, status: Optional[int], elapsed: float, attempt: int):
+        with self._timings_lock:
+            self._timings.append({
+                "timestamp": datetime.now(),
+                "method": method,
+                # Query string omitida: URLs de sessão de upload carregam credenciais
+                "path": urlsplit(url).path,
+                "status": status,
+                "elapsed_ms": round(elapsed * 1000, 1),
+                "attempt": attempt
+            })
+        if self.metrics:
+            self.metrics.observe_graph(method, status, elapsed, attempt)
+        trace = UploadTrace.current()
+        if trace:
+            trace.on_graph_response(status, attempt)
+    
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Executa uma requisição ao Graph com retentativas em 429/5xx e falhas de conexão.
+        O corpo (data) deve ser bytes para poder ser reenviado numa nova tentativa.
+        """
+        attempt = 0
+        while True:
+            with self.limiter:
+                start = time.perf_counter()
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except requests.exceptions.ConnectionError:
+                    self._record(method, url, None, time.perf_counter() - start, attempt)
+                    if attempt >= Config.GRAPH_MAX_RETRIES:
+                        raise
+                    response = None
+                else:
+                    self._record(method, url, response.status_code, time.perf_counter() - start, attempt)
+            
+            if response is not None:
+                if response.status_code not in self.RETRY_STATUS or attempt >= Config.GRAPH_MAX_RETRIES:
+                    if response.status_code not in self.THROTTLE_STATUS:
+                        self.limiter.on_success()
+                    return response
+                if response.status_code in self.THROTTLE_STATUS:
+                    self.limiter.on_throttle()
+                delay = self._retry_after_seconds(response)
+                if delay is None:
+                    delay = self._backoff_seconds(attempt)
+                delay = min(delay, Config.GRAPH_BACKOFF_MAX_SECONDS)
+                logger.warning(f"Graph respondeu {response.status_code} em {method} {urlsplit(url).path} - nova tentativa em {delay:.1f}s")
+            else:
+                delay = self._backoff_seconds(attempt)
+                logger.warning(f"Falha de conexão em {method} {urlsplit(url).path} - nova tentativa em {delay:.1f}s")
+            
+            time.sleep(delay)
+            attempt += 1
+    
+    def recent_timings(self) -> List[Dict[str, Any]]:
+        """Retorna as últimas requisições com status e tempo de resposta"""
+        with self._timings_lock:
+            return list(self._timings)
+
+# === CLASSE PARA GERENCIAR ONEDRIVE ===
+def quick_xor_hash(data: bytes) -> str:
+    """
+    quickXorHash do OneDrive for Business/SharePoint em base64. O byte i entra no bit
+    (11 * i) mod 160, então basta um XOR por coluna de 160 bytes seguido da rotação de cada coluna.
+    """
+    width = 160
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    full = len(buffer) - len(buffer) % width
+    columns = np.zeros(width, dtype=np.uint8)
+    if full:
+        columns ^= np.bitwise_xor.reduce(buffer[:full].reshape(-1, width), axis=0)
+    columns[:len(buffer) - full] ^= buffer[full:]
+    
+    mask = (1 << width) - 1
+    cell = 0
+    for i, value in enumerate(columns.tolist()):
+        if value:
+            shift = (i * 11) % width
+            cell ^= ((value << shift) | (value >> (width - shift))) & mask
+    
+    digest = bytearray(cell.to_bytes(width // 8, "little"))
+    # O tamanho do arquivo entra nos últimos 8 bytes
+    for i, byte in enumerate(len(data).to_bytes(8, "little")):
+        digest[width // 8 - 8 + i] ^= byte
+    return base64.b64encode(bytes(digest)).decode()
+
+class OneDriveManager:
+    def __init__(self, credentials: Optional[Dict[str, str]] = None):
+        # Sem credenciais explícitas (app usa st.secrets), lê das variáveis de ambiente
+        self.credentials = credentials or Config.get_credentials()
+        self._token_cache = None
+        self._token_expiry = None
+        self._token_lock = threading.Lock()
+        self._msal_app = None
+        self.graph = GraphClient(get_metrics_registry())
+    
+    def _get_msal_app(self) -> ConfidentialClientApplication:
+        """Cria o cliente MSAL uma única vez para reaproveitar seu cache de tokens"""
+        if self._msal_app is None:
+            # Com certificado próprio, o MSAL usa a mesma sessão (e o mesmo verify) do GraphClient
+            http_options = {"http_client": self.graph.session} if Config.GRAPH_CA_BUNDLE else {}
+            self._msal_app = ConfidentialClientApplication(
+                self.credentials["CLIENT_ID"],
+                authority=f"{Config.AUTHORITY_BASE}/{self.credentials['TENANT_ID']}",
+                client_credential=self.credentials["CLIENT_SECRET"],
+                # Autoridade fora da Microsoft (stand-in local) não passa pela descoberta de instância
+                instance_discovery=None if urlsplit(Config.AUTHORITY_BASE).hostname == "login.microsoftonline.com" else False,
+                **http_options
+            )
+        return self._msal_app
+    
+    def _token_is_valid(self) -> bool:
+        return (self._token_cache is not None and self._token_expiry is not None and
+                time.monotonic() < self._token_expiry)
+    
+    def get_token(self) -> Optional[str]:
+        """Obtém token de acesso com cache compartilhado entre reruns e sessões"""
+        # Caminho rápido: token válido não precisa de lock
+        if self._token_is_valid():
+            return self._token_cache
+        
+        try:
+            with self._token_lock:
+                # Outra thread pode ter renovado o token enquanto aguardávamos o lock
+                if self._token_is_valid():
+                    return self._token_cache
+                
+                result = self._get_msal_app().acquire_token_for_client(scopes=Config.GRAPH_SCOPES)
+                
+                if "access_token" in result:
+                    # Usa a validade real informada pelo Azure AD e renova antes de expirar
+                    expires_in = int(result.get("expires_in", 3600))
+                    self._token_cache = result["access_token"]
+                    self._token_expiry = time.monotonic() + max(expires_in - Config.TOKEN_REFRESH_MARGIN_SECONDS, 0)
+                    return self._token_cache
+                else:
+                    logger.error(f"Erro na autenticação: {result.get('error_description', 'Erro desconhecido')}")
+                    return None
+                
+        except Exception as e:
+            logger.error(f"Erro ao obter token: {str(e)}")
+            return None
+    
+    def get_item(self, nome_arquivo: str, token: str) -> Optional[Dict[str, Any]]:
+        """Metadados (id, tamanho, eTag e hashes) do arquivo na pasta, ou None se não existir"""
+        url = f"{Config.GRAPH_API_BASE}/sites/{self.credentials['SITE_ID']}/drives/{self.credentials['DRIVE_ID']}/root:/{Config.PASTA}/{nome_arquivo}"
+        headers = {"Authorization": f"Bearer {token}"}
+        
+        response = self.graph.request("GET", url, headers=headers, params={"$select": "id,name,size,eTag,file"}, timeout=30)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+    
+    @staticmethod
+    def content_matches(item: Dict[str, Any], conteudo: bytes) -> bool:
+        """Compara o conteúdo local com o hash que o Graph informa para o arquivo remoto"""
+        if item.get("size") != len(conteudo):
+            return False
+        
+        hashes = (item.get("file") or {}).get("hashes") or {}
+        if "quickXorHash" in hashes:
+            return hashes["quickXorHash"] == quick_xor_hash(conteudo)
+        if "sha256Hash" in hashes:
+            return hashes["sha256Hash"].lower() == hashlib.sha256(conteudo).hexdigest()
+        if "sha1Hash" in hashes:
+            return hashes["sha1Hash"].lower() == hashlib.sha1(conteudo).hexdigest()
+        return False
+    
+    def backup_existing_file(self, nome_arquivo: str, token: str, item: Optional[Dict[str, Any]] = None,
+                             strict: bool = False) -> bool:
+        """
+        Move arquivo existente para backup em uma única requisição: PATCH por id com o If-Match do
+        eTag lido antes do upload, ou PATCH direto pelo caminho quando nada foi lido (só antes de
+        qualquer envio). Se a versão lida mudou, o backup é cancelado (False): a versão nova pode ser
+        o próprio upload, gravado por uma tentativa que o Graph respondeu com erro.
+        Com strict, o arquivo lido ter sumido também retorna False.
+        """
+        try:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            file_stem = Path(nome_arquivo).stem
+            file_suffix = Path(nome_arquivo).suffix
+            novo_nome = f"{file_stem}_backup_{timestamp}{file_suffix}"
+            patch_body = {"name": novo_nome}
+            # Dois backups no mesmo segundo não devem falhar por conflito de nome
+            params = {"@microsoft.graph.conflictBehavior": "rename"}
+            
+            patch_headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"
+            }
+            if item is not None:
+                patch_url = f"{Config.GRAPH_API_BASE}/sites/{self.credentials['SITE_ID']}/drives/{self.credentials['DRIVE_ID']}/items/{item['id']}"
+                if item.get("eTag"):
+                    patch_headers["If-Match"] = item["eTag"]
+            else:
+                patch_url = f"{Config.GRAPH_API_BASE}/sites/{self.credentials['SITE_ID']}/drives/{self.credentials['DRIVE_ID']}/root:/{Config.PASTA}/{nome_arquivo}"
+            
+            patch_response = self.graph.request("PATCH", patch_url, headers=patch_headers, params=params, json=patch_body, timeout=30)
+            
+            if patch_response.status_code == 200:
+                return True
+            if patch_response.status_code == 404 and not strict:
+                return True  # Se arquivo não existe (ou outro upload já o moveu), não há problema
+            if patch_response.status_code in (404, 412):
+                logger.warning(f"Backup de {nome_arquivo} cancelado: o arquivo mudou desde a leitura")
+                return False
+            
+            logger.error(f"Erro no backup de {nome_arquivo}: {patch_response.status_code} {patch_response.text}")
+            return False
+            
+        except requests.exceptions.Timeout:
+            logger.warning(f"Timeout ao fazer backup de {nome_arquivo} - prosseguindo com upload")
+            return not strict
+        except Exception as e:
+            logger.error(f"Erro no backup: {str(e)}")
+            return False
+    
+    def _reread_after_conflict(self, nome_arquivo: str, token: str, conteudo: bytes) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Relê o arquivo depois que o caminho apareceu ocupado. Retorna (já publicado, item): o conteúdo
+        pode ser o próprio upload, gravado por uma tentativa anterior respondida com erro (ex.: 5xx).
+        """
+        item = self.get_item(nome_arquivo, token)
+        return item is not None and self.content_matches(item, conteudo), item
+    
+    @staticmethod
+    def _round_chunk_size(size: float) -> int:
+        """Ajusta o tamanho do bloco para múltiplo de 320 KiB dentro dos limites configurados"""
+        unit = Config.UPLOAD_CHUNK_UNIT_BYTES
+        size = int(-(-size // unit) * unit)
+        return max(Config.UPLOAD_CHUNK_MIN_BYTES, min(size, Config.UPLOAD_CHUNK_MAX_BYTES))
+    
+    def _upload_session_offset(self, upload_url: str) -> Optional[int]:
+        """Consulta a sessão de upload e retorna o próximo byte esperado pelo servidor"""
+        response = self.graph.request("GET", upload_url, timeout=30)
+        if response.status_code != 200:
+            return None
+        ranges = response.json().get("nextExpectedRanges", [])
+        if not ranges:
+            return None
+        return int(ranges[0].split("-")[0])
+    
+    def upload_large_file(self, nome_arquivo: str, conteudo: bytes, token: str,
+                          progress_callback: Optional[Callable[[str, int, int], None]] = None) -> Tuple[bool, int, str]:
+        """Envia arquivos grandes por sessão de upload em blocos, retomando após falhas de rede"""
+        url = f"{Config.GRAPH_API_BASE}/sites/{self.credentials['SITE_ID']}/drives/{self.credentials['DRIVE_ID']}/root:/{Config.PASTA}/{nome_arquivo}:/createUploadSession"
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        body = {"item": {"@microsoft.graph.conflictBehavior": "replace"}}
+        
+        response = self.graph.request("POST", url, headers=headers, json=body, timeout=30)
+        if response.status_code != 200:
+            return False, response.status_code, response.text
+        upload_url = response.json()["uploadUrl"]
+        
+        total = len(conteudo)
+        chunk_size = self._round_chunk_size(total / Config.UPLOAD_TARGET_CHUNKS)
+        offset = 0
+        resumes = 0
+        
+        while offset < total:
+            if progress_callback:
+                progress_callback("enviando", offset, total)
+            end = min(offset + chunk_size, total) - 1
+            # A URL da sessão já é autenticada: não enviar o header Authorization
+            chunk_headers = {
+                "Content-Length": str(end - offset + 1),
+                "Content-Range": f"bytes {offset}-{end}/{total}"
+            }
+            start = time.perf_counter()
+            try:
+                chunk_response = self.graph.request(
+                    "PUT", upload_url, headers=chunk_headers,
+                    data=conteudo[offset:end + 1], timeout=60
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                resumes += 1
+                if resumes > Config.UPLOAD_MAX_RESUMES:
+                    self.graph.request("DELETE", upload_url, timeout=30)
+                    raise
+                logger.warning(f"Falha no bloco {offset}-{end} de {nome_arquivo}: {str(e)} - retomando")
+                # Blocos menores após falha de rede
+                chunk_size = self._round_chunk_size(chunk_size / 2)
+                resumed_offset = self._upload_session_offset(upload_url)
+                if resumed_offset is not None:
+                    offset = resumed_offset
+                continue
+            
+            if chunk_response.status_code in (200, 201):
+                if progress_callback:
+                    progress_callback("enviando", total, total)
+                return True, chunk_response.status_code, chunk_response.text
+            
+            if chunk_response.status_code == 202:
+                # Ajusta o bloco seguinte pela vazão medida
+                elapsed = max(time.perf_counter() - start, 0.001)
+                chunk_size = self._round_chunk_size((end - offset + 1) / elapsed * Config.UPLOAD_CHUNK_TARGET_SECONDS)
+                ranges = chunk_response.json().get("nextExpectedRanges", [])
+                offset = int(ranges[0].split("-")[0]) if ranges else end + 1
+                continue
+            
+            if chunk_response.status_code == 416:
+                # Servidor já recebeu este intervalo: retoma de onde ele parou
+                resumed_offset = self._upload_session_offset(upload_url)
+                if resumed_offset is None:
+                    break
+                offset = resumed_offset
+                continue
+            
+            self.graph.request("DELETE", upload_url, timeout=30)
+            return False, chunk_response.status_code, chunk_response.text
+        
+        # Último bloco pode ter sido recebido sem que a resposta chegasse: confirma pelo item
+        item_url = f"{Config.GRAPH_API_BASE}/sites/{self.credentials['SITE_ID']}/drives/{self.credentials['DRIVE_ID']}/root:/{Config.PASTA}/{nome_arquivo}"
+        item_response = self.graph.request("GET", item_url, headers={"Authorization": f"Bearer {token}"}, timeout=30)
+        if item_response.status_code == 200 and item_response.json().get("size") == total:
+            return True, 200, item_response.text
+        return False, 500, "Sessão de upload encerrada sem confirmação do servidor"
+    
+    def _upload_staged(self, nome_arquivo: str, conteudo: bytes, token: str, fazer_backup: bool,
+                       item: Optional[Dict[str, Any]],
+                       progress_callback: Optional[Callable[[str, int, int], None]] = None,
+                       if_match: Optional[str] = None) -> Tuple[bool, int, str]:
+        """
+        Envia arquivos grandes para um nome temporário enquanto o backup roda em paralelo e
+        publica com um rename que falha se outro upload tiver criado o arquivo nesse meio tempo.
+        """
+        temp_name = f".{nome_arquivo}.{uuid.uuid4().hex[:8]}.uploading"
+        conditional = if_match is not None
+        
+        def backup() -> bool:
+            with trace_stage("backup"):
+                return self.backup_existing_file(nome_arquivo, token, item, strict=conditional)
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # copy_context: o backup, em outra thread, continua contando no trace do upload
+            backup_future = executor.submit(contextvars.copy_context().run, backup) if fazer_backup else None
+            with trace_stage("envio"):
+                sucesso, status, resposta = self.upload_large_file(temp_name, conteudo, token, progress_callback)
+            if progress_callback and backup_future and not backup_future.done():
+                progress_callback("backup", len(conteudo), len(conteudo))
+            backup_success = backup_future.result() if backup_future else True
+        
+        if not sucesso:
+            return sucesso, status, resposta
+        
+        staged_id = json.loads(resposta)["id"]
+        url = f"{Config.GRAPH_API_BASE}/sites/{self.credentials['SITE_ID']}/drives/{self.credentials['DRIVE_ID']}/items/{staged_id}"
+        if not backup_success:
+            if conditional:
+                self.graph.request("DELETE", url, headers={"Authorization": f"Bearer {token}"}, timeout=30)
+                return self._precondition_result(nome_arquivo, token, if_match)
+            logger.warning(f"Não foi possível fazer backup de {nome_arquivo}")
+        
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        conflict = "fail" if fazer_backup and backup_success or conditional else "replace"
+        
+        for _ in range(Config.UPLOAD_CONFLICT_RETRIES + 1):
+            with trace_stage("publicacao"):
+                response = self.graph.request(
+                    "PATCH", url, headers=headers, params={"@microsoft.graph.conflictBehavior": conflict},
+                    json={"name": nome_arquivo}, timeout=30
+                )
+            if response.status_code == 409 and conditional:
+                # Outro upload publicou depois da leitura: não sobrescreve
+                self.graph.request("DELETE", url, headers={"Authorization": f"Bearer {token}"}, timeout=30)
+                return False, 412, self.CHANGED_MESSAGE
+            if response.status_code == 409:
+                # Caminho ocupado: pelo próprio rename (repetido após um erro) ou por outro upload,
+                # cuja versão vai para backup pelo eTag lido agora antes de tentar de novo
+                current = self.get_item(nome_arquivo, token)
+                if current is not None and current["id"] == staged_id:
+                    return True, 200, json.dumps(current)
+                if current is not None:
+                    self.backup_existing_file(nome_arquivo, token, current)
+                continue
+            if response.status_code != 200:
+                self.graph.request("DELETE", url, headers={"Authorization": f"Bearer {token}"}, timeout=30)
+            return response.status_code == 200, response.status_code, response.text
+        
+        self.graph.request("DELETE", url, headers={"Authorization": f"Bearer {token}"}, timeout=30)
+        return False, 409, "Conflito: o arquivo foi publicado por outro upload simultâneo"
+    
+    CHANGED_MESSAGE = "O arquivo publicado mudou desde a leitura"
+    
+    def _precondition_result(self, nome_arquivo: str, token: str, if_match: str) -> Tuple[bool, int, str]:
+        """Resultado do upload condicional que não conseguiu mover o arquivo lido para backup"""
+        try:
+            item = self.get_item(nome_arquivo, token)
+        except requests.exceptions.RequestException as e:
+            return False, 500, f"Não foi possível consultar {nome_arquivo}: {str(e)}"
+        if (item["eTag"] if item else "") != if_match:
+            return False, 412, self.CHANGED_MESSAGE
+        return False, 500, f"Não foi possível fazer backup de {nome_arquivo}"
+    
+    def upload_file(self, nome_arquivo: str, conteudo: bytes, token: str, fazer_backup: bool = True,
+                    skip_if_unchanged: bool = True,
+                    progress_callback: Optional[Callable[[str, int, int], None]] = None,
+                    if_match: Optional[str] = None) -> Tuple[bool, int, str]:
+        """
+        Faz upload do arquivo para o OneDrive (status 304 = conteúdo idêntico, nada enviado).
+        progress_callback recebe (etapa, bytes enviados, total) com etapa "backup" ou "enviando".
+        if_match é o eTag do arquivo em que o conteúdo se baseia ("" = o arquivo não existia): se o
+        publicado mudou, retorna 412 sem sobrescrever. A versão lida sempre vai para backup.
+        """
+        conditional = if_match is not None
+        fazer_backup = fazer_backup or conditional
+        try:
+            # O eTag lido aqui amarra o backup à versão anterior ao upload
+            item = None
+            item_read = False
+            if skip_if_unchanged or fazer_backup:
+                try:
+                    with trace_stage("verificacao"):
+                        item = self.get_item(nome_arquivo, token)
+                    item_read = True
+                except requests.exceptions.RequestException as e:
+                    if conditional:
+                        return False, 500, f"Não foi possível consultar {nome_arquivo}: {str(e)}"
+                    logger.warning(f"Não foi possível consultar {nome_arquivo} antes do upload: {str(e)}")
+            
+            if conditional and (item["eTag"] if item else "") != if_match:
+                logger.info(f"Upload cancelado: {nome_arquivo} mudou no OneDrive desde a leitura")
+                return False, 412, self.CHANGED_MESSAGE
+            
+            # Conteúdo idêntico ao publicado: sem backup e sem transferência
+            if skip_if_unchanged and item is not None and self.content_matches(item, conteudo):
+                logger.info(f"Upload ignorado: {nome_arquivo} idêntico ao arquivo no OneDrive")
+                return True, 304, "unchanged"
+            
+            # Arquivos grandes não cabem no PUT simples
+            if len(conteudo) > Config.SIMPLE_UPLOAD_MAX_BYTES:
+                return self._upload_staged(nome_arquivo, conteudo, token, fazer_backup and not (conditional and item is None),
+                                           item, progress_callback, if_match)
+            
+            url = f"{Config.GRAPH_API_BASE}/sites/{self.credentials['SITE_ID']}/drives/{self.credentials['DRIVE_ID']}/root:/{Config.PASTA}/{nome_arquivo}:/content"
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/octet-stream"
+            }
+            
+            for _ in range(Config.UPLOAD_CONFLICT_RETRIES + 1):
+                # Fazer backup se solicitado: da versão lida, ou pelo caminho se a leitura falhou
+                backup_success = False
+                if fazer_backup and (item is not None or not item_read):
+                    if progress_callback:
+                        progress_callback("backup", 0, len(conteudo))
+                    with trace_stage("backup"):
+                        backup_success = self.backup_existing_file(nome_arquivo, token, item, strict=conditional)
+                    if not backup_success:
+                        if conditional:
+                            return self._precondition_result(nome_arquivo, token, if_match)
+                        landed, current = self._reread_after_conflict(nome_arquivo, token, conteudo)
+                        if landed:
+                            return True, 200, json.dumps(current)
+                        if current is not None and current.get("eTag") != (item or {}).get("eTag"):
+                            # Mudou entre a leitura e o backup: faz backup da versão atual e tenta de novo
+                            item, item_read = current, True
+                            continue
+                        logger.warning(f"Não foi possível fazer backup de {nome_arquivo} - prosseguindo com upload")
+                
+                # Após o backup (ou sem arquivo anterior) o caminho deve estar livre; se não estiver,
+                # outro upload chegou antes
+                free = backup_success or (fazer_backup and item_read and item is None)
+                conflict = "fail" if free or conditional else "replace"
+                if progress_callback:
+                    progress_callback("enviando", 0, len(conteudo))
+                with trace_stage("envio"):
+                    response = self.graph.request(
+                        "PUT", url, headers=headers, params={"@microsoft.graph.conflictBehavior": conflict},
+                        data=conteudo, timeout=60
+                    )
+                if response.status_code == 409 and conditional:
+                    return False, 412, self.CHANGED_MESSAGE
+                if response.status_code == 409:
+                    # Caminho ocupado: pelo próprio PUT (repetido após um 5xx que já tinha gravado)
+                    # ou por outro upload, que vai para backup pelo eTag lido agora
+                    landed, item = self._reread_after_conflict(nome_arquivo, token, conteudo)
+                    if landed:
+                        if progress_callback:
+                            progress_callback("enviando", len(conteudo), len(conteudo))
+                        return True, 200, json.dumps(item)
+                    item_read = True
+                    continue
+                success = response.status_code in [200, 201]
+                if success and progress_callback:
+                    progress_callback("enviando", len(conteudo), len(conteudo))
+                return success, response.status_code, response.text
+            
+            return False, 409, "Conflito: o arquivo foi publicado por outro upload simultâneo"
+            
+        except requests.exceptions.Timeout:
+            return False, 408, "Timeout durante o upload"
+        except Exception as e:
+            logger.error(f"Erro no upload: {str(e)}")
+            return False, 500, str(e)
+    
+    @staticmethod
+    def is_spreadsheet(item: Dict[str, Any]) -> bool:
+        # Inclui as cópias Parquet geradas pelo upload
+        return "folder" not in item and any(item['name'].lower().endswith(f'.{ext}') for ext in Config.SUPPORTED_FORMATS + ["parquet"])
+    
+    # None = ainda não testado se o Graph aceita $filter na listagem da pasta
+    _children_filter_supported: Optional[bool] = None
+    
+    def iter_children(self, token: str) -> Iterator[List[Dict[str, Any]]]:
+        """Percorre a pasta página a página (@odata.nextLink), levantando exceção em caso de erro"""
+        url = f"{Config.GRAPH_API_BASE}/users/{self.credentials['EMAIL_ONEDRIVE']}/drive/root:/{Config.PASTA}:/children"
+        headers = {"Authorization": f"Bearer {token}"}
+        params = {"$select": Config.LIST_SELECT_FIELDS, "$top": Config.LIST_PAGE_SIZE}
+        
+        # Exclui subpastas no servidor; nem todo drive suporta $filter em /children
+        if self._children_filter_supported is not False:
+            response = self.graph.request("GET", url, headers=headers, params={**params, "$filter": "file ne null"}, timeout=30)
+            if response.status_code == 400:
+                logger.info("Graph não aceita $filter na listagem da pasta, filtrando localmente")
+                self._children_filter_supported = False
+                response = self.graph.request("GET", url, headers=headers, params=params, timeout=30)
+            else:
+                self._children_filter_supported = response.ok or None
+        else:
+            response = self.graph.request("GET", url, headers=headers, params=params, timeout=30)
+        
+        if response.status_code == 404:
+            # Pasta ainda não criada (nenhum upload feito): equivale a uma pasta vazia
+            yield []
+            return
+        
+        while True:
+            response.raise_for_status()
+            data = response.json()
+            yield data.get("value", [])
+            
+            # O nextLink já carrega $select/$top/$filter e o cursor da próxima página
+            next_link = data.get("@odata.nextLink")
+            if not next_link:
+                return
+            response = self.graph.request("GET", next_link, headers=headers, timeout=30)
+    
+    def list_children(self, token: str) -> List[Dict[str, Any]]:
+        """Lista todos os itens da pasta (levanta exceção se o Graph responder com erro)"""
+        return [item for page in self.iter_children(token) for item in page]
+    
+    def list_files(self, token: str) -> List[Dict[str, Any]]:
+        """Lista arquivos na pasta do OneDrive"""
+        try:
+            # Filtrar apenas arquivos de planilha
+            return [f for f in self.list_children(token) if self.is_spreadsheet(f)]
+        
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"Erro ao listar arquivos: {e.response.status_code}")
+            return []
+        except Exception as e:
+            logger.error(f"Erro ao listar arquivos: {str(e)}")
+            return []
+    
+    def get_download_url(self, token: str, file_id: str) -> Optional[str]:
+        """Link de download temporário do item (itens vindos do /delta não trazem o link)"""
+        try:
+            response = self.graph.request(
+                "GET", f"{Config.GRAPH_API_BASE}{self._item_path(file_id)}",
+                headers={"Authorization": f"Bearer {token}"}, timeout=30
+            )
+            if response.status_code == 200:
+                return response.json().get("@microsoft.graph.downloadUrl")
+        except Exception as e:
+            logger.error(f"Erro ao obter link de download: {str(e)}")
+        return None
+    
+    def download_file(self, token: str, file_id: str) -> bytes:
+        """Baixa o conteúdo do item (levanta exceção em caso de erro)"""
+        response = self.graph.request(
+            "GET", f"{Config.GRAPH_API_BASE}{self._item_path(file_id)}/content",
+            headers={"Authorization": f"Bearer {token}"}, timeout=120
+        )
+        response.raise_for_status()
+        return response.content
+    
+    def delete_file(self, token: str, file_id: str) -> bool:
+        """Deleta um arquivo do OneDrive"""
+        try:
+            url = f"{Config.GRAPH_API_BASE}/users/{self.credentials['EMAIL_ONEDRIVE']}/drive/items/{file_id}"
+            headers = {"Authorization": f"Bearer {token}"}
+            
+            response = self.graph.request("DELETE", url, headers=headers, timeout=30)
+            return response.status_code == 204
+            
+        except Exception as e:
+            logger.error(f"Erro ao deletar arquivo: {str(e)}")
+            return False
+    
+    def batch(self, token: str, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Executa operações via JSON $batch, em lotes de até 20, repetindo as que sofrerem throttling.
+        Cada operação tem "method", "url" (relativa à versão da API) e opcionalmente "body".
+        Retorna {"status", "body"} de cada operação, na mesma ordem recebida (status 0 = sem resposta).
+        """
+        url = f"{Config.GRAPH_API_BASE}/$batch"
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        results: List[Optional[Dict[str, Any]]] = [None] * len(operations)
+        pending = list(range(len(operations)))
+        attempt = 0
+        
+        while pending:
+            throttled = []
+            retry_after = 0.0
+            for start in range(0, len(pending), Config.GRAPH_BATCH_MAX_REQUESTS):
+                chunk = pending[start:start + Config.GRAPH_BATCH_MAX_REQUESTS]
+                batch_requests = []
+                for i in chunk:
+                    op = operations[i]
+                    request = {"id": str(i), "method": op["method"], "url": op["url"]}
+                    if "body" in op:
+                        request["body"] = op["body"]
+                        request["headers"] = {"Content-Type": "application/json"}
+                    batch_requests.append(request)
+                
+                try:
+                    response = self.graph.request("POST", url, headers=headers, json={"requests": batch_requests}, timeout=60)
+                except requests.exceptions.RequestException as e:
+                    logger.error(f"Erro no $batch: {str(e)}")
+                    for i in chunk:
+                        results[i] = {"status": 0, "body": str(e)}
+                    continue
+                
+                if response.status_code != 200:
+                    for i in chunk:
+                        results[i] = {"status": response.status_code, "body": response.text}
+                    continue
+                
+                for item_response in response.json().get("responses", []):
+                    i = int(item_response["id"])
+                    if i not in chunk:
+                        continue
+                    status = item_response.get("status", 0)
+                    if status in GraphClient.THROTTLE_STATUS and attempt < Config.GRAPH_MAX_RETRIES:
+                        throttled.append(i)
+                        try:
+                            retry_after = max(retry_after, float((item_response.get("headers") or {}).get("Retry-After", 0)))
+                        except ValueError:
+                            pass
+                        continue
+                    results[i] = {"status": status, "body": item_response.get("body")}
+            
+            if throttled:
+                # Operações com 429/503 dentro do lote voltam na próxima rodada
+                self.graph.limiter.on_throttle()
+                time.sleep(min(retry_after or GraphClient._backoff_seconds(attempt), Config.GRAPH_BACKOFF_MAX_SECONDS))
+                attempt += 1
+            pending = sorted(throttled)
+        
+        # Operação que o Graph deixou sem resposta no lote é falha, não "nem feita nem falhou"
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = {"status": 0, "body": "O Graph não retornou resposta para esta operação"}
+        return results
+    
+    def _item_path(self, file_id: str) -> str:
+        return f"/users/{self.credentials['EMAIL_ONEDRIVE']}/drive/items/{file_id}"
+    
+    def delete_files(self, token: str, file_ids: List[str]) -> List[Dict[str, Any]]:
+        """Deleta vários arquivos com $batch"""
+        return self.batch(token, [{"method": "DELETE", "url": self._item_path(file_id)} for file_id in file_ids])
+    
+    def rename_files(self, token: str, new_names: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Renomeia vários arquivos ({id: novo nome}) com $batch"""
+        return self.batch(token, [
+            {"method": "PATCH", "url": self._item_path(file_id), "body": {"name": name}}
+            for file_id, name in new_names.items()
+        ])
+    
+    def move_files(self, token: str, file_ids: List[str], destination: str) -> List[Dict[str, Any]]:
+        """Move vários arquivos para outra pasta do drive com $batch"""
+        parent = {"path": f"/drive/root:/{destination.strip('/')}"}
+        return self.batch(token, [
+            {"method": "PATCH", "url": self._item_path(file_id), "body": {"parentReference": parent}}
+            for file_id in file_ids
+        ])
+    
+    def get_files_metadata(self, token: str, file_ids: List[str]) -> List[Dict[str, Any]]:
+        """Obtém metadados de vários arquivos com $batch"""
+        return self.batch(token, [{"method": "GET", "url": self._item_path(file_id)} for file_id in file_ids])
+
+class FolderIndex:
+    """
+    Índice em memória dos arquivos da pasta: a listagem completa roda uma vez e, depois,
+    apenas as mudanças são aplicadas via /delta (no máximo a cada FOLDER_INDEX_TTL_SECONDS).
+    """
+    
+    def __init__(self, onedrive_manager: OneDriveManager):
+        self.manager = onedrive_manager
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._folder_id: Optional[str] = None
+        self._delta_link: Optional[str] = None
+        self._synced_at: Optional[float] = None
+        self._lock = threading.Lock()
+    
+    def _drive_url(self) -> str:
+        return f"{Config.GRAPH_API_BASE}/users/{self.manager.credentials['EMAIL_ONEDRIVE']}/drive"
+    
+    def _get(self, url: str, token: str, **kwargs) -> requests.Response:
+        return self.manager.graph.request("GET", url, headers={"Authorization": f"Bearer {token}"}, timeout=30, **kwargs)
+    
+    def _full_sync(self, token: str, on_page: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        """Listagem completa da pasta e marcador do /delta a partir deste momento"""
+        # O marcador é obtido antes da listagem para não perder mudanças feitas durante ela
+        response = self._get(
+            f"{self._drive_url()}/root/delta", token,
+            params={"token": "latest", "$select": Config.LIST_SELECT_FIELDS + ",deleted"}
+        )
+        response.raise_for_status()
+        delta_link = response.json()["@odata.deltaLink"]
+        
+        response = self._get(f"{self._drive_url()}/root:/{Config.PASTA}", token, params={"$select": "id"})
+        if response.status_code == 404:
+            # Pasta ainda não criada: índice vazio até o primeiro upload
+            self._folder_id = None
+        else:
+            response.raise_for_status()
+            self._folder_id = response.json()["id"]
+        
+        items = {}
+        for page in self.manager.iter_children(token):
+            items.update((item["id"], item) for item in page)
+            if on_page:
+                on_page(self._spreadsheets(items.values()))
+        self._items = items
+        self._delta_link = delta_link
+        self._synced_at = time.monotonic()
+    
+    def _delta_sync(self, token: str):
+        """Aplica ao índice apenas os itens alterados desde a última sincronização"""
+        if self._folder_id is None:
+            # Sem o id da pasta não dá para reconhecer os itens dela no /delta
+            self._full_sync(token)
+            return
+        url = self._delta_link
+        changes = 0
+        while url:
+            response = self._get(url, token)
+            if response.status_code == 410:
+                # Marcador expirado: o Graph exige nova listagem completa
+                self._full_sync(token)
+                return
+            response.raise_for_status()
+            data = response.json()
+            
+            for item in data.get("value", []):
+                in_folder = (item.get("parentReference") or {}).get("id") == self._folder_id
+                if "deleted" in item or not in_folder:
+                    changes += self._items.pop(item["id"], None) is not None
+                else:
+                    # Itens do /delta podem vir sem alguns campos (ex.: link de download)
+                    self._items[item["id"]] = {**self._items.get(item["id"], {}), **item}
+                    changes += 1
+            
+            url = data.get("@odata.nextLink")
+            if not url:
+                self._delta_link = data.get("@odata.deltaLink", self._delta_link)
+        
+        self._synced_at = time.monotonic()
+        logger.info(f"Índice da pasta sincronizado via delta: {changes} alteração(ões)")
+    
+    def _spreadsheets(self, items) -> List[Dict[str, Any]]:
+        files = [item for item in items if self.manager.is_spreadsheet(item)]
+        return sorted(files, key=lambda item: item["name"].lower())
+    
+    def get_files(self, token: str, force_sync: bool = False,
+                  on_page: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Arquivos de planilha da pasta, sincronizando se o índice estiver vencido ou se pedido.
+        Na listagem completa, on_page recebe os arquivos já carregados a cada página.
+        """
+        with self._lock:
+            if self._delta_link is None:
+                self._full_sync(token, on_page)
+            elif force_sync or self._synced_at is None or time.monotonic() - self._synced_at > Config.FOLDER_INDEX_TTL_SECONDS:
+                self._delta_sync(token)
+            
+            return self._spreadsheets(self._items.values())
+    
+    def invalidate(self):
+        """Força sincronização via delta na próxima leitura (após uploads, exclusões, etc.)"""
+        self._synced_at = None
+
+# === FUNÇÕES DE VALIDAÇÃO ===
+class RowHashIndex:
+    """
+    Hash de 64 bits por linha, calculado uma única vez por DataFrame. Contagem, agrupamento,
+    preview e remoção de duplicatas saem dele sem chamar df.duplicated() no DataFrame inteiro.
+    Hash igual é só candidato (colunas de texto viram string antes do hash, então 1 e "1"
+    colidem): as repetições são confirmadas pelos valores reais das linhas candidatas.
+    """
+    
+    def __init__(self, hashes: np.ndarray, df: pd.DataFrame):
+        self.hashes = hashes
+        self.df = df
+    
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "RowHashIndex":
+        return cls(pd.util.hash_pandas_object(df, index=False).to_numpy(), df)
+    
+    def __sizeof__(self) -> int:
+        return self.hashes.nbytes * 3
+    
+    @cached_property
+    def candidates(self) -> np.ndarray:
+        """Posições cujo hash se repete"""
+        return np.flatnonzero(pd.Series(self.hashes).duplicated(keep=False).to_numpy())
+    
+    def _confirmed(self, keep) -> np.ndarray:
+        """Máscara de df.duplicated(keep=keep), calculada só sobre as candidatas"""
+        mask = np.zeros(len(self.hashes), dtype=bool)
+        if len(self.candidates):
+            mask[self.candidates] = self.df.iloc[self.candidates].duplicated(keep=keep).to_numpy()
+        return mask
+    
+    @cached_property
+    def duplicated_mask(self) -> np.ndarray:
+        """Repetições após a primeira ocorrência (equivalente a df.duplicated())"""
+        return self._confirmed("first")
+    
+    @cached_property
+    def all_duplicated_mask(self) -> np.ndarray:
+        """Todas as linhas que se repetem, incluindo a primeira ocorrência (keep=False)"""
+        return self._confirmed(False)
+    
+    @property
+    def duplicate_count(self) -> int:
+        return int(self.duplicated_mask.sum())
+    
+    def drop_duplicates(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Equivalente a df.drop_duplicates() usando a máscara já calculada"""
+        return df[~self.duplicated_mask]
+    
+    @cached_property
+    def duplicate_groups(self) -> Dict[str, np.ndarray]:
+        """
+        Agrupa as linhas repetidas pelo hash (vazios contam como valores iguais). Retorna as
+        posições ordenadas por grupo, a contagem de cada grupo e o início de cada grupo nas posições.
+        """
+        positions = np.flatnonzero(self.all_duplicated_mask)
+        # Ids de grupo na ordem da primeira ocorrência
+        group_ids, uniques = pd.factorize(self.hashes[positions])
+        rows = self.df.iloc[positions]
+        if len(uniques) != int((~rows.duplicated()).sum()):
+            # Linhas diferentes com o mesmo hash: agrupa pelos valores
+            group_ids = rows.groupby(list(rows.columns), dropna=False, sort=False).ngroup().to_numpy()
+        order = np.argsort(group_ids, kind="stable")
+        counts = np.bincount(group_ids)
+        return {
+            "positions": positions[order],
+            "counts": counts,
+            "offsets": np.concatenate(([0], np.cumsum(counts)))
+        }
+
+class DataValidator:
+    @staticmethod
+    def validate_column_names(df: pd.DataFrame) -> Tuple[bool, List[str]]:
+        """Valida nomes de colunas"""
+        invalid_columns = []
+        
+        for col in df.columns:
+            # Normaliza para ASCII
+            col_ascii = unicodedata.normalize("NFKD", str(col)).encode("ASCII", "ignore").decode()
+            
+            # Verifica se contém apenas caracteres válidos
+            if not col_ascii.replace("_", "").replace(" ", "").isalnum():
+                invalid_columns.append(col)
+        
+        return len(invalid_columns) == 0, invalid_columns
+    
+    @staticmethod
+    def analyze_data_quality(df: pd.DataFrame, row_index: Optional[RowHashIndex] = None) -> Dict[str, Any]:
+        """Analisa qualidade dos dados"""
+        if row_index is None:
+            row_index = RowHashIndex.from_dataframe(df)
+        
+        analysis = {
+            "total_rows": len(df),
+            "total_columns": len(df.columns),
+            "null_columns": df.columns[df.isnull().any()].tolist(),
+            "duplicate_rows": row_index.duplicate_count,
+            "memory_usage": df.memory_usage(deep=True).sum() / 1024 / 1024,  # MB
+            "column_types": df.dtypes.to_dict()
+        }
+        
+        return analysis
+    
+    @staticmethod
+    def validate_schema(df: pd.DataFrame, filename: str) -> Dict[str, Any]:
+        """
+        Valida se o schema das colunas está compatível com o Power BI
+        NOVA LÓGICA: Permite novas colunas, mas verifica se as colunas existentes estão corretas
+        """
+        expected_columns = Config.get_expected_schema(filename)
+        
+        if expected_columns is None:
+            return {
+                "is_valid": True,
+                "has_schema": False,
+                "message": "Schema não definido para este arquivo - upload permitido",
+                "allow_consolidation": True
+            }
+        
+        current_columns = list(df.columns)
+        
+        # NOVA LÓGICA: Verifica se todas as colunas esperadas estão presentes
+        # Permite colunas extras (novas colunas)
+        missing_columns = [col for col in expected_columns if col not in current_columns]
+        extra_columns = [col for col in current_columns if col not in expected_columns]
+        
+        # Válido se não há colunas faltando (colunas extras são permitidas)
+        is_valid = len(missing_columns) == 0
+        allow_consolidation = is_valid  # Permite consolidação se não há colunas faltando
+        
+        if is_valid and extra_columns:
+            message = f"Schema compatível com novas colunas detectadas: {', '.join(extra_columns)}"
+        elif is_valid:
+            message = "Schema totalmente compatível"
+        else:
+            message = f"Schema incompatível - colunas obrigatórias ausentes: {', '.join(missing_columns)}"
+        
+        return {
+            "is_valid": is_valid,
+            "has_schema": True,
+            "expected_columns": expected_columns,
+            "current_columns": current_columns,
+            "missing_columns": missing_columns,
+            "extra_columns": extra_columns,
+            "allow_consolidation": allow_consolidation,
+            "message": message
+        }
+    
+    @staticmethod
+    def get_duplicate_analysis(df: pd.DataFrame, row_index: Optional[RowHashIndex] = None) -> Dict[str, Any]:
+        if row_index is None:
+            row_index = RowHashIndex.from_dataframe(df)
+        
+        if row_index.duplicate_count == 0:
+            return {"has_duplicates": False}
+        
+        # Identifica todas as linhas duplicadas (incluindo a primeira ocorrência)
+        duplicated_mask = row_index.all_duplicated_mask
+        groups = row_index.duplicate_groups
+        
+        return {
+            "has_duplicates": True,
+            "total_duplicated_rows": int(duplicated_mask.sum()),
+            "unique_duplicate_patterns": len(groups["counts"]),
+            "duplicated_positions": np.flatnonzero(duplicated_mask),
+            "group_positions": groups["positions"],
+            "group_counts": groups["counts"],
+            "group_offsets": groups["offsets"]
+        }
+    
+    @staticmethod
+    def get_duplicate_groups_page(df: pd.DataFrame, duplicate_info: Dict[str, Any], start: int, stop: int) -> pd.DataFrame:
+        """Monta apenas os grupos [start, stop) com a primeira ocorrência, contagem e linhas originais"""
+        offsets = duplicate_info["group_offsets"]
+        positions = duplicate_info["group_positions"]
+        
+        page = df.iloc[positions[offsets[start:stop]]].copy()
+        lines = [
+            ", ".join(str(i) for i in (df.index[positions[offsets[g]:offsets[g + 1]]] + 1)[:10]) +
+            (" ..." if offsets[g + 1] - offsets[g] > 10 else "")
+            for g in range(start, stop)
+        ]
+        page.insert(0, "🔢 Linhas Originais", lines)
+        page.insert(0, "🔄 Ocorrências", duplicate_info["group_counts"][start:stop])
+        page.insert(0, "🎯 Grupo", np.arange(start + 1, stop + 1))
+        return page
+
+# === LEITURA DE PLANILHAS ===
+class WorkbookLoader:
+    """Mantém um único handle aberto da pasta de trabalho e carrega cada aba sob demanda"""
+    
+    def __init__(self, data: bytes, engine: Optional[str] = None):
+        self.nbytes = len(data)
+        self._data = data
+        self._excel_file = pd.ExcelFile(io.BytesIO(data), engine=engine)
+        self.engine = self._excel_file.engine
+        self._dimensions: Dict[str, Optional[Tuple[int, int]]] = {}
+        # O handle do openpyxl não é thread-safe e o loader é compartilhado entre sessões
+        self._lock = threading.Lock()
+        self.sheet_names: List[str] = self._excel_file.sheet_names
+    
+    def __sizeof__(self) -> int:
+        return self.nbytes
+    
+    def sheet_dimensions(self, sheet_name: str) -> Optional[Tuple[int, int]]:
+        """Linhas e colunas da aba lidas dos metadados da planilha, sem carregar as células"""
+        if sheet_name not in self._dimensions:
+            with self._lock:
+                dims = None
+                try:
+                    book = self._excel_file.book
+                    if self.engine == "calamine":
+                        pass  # calamine só informa dimensões após carregar a aba inteira
+                    elif hasattr(book, "sheet_by_name"):  # xlrd (.xls)
+                        sheet = book.sheet_by_name(sheet_name)
+                        dims = (sheet.nrows, sheet.ncols)
+                    else:  # openpyxl em modo read-only lê apenas a tag <dimension>
+                        sheet = book[sheet_name]
+                        if sheet.max_row is not None and sheet.max_column is not None:
+                            dims = (sheet.max_row, sheet.max_column)
+                except Exception as e:
+                    logger.warning(f"Não foi possível ler dimensões da aba {sheet_name}: {str(e)}")
+                self._dimensions[sheet_name] = dims
+        return self._dimensions[sheet_name]
+    
+    def load_sheet(self, sheet_name: str, **kwargs) -> pd.DataFrame:
+        """Lê os dados de uma aba reaproveitando o handle já aberto"""
+        with self._lock:
+            return self._excel_file.parse(sheet_name, **kwargs)
+
+class SpreadsheetReader:
+    """Escolhe o engine de leitura mais rápido instalado, com fallback para os engines padrão do pandas"""
+    
+    @staticmethod
+    def is_available(module: str) -> bool:
+        return importlib.util.find_spec(module) is not None
+    
+    @classmethod
+    def excel_engines(cls) -> List[Optional[str]]:
+        """Engines Excel em ordem de preferência (None = padrão do pandas)"""
+        engines: List[Optional[str]] = []
+        if Config.USE_FAST_READERS and cls.is_available("python_calamine"):
+            engines.append("calamine")
+        engines.append(None)
+        return engines
+    
+    @classmethod
+    def csv_engines(cls, options: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Engines CSV em ordem de preferência (o pyarrow não aceita separador de milhar)"""
+        engines = []
+        if Config.USE_FAST_READERS and cls.is_available("pyarrow") and "thousands" not in (options or {}):
+            engines.append("pyarrow")
+        engines.append("c")
+        return engines
+    
+    @classmethod
+    def open_workbook(cls, data: bytes) -> WorkbookLoader:
+        """Abre a pasta de trabalho com o primeiro engine que funcionar"""
+        engines = cls.excel_engines()
+        for engine in engines:
+            try:
+                return WorkbookLoader(data, engine=engine)
+            except Exception as e:
+                if engine is engines[-1]:
+                    raise
+                logger.warning(f"Engine {engine} falhou ao abrir a planilha ({str(e)}) - usando alternativa")
+    
+    @staticmethod
+    def read_sheet(workbook: WorkbookLoader, sheet_name: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """Lê uma aba e informa engine utilizado e tempo de leitura"""
+        start = time.perf_counter()
+        try:
+            df = workbook.load_sheet(sheet_name)
+            engine = workbook.engine
+        except Exception as e:
+            if workbook.engine != "calamine":
+                raise
+            logger.warning(f"calamine falhou ao ler a aba {sheet_name} ({str(e)}) - usando engine padrão")
+            fallback = WorkbookLoader(workbook._data)
+            df = fallback.load_sheet(sheet_name)
+            engine = fallback.engine
+        return df, {"engine": engine, "seconds": time.perf_counter() - start}
+    
+    @classmethod
+    def read_table(cls, filename: str, data: bytes, sheet_name: Optional[str] = None) -> Tuple[pd.DataFrame, Dict[str, Any], Optional[str]]:
+        """Lê um CSV ou uma aba do Excel (a primeira, se não informada); retorna também a aba lida"""
+        if filename.lower().endswith(".csv"):
+            df, read_info = cls.read_csv(data)
+            return df, read_info, None
+        workbook = cls.open_workbook(data)
+        sheet_name = sheet_name or workbook.sheet_names[0]
+        df, read_info = cls.read_sheet(workbook, sheet_name)
+        read_info["sheet_names"] = list(workbook.sheet_names)
+        return df, read_info, sheet_name
+    
+    @staticmethod
+    def sniff_csv(data: bytes) -> Dict[str, Any]:
+        """Detecta encoding, separador de colunas e separador decimal a partir de uma amostra"""
+        sample = data[:Config.CSV_SNIFF_BYTES]
+        if sample.startswith(codecs.BOM_UTF8):
+            encoding = "utf-8-sig"
+        elif sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            encoding = "utf-16"
+        else:
+            # Corta no último fim de linha para não partir caracteres multibyte
+            if len(data) > len(sample) and b"\n" in sample:
+                sample = sample[:sample.rfind(b"\n")]
+            try:
+                sample.decode("utf-8")
+                encoding = "utf-8"
+            except UnicodeDecodeError:
+                encoding = "cp1252"  # Exportações do Excel em português
+        
+        text = sample.decode(encoding, errors="replace")
+        lines = text.splitlines()
+        try:
+            sep = csv.Sniffer().sniff("\n".join(lines[:50]), delimiters=";,\t|").delimiter
+        except csv.Error:
+            header = lines[0] if lines else ""
+            sep = max(";,\t|", key=header.count) if any(c in header for c in ";\t|") else ","
+        
+        options: Dict[str, Any] = {"encoding": encoding, "sep": sep}
+        if sep != ",":
+            # Números no padrão brasileiro (1.234,56) indicam vírgula decimal
+            fields = [f.strip().strip('"') for line in lines[1:200] for f in line.split(sep)]
+            comma_decimals = sum(bool(re.fullmatch(r"-?\d{1,3}(\.\d{3})*,\d+|-?\d+,\d+", f)) for f in fields)
+            dot_decimals = sum(bool(re.fullmatch(r"-?\d+\.\d+", f)) for f in fields)
+            if comma_decimals > dot_decimals:
+                options["decimal"] = ","
+                if any(re.fullmatch(r"-?\d{1,3}(\.\d{3})+(,\d+)?", f) for f in fields):
+                    options["thousands"] = "."
+        return options
+    
+    @staticmethod
+    def _text_dates(df: pd.DataFrame) -> pd.DataFrame:
+        """O pyarrow converte datas ISO; volta para texto como no engine c, para o tipo não depender do engine"""
+        for col in df.columns:
+            series = df[col]
+            if (pd.api.types.is_datetime64_any_dtype(series)
+                    or pd.api.types.infer_dtype(series, skipna=True) in ("date", "datetime")):
+                # Vazios continuam vazios (astype(str) sozinho gravaria "NaT"/"None" no pandas < 3)
+                df[col] = series.astype(str).where(series.notna())
+        return df
+    
+    @classmethod
+    def read_csv(cls, data: bytes) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """Lê um CSV com formato detectado, pelo engine mais rápido que o formato permite"""
+        options = cls.sniff_csv(data)
+        engines = cls.csv_engines(options)
+        for engine in engines:
+            start = time.perf_counter()
+            try:
+                df = pd.read_csv(io.BytesIO(data), engine=engine, **options)
+                if engine == "pyarrow":
+                    df = cls._text_dates(df)
+                return df, {"engine": engine, "seconds": time.perf_counter() - start, "options": options}
+            except Exception as e:
+                if engine == engines[-1]:
+                    raise
+                logger.warning(f"Engine {engine} falhou ao ler CSV ({str(e)}) - usando alternativa")
+
+# === CACHE DE LEITURA ===
+class ParseCache:
+    """Cache LRU, limitado por memória, de DataFrames lidos e dos resultados derivados deles"""
+    
+    SIZE_SAMPLE_ROWS = 10_000
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+    
+    @staticmethod
+    def make_key(content_hash: str, sheet_name: Optional[str], **reader_options) -> tuple:
+        """Chave = (hash do conteúdo, aba, opções de leitura)"""
+        return (content_hash, sheet_name, tuple(sorted(reader_options.items())))
+    
+    @classmethod
+    def estimate_size(cls, value: Any) -> int:
+        """Estima a memória ocupada; em DataFrames grandes mede uma amostra das linhas"""
+        if isinstance(value, pd.DataFrame):
+            if len(value) <= cls.SIZE_SAMPLE_ROWS:
+                return int(value.memory_usage(deep=True).sum())
+            sample = value.iloc[:cls.SIZE_SAMPLE_ROWS]
+            return int(sample.memory_usage(deep=True).sum() * len(value) / cls.SIZE_SAMPLE_ROWS)
+        if isinstance(value, dict):
+            return sum(cls.estimate_size(v) for v in value.values())
+        if isinstance(value, (list, tuple)):
+            return sys.getsizeof(value) + sum(cls.estimate_size(v) for v in value[:100]) * max(len(value) // 100, 1)
+        return sys.getsizeof(value)
+    
+    def _store(self, key: tuple, entry: Dict[str, Any], nbytes: int):
+        """Grava/atualiza a entrada e descarta as menos usadas até caber no limite (requer lock)"""
+        self.total_bytes += nbytes - self._sizes.get(key, 0)
+        self._sizes[key] = nbytes
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            old_key, _ = self._entries.popitem(last=False)
+            self.total_bytes -= self._sizes.pop(old_key)
+    
+    def get_or_load(self, key: tuple, loader: Callable[[], Any]) -> Dict[str, Any]:
+        """Retorna a entrada do cache ({'value': ...}), executando o loader apenas na primeira vez"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        
+        # Leitura fora do lock para não bloquear outras sessões
+        entry = {"value": loader()}
+        with self._lock:
+            self._store(key, entry, self.estimate_size(entry["value"]))
+        return entry
+    
+    def memoize(self, key: tuple, name: str, compute: Callable[[], Any]) -> Any:
+        """Guarda um resultado derivado (ex.: análise de qualidade) junto da entrada da chave"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and name in entry:
+                return entry[name]
+        
+        result = compute()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[name] = result
+                self._store(key, entry, self._sizes[key] + self.estimate_size(result))
+        return result
+
+# === GRAVAÇÃO DE PLANILHAS ===
+class FixedTimeZipFile(zipfile.ZipFile):
+    """ZipFile que grava todas as entradas com a mesma data (o openpyxl usaria a hora atual)"""
+    
+    def _entry(self, arcname: str) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(arcname, SpreadsheetWriter.DOCUMENT_TIME.timetuple()[:6])
+        info.compress_type = self.compression
+        info.external_attr = 0o600 << 16
+        return info
+    
+    def writestr(self, zinfo_or_arcname, data, *args, **kwargs):
+        if isinstance(zinfo_or_arcname, str):
+            zinfo_or_arcname = self._entry(zinfo_or_arcname)
+        super().writestr(zinfo_or_arcname, data, *args, **kwargs)
+    
+    def write(self, filename, arcname=None, *args, **kwargs):
+        # Abas do modo write-only: copia o arquivo temporário em streaming
+        with open(filename, "rb") as source, self.open(self._entry(arcname or Path(filename).name), "w", force_zip64=True) as target:
+            shutil.copyfileobj(source, target)
+
+class SpreadsheetWriter:
+    """
+    Grava XLSX em streaming, linha a linha, num buffer que só vai para disco se passar de
+    SERIALIZE_SPOOL_MAX_MB. Usa xlsxwriter (constant_memory) se instalado, senão openpyxl write-only.
+    """
+    
+    # Data fixa nas propriedades do documento e no zip: o mesmo DataFrame gera sempre os mesmos bytes,
+    # e o upload de conteúdo idêntico é detectado pelo hash
+    DOCUMENT_TIME = datetime(2000, 1, 1)
+    
+    @staticmethod
+    def engine() -> str:
+        if Config.USE_FAST_WRITER and SpreadsheetReader.is_available("xlsxwriter"):
+            return "xlsxwriter"
+        return "openpyxl"
+    
+    # Linhas convertidas por vez: limita a cópia em objetos Python, independente do tamanho do arquivo
+    ROW_BLOCK = 10000
+    
+    @classmethod
+    def iter_rows(cls, df: pd.DataFrame) -> Iterator[Tuple[Any, ...]]:
+        """Linhas com tipos nativos do Python e None no lugar de NaN/NaT (células vazias)"""
+        for start in range(0, len(df), cls.ROW_BLOCK):
+            block = df.iloc[start:start + cls.ROW_BLOCK]
+            columns = [
+                series.astype(object).where(series.notna(), None).tolist()
+                for _, series in block.items()
+            ]
+            yield from zip(*columns)
+    
+    @classmethod
+    def write_xlsx(cls, df: pd.DataFrame, sheet_name: str = "Sheet1") -> bytes:
+        with tempfile.SpooledTemporaryFile(max_size=Config.SERIALIZE_SPOOL_MAX_MB * 1024 * 1024) as spool:
+            if cls.engine() == "xlsxwriter":
+                cls._write_xlsxwriter(df, sheet_name, spool)
+            else:
+                cls._write_openpyxl(df, sheet_name, spool)
+            spool.seek(0)
+            return spool.read()
+    
+    @classmethod
+    def _write_xlsxwriter(cls, df: pd.DataFrame, sheet_name: str, output):
+        import xlsxwriter
+        
+        # constant_memory exige gravar em ordem de linha: o pandas grava por coluna, por isso não usamos to_excel
+        workbook = xlsxwriter.Workbook(output, {
+            "constant_memory": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+            "nan_inf_to_errors": True,
+        })
+        workbook.set_properties({"created": cls.DOCUMENT_TIME})
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, [str(col) for col in df.columns], workbook.add_format({"bold": True}))
+        for row_number, row in enumerate(cls.iter_rows(df), start=1):
+            worksheet.write_row(row_number, 0, row)
+        workbook.close()
+    
+    @classmethod
+    def _write_openpyxl(cls, df: pd.DataFrame, sheet_name: str, output):
+        from openpyxl import Workbook
+        from openpyxl.writer.excel import ExcelWriter
+        
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(sheet_name)
+        worksheet.append([str(col) for col in df.columns])
+        for row in cls.iter_rows(df):
+            worksheet.append(row)
+        # Sem workbook.save(): ele grava a hora atual como data de modificação
+        workbook.properties.created = workbook.properties.modified = cls.DOCUMENT_TIME
+        ExcelWriter(workbook, FixedTimeZipFile(output, "w", zipfile.ZIP_DEFLATED, allowZip64=True)).save()
+    
+    @staticmethod
+    def parquet_available() -> bool:
+        return SpreadsheetReader.is_available("pyarrow")
+    
+    @staticmethod
+    def parquet_name(filename: str) -> str:
+        return f"{Path(filename).stem}.parquet"
+    
+    @staticmethod
+    def column_type(column: str) -> Optional[str]:
+        """Tipo da coluna pelas regras de Config.COLUMN_TYPE_RULES (None = manter o lido)"""
+        rules = Config.COLUMN_TYPE_RULES
+        name = str(column).strip().upper()
+        if name in rules["text_columns"]:
+            return "text"
+        if name in rules["date_columns"]:
+            return "date"
+        if name in rules["numeric_columns"] or any(name.startswith(prefix) for prefix in rules["numeric_prefixes"]):
+            return "numeric"
+        return None
+    
+    @staticmethod
+    def parse_dates(series: pd.Series) -> pd.Series:
+        """Datas em texto: ISO (2024-03-01) primeiro, depois o formato brasileiro (01/03/2024)"""
+        if pd.api.types.is_numeric_dtype(series):
+            # Número serial do Excel (dias desde 30/12/1899)
+            return pd.to_datetime(series, errors="coerce", unit="D", origin="1899-12-30")
+        iso = pd.to_datetime(series, errors="coerce", format="ISO8601")
+        remaining = series.where(iso.isna())
+        return iso.fillna(pd.to_datetime(remaining, errors="coerce", dayfirst=True, format="mixed"))
+    
+    @classmethod
+    def to_typed_frame(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """Converte as colunas para os tipos do schema; valores inválidos viram nulos (com aviso no log)"""
+        typed = {}
+        for column, series in df.items():
+            kind = cls.column_type(column)
+            if kind == "numeric":
+                converted = pd.to_numeric(series, errors="coerce")
+            elif kind == "date":
+                converted = series if pd.api.types.is_datetime64_any_dtype(series) else cls.parse_dates(series)
+            elif kind == "text" and pd.api.types.is_float_dtype(series) and (series.dropna() % 1 == 0).all():
+                # Códigos lidos como float por causa de nulos (ex.: CNPJ): sem o ".0" no texto
+                converted = series.astype("Int64").astype("string")
+            elif kind == "text" or series.dtype == object:
+                # Colunas de texto (e colunas com tipos misturados, que o Parquet não aceita)
+                converted = series.astype("string")
+            else:
+                converted = series
+            
+            lost = int(converted.isna().sum() - series.isna().sum())
+            if lost > 0:
+                logger.warning(f"Parquet: {lost} valor(es) inválido(s) viraram nulos na coluna {column}")
+            typed[str(column)] = converted
+        return pd.DataFrame(typed, index=df.index)
+    
+    @classmethod
+    def write_parquet(cls, df: pd.DataFrame) -> bytes:
+        with trace_stage("parquet"):
+            buffer = io.BytesIO()
+            cls.to_typed_frame(df).to_parquet(buffer, engine="pyarrow", compression=Config.PARQUET_COMPRESSION, index=False)
+            return buffer.getvalue()
+
+# === PIPELINE DE UPLOAD ===
+def serialize_dataframe(df: pd.DataFrame, filename: str, sheet_name: Optional[str], read_info: Dict[str, Any]) -> bytes:
+    """Grava o DataFrame processado no formato do arquivo original"""
+    with trace_stage("serializacao"):
+        if not filename.lower().endswith('.csv'):
+            return SpreadsheetWriter.write_xlsx(df, sheet_name or 'Sheet1')
+        
+        # Mantém o formato original (separador, decimal e encoding detectados)
+        buffer = io.BytesIO()
+        csv_options = read_info.get("options", {})
+        df.to_csv(
+            buffer, index=False,
+            sep=csv_options.get("sep", ","),
+            decimal=csv_options.get("decimal", "."),
+            encoding=csv_options.get("encoding", "utf-8")
+        )
+        return buffer.getvalue()
+
+def process_upload_file(onedrive_manager: OneDriveManager, token: Optional[str], filename: str, data: bytes,
+                        remove_duplicates: bool, progress: Optional[Dict[str, Any]] = None,
+                        output_mode: str = "planilha", metrics: Optional[MetricsRegistry] = None) -> Dict[str, Any]:
+    """
+    Lê, valida contra o schema, remove duplicatas (se pedido) e envia um arquivo
+    (e/ou sua cópia Parquet, conforme output_mode). Com token None, cada envio pede o token ao
+    gerenciador (cache renovado antes de expirar), para lotes mais longos que a validade do token.
+    Roda em threads do pool: não chama o Streamlit, apenas atualiza o dicionário de progresso.
+    """
+    progress = progress if progress is not None else {}
+    start = time.perf_counter()
+    result = {"arquivo": filename, "status": "erro", "linhas": None, "removidas": 0, "mensagem": ""}
+    trace = UploadTrace(filename, "multiplo", metrics)
+    trace.count(bytes_arquivo=len(data))
+    
+    try:
+        with trace.activate():
+            if len(data) > Config.MAX_FILE_SIZE_MB * 1024 * 1024:
+                result["mensagem"] = f"Arquivo maior que {Config.MAX_FILE_SIZE_MB}MB"
+                return result
+            
+            progress["etapa"] = "lendo"
+            with trace.stage("leitura"):
+                df, read_info, sheet_name = SpreadsheetReader.read_table(filename, data)
+            result["linhas"] = len(df)
+            trace.count(linhas=len(df), colunas=len(df.columns))
+            
+            progress["etapa"] = "validando"
+            with trace.stage("schema"):
+                schema_result = DataValidator.validate_schema(df, filename)
+            if not schema_result["is_valid"]:
+                result["status"] = "schema inválido"
+                result["mensagem"] = schema_result["message"]
+                return result
+            
+            df_final = df
+            if remove_duplicates:
+                with trace.stage("duplicatas"):
+                    row_index = RowHashIndex.from_dataframe(df)
+                    if row_index.duplicate_count > 0:
+                        result["removidas"] = row_index.duplicate_count
+                        df_final = row_index.drop_duplicates(df)
+            
+            outputs = []
+            if output_mode != "parquet":
+                content = data if df_final is df else serialize_dataframe(df_final, filename, sheet_name, read_info)
+                outputs.append((filename, content))
+            if output_mode != "planilha":
+                outputs.append((SpreadsheetWriter.parquet_name(filename), SpreadsheetWriter.write_parquet(df_final)))
+            
+            progress["etapa"] = "enviando"
+            statuses = []
+            for nome, content in outputs:
+                upload_token = token or onedrive_manager.get_token()
+                if not upload_token:
+                    result["mensagem"] = "Falha ao obter o token de acesso"
+                    return result
+                sucesso, status, resposta = onedrive_manager.upload_file(nome, content, upload_token, True)
+                if not sucesso:
+                    result["mensagem"] = f"Erro no upload de {nome} (Código: {status})"
+                    return result
+                if status != 304:
+                    trace.count(bytes_enviados=len(content))
+                statuses.append(status)
+            
+            result["status"] = "sem alterações" if all(status == 304 for status in statuses) else "enviado"
+            return result
+    
+    except Exception as e:
+        logger.error(f"Erro ao processar {filename}: {str(e)}")
+        result["mensagem"] = str(e)
+        return result
+    finally:
+        result["segundos"] = round(time.perf_counter() - start, 2)
+        progress["etapa"] = "concluído"
+        trace.count(duplicatas_removidas=result["removidas"])
+        trace.finish(result["status"])
+
+# === CONSOLIDAÇÃO INCREMENTAL ===
+class DatasetConsolidator:
+    """
+    Atualiza o arquivo consolidado por chave (Config.CONSOLIDATION_KEYS): as linhas enviadas entram
+    ou substituem as de mesma chave e o restante do histórico publicado é mantido.
+    """
+    
+    @staticmethod
+    def missing_keys(df: pd.DataFrame, keys: Optional[List[str]] = None) -> List[str]:
+        return [key for key in (keys or Config.CONSOLIDATION_KEYS) if key not in df.columns]
+    
+    @staticmethod
+    def as_text(series: pd.Series) -> pd.Series:
+        """Texto comparável; números inteiros lidos como float (por causa de nulos) ficam sem o sufixo .0"""
+        if pd.api.types.is_float_dtype(series) and (series.dropna() % 1 == 0).all():
+            return series.astype("Int64").astype("string")
+        return series.astype("string").str.strip()
+    
+    @classmethod
+    def normalized_keys(cls, df: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+        """Chaves como texto comparável (CNPJ lido como número ou texto, datas em formatos diferentes)"""
+        normalized = {}
+        for key in keys:
+            series = df[key]
+            text = cls.as_text(series)
+            if SpreadsheetWriter.column_type(key) == "date":
+                dates = series if pd.api.types.is_datetime64_any_dtype(series) else SpreadsheetWriter.parse_dates(series)
+                # Valores que não são datas (ex.: "jan/24") continuam comparados como texto
+                text = dates.dt.strftime("%Y-%m-%d").astype("string").fillna(text)
+            normalized[key] = text.fillna("")
+        return pd.DataFrame(normalized, index=df.index)
+    
+    @classmethod
+    def key_hashes(cls, df: pd.DataFrame, keys: List[str]) -> np.ndarray:
+        return pd.util.hash_pandas_object(cls.normalized_keys(df, keys), index=False).to_numpy()
+    
+    @classmethod
+    def key_status(cls, df: pd.DataFrame, keys: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Hash da chave de cada linha, se a chave está completa (nenhuma parte em branco) e se
+        a chave completa aparece em mais de uma linha.
+        """
+        normalized = cls.normalized_keys(df, keys)
+        hashes = pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+        complete = (normalized != "").all(axis=1).to_numpy()
+        repeated = np.zeros(len(df), dtype=bool)
+        repeated[complete] = pd.Series(hashes[complete]).duplicated(keep=False).to_numpy()
+        return hashes, complete, repeated
+    
+    @classmethod
+    def key_issues(cls, df: pd.DataFrame, keys: Optional[List[str]] = None) -> Dict[str, int]:
+        """Linhas com chave incompleta (entram sem substituir nada) e com chave repetida (recusadas)"""
+        _, complete, repeated = cls.key_status(df, keys or Config.CONSOLIDATION_KEYS)
+        return {"sem_chave": int((~complete).sum()), "chave_repetida": int(repeated.sum())}
+    
+    @classmethod
+    def upsert(cls, current: pd.DataFrame, incoming: pd.DataFrame,
+               keys: Optional[List[str]] = None) -> Tuple[pd.DataFrame, Dict[str, int]]:
+        """
+        As linhas enviadas substituem as publicadas de mesma chave e o restante é mantido. Linhas
+        com alguma parte da chave em branco nunca casam com outras: entram como novas linhas.
+        Chaves repetidas no envio são recusadas (ValueError), sem escolher uma das linhas.
+        """
+        keys = keys or Config.CONSOLIDATION_KEYS
+        missing = cls.missing_keys(incoming, keys) or cls.missing_keys(current, keys)
+        if missing:
+            raise ValueError(f"Colunas-chave ausentes: {', '.join(missing)}")
+        
+        current_hashes, current_complete, _ = cls.key_status(current, keys)
+        incoming_hashes, incoming_complete, repeated = cls.key_status(incoming, keys)
+        if repeated.any():
+            raise ValueError(
+                f"{int(repeated.sum()):,} linhas do envio repetem a chave ({' + '.join(keys)}) de outra linha - "
+                f"corrija as repetições ou substitua o arquivo inteiro"
+            )
+        
+        replaced = current_complete & np.isin(current_hashes, incoming_hashes[incoming_complete])
+        existing = incoming_complete & np.isin(incoming_hashes, current_hashes[current_complete])
+        kept = current[~replaced]
+        
+        columns = list(current.columns) + [col for col in incoming.columns if col not in current.columns]
+        merged = pd.concat([kept, incoming], ignore_index=True).reindex(columns=columns)
+        
+        stats = {
+            "mantidas": len(kept),
+            "atualizadas": int(existing.sum()),
+            "novas": int((incoming_complete & ~existing).sum()),
+            "sem_chave": int((~incoming_complete).sum()),
+            "total": len(merged),
+        }
+        return merged, stats
+
+def load_published(onedrive_manager: OneDriveManager, token: str, filename: str,
+                   parse_cache: ParseCache) -> Optional[Dict[str, Any]]:
+    """
+    Lê o arquivo publicado com o mesmo nome (None se não existir). Fica no cache pelo eTag,
+    então só é baixado de novo quando muda no OneDrive.
+    """
+    item = onedrive_manager.get_item(filename, token)
+    if item is None:
+        return None
+    
+    cache_key = ParseCache.make_key(f"etag:{item['eTag']}", None, reader="published", name=filename)
+    def download_and_read():
+        with trace_stage("download_publicado"):
+            data = onedrive_manager.download_file(token, item["id"])
+        with trace_stage("leitura_publicado"):
+            return SpreadsheetReader.read_table(filename, data)
+    
+    df, read_info, sheet_name = parse_cache.get_or_load(cache_key, download_and_read)["value"]
+    return {"item": item, "df": df, "read_info": read_info, "sheet_name": sheet_name, "cache_key": cache_key}
+
+def consolidate_upload(onedrive_manager: OneDriveManager, token: str, filename: str, incoming: pd.DataFrame,
+                       parse_cache: ParseCache) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Junta as linhas enviadas ao arquivo publicado com o mesmo nome. O eTag lido ("" se o arquivo
+    não existia) vai no upload como If-Match, para não sobrescrever outra consolidação simultânea.
+    """
+    published = load_published(onedrive_manager, token, filename, parse_cache)
+    if published is None:
+        # Ainda não existe arquivo consolidado: o envio vira o arquivo inteiro
+        merged, stats = DatasetConsolidator.upsert(incoming.iloc[:0], incoming)
+        return merged, {**stats, "sheet_name": None, "read_info": {}, "etag": ""}
+    
+    # Só a aba lida é regravada: as outras abas do arquivo publicado seriam perdidas
+    sheet_names = published["read_info"].get("sheet_names", [])
+    if len(sheet_names) > 1:
+        raise ValueError(
+            f"{filename} publicado tem {len(sheet_names)} abas ({', '.join(map(str, sheet_names))}) - "
+            f"a consolidação só funciona com arquivos de uma aba"
+        )
+    
+    with trace_stage("consolidacao"):
+        merged, stats = DatasetConsolidator.upsert(published["df"], incoming)
+    logger.info(f"Consolidação de {filename}: {stats}")
+    return merged, {**stats, "sheet_name": published["sheet_name"], "read_info": published["read_info"],
+                    "etag": published["item"]["eTag"]}
+
+# === COMPARAÇÃO COM O ARQUIVO PUBLICADO ===
+class DatasetDiff:
+    """
+    Compara o arquivo enviado com o publicado: linhas novas, removidas e alteradas (por chave)
+    e quantas alterações há em cada coluna. Tudo por hashes vetorizados, linear no número de linhas.
+    """
+    
+    SAMPLE_ROWS = 20
+    
+    @staticmethod
+    def _canonical_pair(current: pd.Series, incoming: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        """Mesma representação nas duas versões da coluna (xlsx e csv podem ser lidos com tipos diferentes)"""
+        is_numeric = pd.api.types.is_numeric_dtype
+        is_datetime = pd.api.types.is_datetime64_any_dtype
+        
+        if is_numeric(current) and is_numeric(incoming):
+            return current.astype("float64"), incoming.astype("float64")
+        if is_datetime(current) or is_datetime(incoming):
+            def as_dates(series: pd.Series) -> pd.Series:
+                dates = series if is_datetime(series) else SpreadsheetWriter.parse_dates(series)
+                return dates.astype("datetime64[ns]")
+            return as_dates(current), as_dates(incoming)
+        return DatasetConsolidator.as_text(current), DatasetConsolidator.as_text(incoming)
+    
+    @staticmethod
+    def _hash(series: pd.Series) -> np.ndarray:
+        return pd.util.hash_pandas_object(series, index=False).to_numpy()
+    
+    @staticmethod
+    def _last_positions(hashes: np.ndarray) -> np.ndarray:
+        """Posições da última ocorrência de cada chave (mesma regra da consolidação)"""
+        return np.flatnonzero(~pd.Series(hashes).duplicated(keep="last").to_numpy())
+    
+    @staticmethod
+    def _surplus_mask(hashes: np.ndarray, other: np.ndarray) -> np.ndarray:
+        """Ocorrências de cada hash além das que existem no outro lado (n-ésima repetição com n > contagem lá)"""
+        series = pd.Series(hashes)
+        occurrence = series.groupby(series, sort=False).cumcount().to_numpy()
+        available = series.map(pd.Series(other).value_counts()).fillna(0).to_numpy()
+        return occurrence >= available
+    
+    @classmethod
+    def compare(cls, current: pd.DataFrame, incoming: pd.DataFrame,
+                keys: Optional[List[str]] = None) -> Dict[str, Any]:
+        keys = keys or Config.CONSOLIDATION_KEYS
+        by_key = not DatasetConsolidator.missing_keys(current, keys) and not DatasetConsolidator.missing_keys(incoming, keys)
+        common = [col for col in incoming.columns if col in current.columns]
+        
+        column_hashes = {}
+        for col in common:
+            current_values, incoming_values = cls._canonical_pair(current[col], incoming[col])
+            column_hashes[col] = (cls._hash(current_values), cls._hash(incoming_values))
+        
+        if by_key:
+            current_keys = DatasetConsolidator.key_hashes(current, keys)
+            incoming_keys = DatasetConsolidator.key_hashes(incoming, keys)
+            current_pos = cls._last_positions(current_keys)
+            incoming_pos = cls._last_positions(incoming_keys)
+            
+            match = pd.Index(current_keys[current_pos]).get_indexer(incoming_keys[incoming_pos])
+            matched = match >= 0
+            added = incoming_pos[~matched]
+            removed = current_pos[~np.isin(current_keys[current_pos], incoming_keys[incoming_pos])]
+            pair_incoming = incoming_pos[matched]
+            pair_current = current_pos[match[matched]]
+        else:
+            # Sem as colunas-chave: linhas comparadas pelo conteúdo inteiro (alteração = remoção + inclusão).
+            # Linhas repetidas contam por ocorrência: 3 cópias publicadas e 2 enviadas = 1 removida
+            current_keys = np.zeros(len(current), dtype=np.uint64)
+            incoming_keys = np.zeros(len(incoming), dtype=np.uint64)
+            for current_hash, incoming_hash in column_hashes.values():
+                current_keys = current_keys * np.uint64(1_000_003) ^ current_hash
+                incoming_keys = incoming_keys * np.uint64(1_000_003) ^ incoming_hash
+            
+            added_mask = cls._surplus_mask(incoming_keys, current_keys)
+            added = np.flatnonzero(added_mask)
+            removed = np.flatnonzero(cls._surplus_mask(current_keys, incoming_keys))
+            pair_incoming = np.flatnonzero(~added_mask)
+        
+        changed_mask = np.zeros(len(pair_incoming), dtype=bool)
+        column_changes = {}
+        if by_key:
+            for col, (current_hash, incoming_hash) in column_hashes.items():
+                differs = current_hash[pair_current] != incoming_hash[pair_incoming]
+                if differs.any():
+                    column_changes[col] = int(differs.sum())
+                    changed_mask |= differs
+        
+        changed = pair_incoming[changed_mask]
+        return {
+            "by_key": by_key,
+            "keys": keys if by_key else [],
+            "added": len(added),
+            "removed": len(removed),
+            "changed": len(changed),
+            "unchanged": len(pair_incoming) - len(changed),
+            "column_changes": dict(sorted(column_changes.items(), key=lambda item: -item[1])),
+            "added_columns": [col for col in incoming.columns if col not in current.columns],
+            "removed_columns": [col for col in current.columns if col not in incoming.columns],
+            "added_positions": added[:cls.SAMPLE_ROWS],
+            "removed_positions": removed[:cls.SAMPLE_ROWS],
+            "changed_positions": changed[:cls.SAMPLE_ROWS],
+        }
+
+# === UPLOADS EM SEGUNDO PLANO ===
+class UploadJobRunner:
+    """
+    Executa uploads num pool de threads fora do script do Streamlit. Cada job tem um id e
+    um estado (na fila, preparando, backup, enviando, concluído, falhou) que a interface consulta.
+    O conteúdo pode ser uma função que gera (bytes, detalhes, eTag esperado ou None) já dentro
+    do job; se o arquivo publicado mudou (412), o conteúdo é gerado e enviado de novo.
+    """
+    
+    ACTIVE_STATES = ("na fila", "preparando", "backup", "enviando")
+    
+    def __init__(self, max_workers: int = Config.UPLOAD_JOB_WORKERS, metrics: Optional[MetricsRegistry] = None):
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload-job")
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._finished: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+    
+    def submit(self, onedrive_manager: OneDriveManager, token: str, nome_arquivo: str,
+               conteudo: Union[bytes, Callable[[], Tuple[bytes, str, Optional[str]]]], fazer_backup: bool = True,
+               on_success: Optional[Callable[[], None]] = None, detalhes: str = "",
+               trace: Optional[UploadTrace] = None) -> str:
+        """Enfileira o upload e retorna o id do job (trace traz as etapas já medidas antes do envio)"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "nome": nome_arquivo,
+                "estado": "na fila",
+                "enviados": 0,
+                "total": 0 if callable(conteudo) else len(conteudo),
+                "status": None,
+                "mensagem": "",
+                "detalhes": detalhes,
+                "criado_em": time.time(),
+                "segundos": None,
+            }
+            self._finished[job_id] = threading.Event()
+            self._prune()
+        trace = trace or UploadTrace(nome_arquivo, "individual", self.metrics)
+        self._executor.submit(self._run, job_id, onedrive_manager, token, nome_arquivo, conteudo, fazer_backup, on_success, trace)
+        return job_id
+    
+    def _prune(self):
+        # Mantém o histórico limitado, descartando primeiro os jobs já encerrados mais antigos
+        finished = [job_id for job_id, job in self._jobs.items() if job["estado"] not in self.ACTIVE_STATES]
+        for job_id in finished[:max(0, len(self._jobs) - Config.UPLOAD_JOB_HISTORY)]:
+            del self._jobs[job_id]
+            del self._finished[job_id]
+    
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+    
+    def _run(self, job_id: str, onedrive_manager: OneDriveManager, token: str, nome_arquivo: str,
+             conteudo: Union[bytes, Callable[[], Tuple[bytes, str, Optional[str]]]], fazer_backup: bool,
+             on_success: Optional[Callable[[], None]], trace: UploadTrace):
+        start = time.perf_counter()
+        with self._lock:
+            finished = self._finished[job_id]
+        build = conteudo if callable(conteudo) else None
+        dados = b""
+        
+        def progress(etapa: str, enviados: int, total: int):
+            self._update(job_id, estado=etapa, enviados=enviados, total=total)
+        
+        with trace.activate():
+            for _ in range(Config.UPLOAD_CONFLICT_RETRIES + 1):
+                try:
+                    if_match = None
+                    if build:
+                        self._update(job_id, estado="preparando")
+                        dados, detalhes, if_match = build()
+                        self._update(job_id, total=len(dados), detalhes=detalhes)
+                    else:
+                        dados = conteudo
+                    sucesso, status, resposta = onedrive_manager.upload_file(
+                        nome_arquivo, dados, token, fazer_backup, progress_callback=progress, if_match=if_match
+                    )
+                except Exception as e:
+                    sucesso, status, resposta = False, 500, str(e)
+                # Outro envio alterou o arquivo publicado: gera o conteúdo de novo a partir da versão atual
+                if status != 412 or build is None:
+                    break
+                logger.info(f"{nome_arquivo} mudou no OneDrive durante a preparação - gerando de novo")
+        
+        if sucesso and status != 304:
+            trace.count(bytes_enviados=len(dados))
+        trace.finish("sem alterações" if status == 304 else "enviado" if sucesso else "erro")
+        
+        elapsed = round(time.perf_counter() - start, 2)
+        if sucesso:
+            self._update(job_id, estado="concluído", enviados=len(dados), status=status, segundos=elapsed,
+                         mensagem="Conteúdo idêntico ao publicado" if status == 304 else "")
+            logger.info(f"Upload em segundo plano concluído: {nome_arquivo} ({status}, {elapsed:.2f}s)")
+            if on_success and status != 304:
+                on_success()
+        else:
+            self._update(job_id, estado="falhou", status=status, segundos=elapsed, mensagem=str(resposta)[:500])
+            logger.error(f"Upload em segundo plano falhou: {nome_arquivo} ({status})")
+        finished.set()
+    
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Espera o job terminar e retorna o estado final (None se já saiu do histórico)"""
+        with self._lock:
+            finished = self._finished.get(job_id)
+        if finished is not None:
+            finished.wait(timeout)
+        return self.get(job_id)
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cópia do estado atual do job (None se já saiu do histórico)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+# === LINHA DE COMANDO ===
+EXIT_OK = 0
+EXIT_FILE_ERRORS = 1      # Algum arquivo falhou (leitura, schema ou envio)
+EXIT_USAGE = 2            # Nenhum arquivo encontrado nas entradas (mesmo código do argparse)
+EXIT_AUTH = 3             # Credenciais ausentes ou falha ao obter o token
+
+def collect_files(inputs: List[str]) -> List[Path]:
+    """Expande diretórios (arquivos suportados, sem recursão), globs e caminhos diretos, sem repetir"""
+    extensions = {f".{ext}" for ext in Config.SUPPORTED_FORMATS}
+    found: Dict[Path, None] = {}
+    for entry in inputs:
+        path = Path(entry)
+        if path.is_dir():
+            candidates = sorted(path.iterdir())
+        elif any(char in entry for char in "*?["):
+            candidates = sorted(Path(match) for match in glob.glob(entry, recursive=True))
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            if candidate.is_file() and candidate.suffix.lower() in extensions:
+                found.setdefault(candidate.resolve(), None)
+    return list(found)
+
+def run_batch(onedrive_manager: OneDriveManager, paths: List[Path], remove_duplicates: bool = True,
+              output_mode: str = "planilha", max_workers: int = Config.UPLOAD_JOB_WORKERS,
+              metrics: Optional[MetricsRegistry] = None) -> List[Dict[str, Any]]:
+    """
+    Processa os arquivos em paralelo com process_upload_file (ler, validar, remover duplicatas,
+    backup e envio). O token é pedido ao gerenciador a cada envio, então lotes longos não usam
+    um token vencido. Retorna um resultado por arquivo, na ordem recebida.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(paths)
+    futures = {}
+    seen_names = set()
+    
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline") as executor:
+        for i, path in enumerate(paths):
+            # Dois arquivos com o mesmo nome iriam para o mesmo destino no OneDrive
+            if path.name in seen_names:
+                results[i] = {"arquivo": path.name, "status": "erro", "linhas": None, "removidas": 0,
+                              "mensagem": "Outro arquivo com o mesmo nome já está nesta execução"}
+                continue
+            seen_names.add(path.name)
+            
+            try:
+                data = path.read_bytes()
+            except OSError as e:
+                results[i] = {"arquivo": path.name, "status": "erro", "linhas": None, "removidas": 0, "mensagem": str(e)}
+                continue
+            futures[executor.submit(process_upload_file, onedrive_manager, None, path.name, data,
+                                    remove_duplicates, None, output_mode, metrics)] = i
+        
+        for future in futures:
+            results[futures[future]] = future.result()
+    
+    for path, result in zip(paths, results):
+        result["caminho"] = str(path)
+    return results
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Envia planilhas para a pasta do Power BI no OneDrive sem a interface do Streamlit: "
+                    "lê, valida o schema, remove duplicatas, faz backup do arquivo publicado e envia.",
+        epilog="Credenciais (CLIENT_ID, CLIENT_SECRET, TENANT_ID, EMAIL_ONEDRIVE, SITE_ID, DRIVE_ID) vêm das "
+               "variáveis de ambiente ou de --secrets. Códigos de saída: 0 sucesso, 1 algum arquivo falhou, "
+               "2 nenhum arquivo encontrado, 3 credenciais ou autenticação."
+    )
+    parser.add_argument("entradas", nargs="+", help="diretórios, arquivos ou globs (ex.: 'exportacao/*.xlsx')")
+    parser.add_argument("--manter-duplicatas", action="store_true", help="envia sem remover linhas duplicadas")
+    parser.add_argument("--saida", choices=list(Config.OUTPUT_MODES), default="planilha",
+                        help="planilha, Parquet tipado ou ambos")
+    parser.add_argument("--workers", type=int, default=Config.UPLOAD_JOB_WORKERS, help="arquivos processados em paralelo")
+    parser.add_argument("--secrets", help="arquivo TOML com as credenciais (ex.: .streamlit/secrets.toml)")
+    parser.add_argument("--resultado", help="grava o JSON de resultado neste arquivo além de imprimi-lo")
+    args = parser.parse_args(argv)
+    
+    # Logs (inclusive os registros JSON de cada upload) vão para stderr; stdout fica só com o resultado
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    
+    paths = collect_files(args.entradas)
+    if not paths:
+        logger.error(f"Nenhum arquivo {', '.join(Config.SUPPORTED_FORMATS)} encontrado em: {' '.join(args.entradas)}")
+        return EXIT_USAGE
+    
+    try:
+        secrets = None
+        if args.secrets:
+            import tomllib
+            with open(args.secrets, "rb") as handle:
+                secrets = tomllib.load(handle)
+        onedrive_manager = OneDriveManager(Config.get_credentials(secrets))
+    except (OSError, ValueError, ImportError) as e:
+        logger.error(f"Erro nas credenciais: {str(e)}")
+        return EXIT_AUTH
+    
+    # Falha de autenticação interrompe antes de ler os arquivos; os envios renovam o token sozinhos
+    if not onedrive_manager.get_token():
+        return EXIT_AUTH
+    
+    start = time.perf_counter()
+    results = run_batch(onedrive_manager, paths, not args.manter_duplicatas, args.saida,
+                        max(args.workers, 1), get_metrics_registry())
+    summary: Dict[str, int] = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    failed = sum(result["status"] not in ("enviado", "sem alterações") for result in results)
+    
+    report = {
+        "arquivos": results,
+        "resumo": {"total": len(results), "falhas": failed, "status": summary,
+                   "segundos": round(time.perf_counter() - start, 2)}
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.resultado:
+        Path(args.resultado).write_text(output + "\n", encoding="utf-8")
+    return EXIT_FILE_ERRORS if failed else EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "tools"))
+
+from graph_standin import GraphStandIn  # noqa: E402
+from pipeline import Config, OneDriveManager  # noqa: E402
+
+TEST_CREDENTIALS = {
+    "CLIENT_ID": "teste", "CLIENT_SECRET": "teste", "TENANT_ID": "teste",
+    "EMAIL_ONEDRIVE": "teste@example.com", "SITE_ID": "teste-site", "DRIVE_ID": "teste-drive"
+}
+TOKEN = "token-de-teste"
+
+@pytest.fixture(scope="session")
+def standin_server():
+    server = GraphStandIn().start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def standin(standin_server, monkeypatch):
+    """Stand-in do Graph com o drive vazio e o Config apontando para ele"""
+    standin_server.store.reset()
+    standin_server.faults.configure(latency_ms=0, jitter_ms=0, throttle_rate=0.0, retry_after=0,
+                                    failure_rate=0.0, failure_status=503, match=None)
+    monkeypatch.setattr(Config, "GRAPH_API_BASE", standin_server.graph_base)
+    monkeypatch.setattr(Config, "GRAPH_BACKOFF_BASE_SECONDS", 0.01)
+    return standin_server
+
+@pytest.fixture
+def manager(standin):
+    return OneDriveManager(dict(TEST_CREDENTIALS))
+
+def published(standin, name):
+    """Conteúdo atual do arquivo na pasta do app no stand-in"""
+    item = standin.store.find(f"{Config.PASTA}/{name}")
+    return item["content"] if item else None
@@ -0,0 +1,51 @@
+import json
+
+import pipeline
+from conftest import TEST_CREDENTIALS, TOKEN, published
+from pipeline import OneDriveManager, run_batch
+
+CSV = "CLIENTE;VALOR\nA;1\nB;2\nA;1\n"
+
+def test_run_batch_envia_e_depois_ignora(manager, standin, tmp_path, monkeypatch):
+    monkeypatch.setattr(manager, "get_token", lambda: TOKEN)
+    (tmp_path / "vendas.csv").write_text(CSV, encoding="utf-8")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "vendas.csv").write_text(CSV, encoding="utf-8")
+    paths = [tmp_path / "vendas.csv", tmp_path / "sub" / "vendas.csv"]
+    
+    results = run_batch(manager, paths)
+    assert [result["status"] for result in results] == ["enviado", "erro"]
+    assert results[0]["removidas"] == 1
+    assert results[1]["caminho"] == str(paths[1])
+    assert published(standin, "vendas.csv").count(b"\n") == 3
+    
+    results = run_batch(manager, paths[:1])
+    assert results[0]["status"] == "sem alterações"
+
+def test_run_batch_pede_token_a_cada_envio(manager, standin, tmp_path, monkeypatch):
+    # Lote mais longo que a validade do token: o gerenciador entrega um token novo a cada envio
+    tokens = iter([TOKEN, None])
+    monkeypatch.setattr(manager, "get_token", lambda: next(tokens))
+    paths = [tmp_path / "a.csv", tmp_path / "b.csv"]
+    for path in paths:
+        path.write_text(CSV, encoding="utf-8")
+    
+    results = run_batch(manager, paths, max_workers=1)
+    assert [result["status"] for result in results] == ["enviado", "erro"]
+    assert results[1]["mensagem"] == "Falha ao obter o token de acesso"
+
+def test_main_codigos_de_saida(standin, tmp_path, monkeypatch, capsys):
+    for name in TEST_CREDENTIALS:
+        monkeypatch.delenv(name, raising=False)
+    assert pipeline.main([str(tmp_path)]) == pipeline.EXIT_USAGE
+    
+    (tmp_path / "vendas.csv").write_text(CSV, encoding="utf-8")
+    assert pipeline.main([str(tmp_path)]) == pipeline.EXIT_AUTH
+    
+    for name, value in TEST_CREDENTIALS.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(OneDriveManager, "get_token", lambda self: TOKEN)
+    capsys.readouterr()
+    assert pipeline.main([str(tmp_path)]) == pipeline.EXIT_OK
+    report = json.loads(capsys.readouterr().out)
+    assert report["resumo"]["status"] == {"enviado": 1}
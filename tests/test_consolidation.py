@@ -0,0 +1,89 @@
+import io
+
+import pandas as pd
+import pytest
+
+from conftest import TOKEN, published
+from pipeline import (Config, DatasetConsolidator, ParseCache, SpreadsheetReader, UploadJobRunner, consolidate_upload,
+                      serialize_dataframe)
+
+NAME = "consolidado.csv"
+
+def frame(*rows):
+    return pd.DataFrame([{"CNPJ": cnpj, "NF": nf, "DATA_MES": "2024-01-01", "VALOR": valor} for cnpj, nf, valor in rows])
+
+def publish(manager, name, df):
+    assert manager.upload_file(name, serialize_dataframe(df, name, None, {}), TOKEN, fazer_backup=False)[0]
+
+def published_frame(standin, name=NAME):
+    return SpreadsheetReader.read_table(name, published(standin, name))[0]
+
+def test_upsert_substitui_pela_chave():
+    merged, stats = DatasetConsolidator.upsert(frame((1, 10, 1.0), (2, 20, 2.0)), frame((2, 20, 5.0), (3, 30, 3.0)))
+    assert merged.sort_values("CNPJ")["VALOR"].tolist() == [1.0, 5.0, 3.0]
+    assert (stats["mantidas"], stats["atualizadas"], stats["novas"]) == (1, 1, 1)
+
+def test_upsert_acrescenta_linhas_com_chave_em_branco():
+    current = frame((1, None, 1.0), (2, 20, 2.0))
+    merged, stats = DatasetConsolidator.upsert(current, frame((1, None, 5.0), (1, " ", 6.0), (3, None, 7.0)))
+    assert sorted(merged["VALOR"].tolist()) == [1.0, 2.0, 5.0, 6.0, 7.0]
+    assert (stats["mantidas"], stats["sem_chave"], stats["novas"], stats["total"]) == (2, 3, 0, 5)
+
+def test_upsert_recusa_chave_repetida_no_envio():
+    incoming = frame((2, 20, 5.0), (2, 20, 6.0), (3, 30, 3.0))
+    assert DatasetConsolidator.key_issues(incoming) == {"sem_chave": 0, "chave_repetida": 2}
+    with pytest.raises(ValueError, match="2 linhas do envio repetem a chave"):
+        DatasetConsolidator.upsert(frame((1, 10, 1.0)), incoming)
+
+def test_upload_condicional_recusa_etag_antigo(manager, standin):
+    publish(manager, NAME, frame((1, 10, 1.0)))
+    etag = manager.get_item(NAME, TOKEN)["eTag"]
+    publish(manager, NAME, frame((1, 10, 2.0)))
+    
+    assert manager.upload_file(NAME, b"x", TOKEN, if_match=etag)[1] == 412
+    assert manager.upload_file(NAME, b"x", TOKEN, if_match="")[1] == 412
+    assert published_frame(standin)["VALOR"].tolist() == [2.0]
+
+def test_upload_condicional_em_sessao_nao_deixa_temporario(manager, standin, monkeypatch):
+    monkeypatch.setattr(Config, "SIMPLE_UPLOAD_MAX_BYTES", 16)
+    publish(manager, NAME, frame((1, 10, 1.0)))
+    etag = manager.get_item(NAME, TOKEN)["eTag"]
+    standin.store.touch(standin.store.find(f"{Config.PASTA}/{NAME}"))  # Alterado por outro envio
+    
+    ok, status, _ = manager.upload_file(NAME, b"conteudo maior que o limite", TOKEN, if_match=etag)
+    assert (ok, status) == (False, 412)
+    assert [item["name"] for item in standin.store.items.values()] == [NAME]
+
+def test_consolidacoes_simultaneas_nao_perdem_linhas(manager, standin):
+    publish(manager, NAME, frame((1, 10, 1.0)))
+    cache = ParseCache(64 * 1024 * 1024)
+    etags = []
+    
+    def build():
+        merged, info = consolidate_upload(manager, TOKEN, NAME, frame((2, 20, 2.0)), cache)
+        if not etags:
+            # Outra consolidação publica entre a leitura e o envio deste job
+            other, other_info = consolidate_upload(manager, TOKEN, NAME, frame((3, 30, 3.0)), cache)
+            assert manager.upload_file(NAME, serialize_dataframe(other, NAME, None, {}), TOKEN,
+                                       if_match=other_info["etag"])[0]
+        etags.append(info["etag"])
+        return serialize_dataframe(merged, NAME, None, info["read_info"]), "", info["etag"]
+    
+    runner = UploadJobRunner(max_workers=1)
+    job = runner.wait(runner.submit(manager, TOKEN, NAME, build), timeout=30)
+    assert job["estado"] == "concluído"
+    assert len(etags) == 2 and etags[0] != etags[1]
+    assert sorted(published_frame(standin)["CNPJ"].tolist()) == [1, 2, 3]
+    # A versão substituída de cada envio fica no backup
+    assert any("_backup_" in item["name"] for item in standin.store.items.values())
+
+def test_consolidacao_recusa_arquivo_com_varias_abas(manager, standin):
+    name = "consolidado.xlsx"
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer) as writer:
+        frame((1, 10, 1.0)).to_excel(writer, sheet_name="Dados", index=False)
+        pd.DataFrame({"NOTA": ["resumo"]}).to_excel(writer, sheet_name="Resumo", index=False)
+    assert manager.upload_file(name, buffer.getvalue(), TOKEN, fazer_backup=False)[0]
+    
+    with pytest.raises(ValueError, match="2 abas"):
+        consolidate_upload(manager, TOKEN, name, frame((2, 20, 2.0)), ParseCache(64 * 1024 * 1024))
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from pipeline import DatasetDiff
+
+def test_sem_chave_com_linhas_repetidas_dos_dois_lados():
+    current = pd.DataFrame({"LOJA": ["A", "A", "A", "B", "C"], "VALOR": [1, 1, 1, 2, 3]})
+    incoming = pd.DataFrame({"LOJA": ["A", "A", "B", "B", "D"], "VALOR": [1, 1, 2, 2, 4]})
+    result = DatasetDiff.compare(current, incoming)
+    
+    assert not result["by_key"]
+    assert (result["added"], result["removed"], result["changed"], result["unchanged"]) == (2, 2, 0, 3)
+    assert result["added_positions"].tolist() == [3, 4]    # Segunda cópia de B e a linha D
+    assert result["removed_positions"].tolist() == [2, 4]  # Terceira cópia de A e a linha C
+
+def test_sem_chave_arquivo_identico_com_duplicatas():
+    df = pd.DataFrame({"LOJA": ["A", "A", "B"], "VALOR": [1.0, 1.0, 2.0]})
+    result = DatasetDiff.compare(df, df.copy())
+    assert (result["added"], result["removed"], result["unchanged"]) == (0, 0, 3)
+
+def test_por_chave_conta_alteracoes_por_coluna():
+    def frame(values):
+        return pd.DataFrame({"CNPJ": [1, 2, 3], "NF": [10, 20, 30], "DATA_MES": ["2024-01-01"] * 3, "VALOR": values})
+    
+    current = frame([1.0, 2.0, 3.0])
+    incoming = frame([1.0, 5.0, 3.0]).iloc[1:]
+    result = DatasetDiff.compare(current, incoming)
+    assert result["by_key"]
+    assert (result["added"], result["removed"], result["changed"], result["unchanged"]) == (0, 1, 1, 1)
+    assert result["column_changes"] == {"VALOR": 1}
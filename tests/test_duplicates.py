@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from pipeline import DataValidator, RowHashIndex
+
+def mixed_frame():
+    return pd.DataFrame({
+        "CODIGO": pd.Series([1, "1", 2, "2", 1, None, None, 3.0], dtype=object),
+        "LOJA": ["A", "A", "B", "B", "A", None, None, "C"]
+    })
+
+def test_mascaras_iguais_a_df_duplicated():
+    df = mixed_frame()
+    row_index = RowHashIndex.from_dataframe(df)
+    assert len(row_index.candidates) > df.duplicated(keep=False).sum()  # 1 e "1" colidem no hash
+    np.testing.assert_array_equal(row_index.duplicated_mask, df.duplicated().to_numpy())
+    np.testing.assert_array_equal(row_index.all_duplicated_mask, df.duplicated(keep=False).to_numpy())
+    assert row_index.duplicate_count == int(df.duplicated().sum()) == 2
+    pd.testing.assert_frame_equal(row_index.drop_duplicates(df), df.drop_duplicates())
+
+def test_grupos_separam_linhas_com_mesmo_hash():
+    df = pd.DataFrame({"CODIGO": pd.Series([1, "1", 1, "1", "1"], dtype=object)})
+    info = DataValidator.get_duplicate_analysis(df)
+    assert info["unique_duplicate_patterns"] == 2
+    groups = [
+        info["group_positions"][start:stop].tolist()
+        for start, stop in zip(info["group_offsets"][:-1], info["group_offsets"][1:])
+    ]
+    assert groups == [[0, 2], [1, 3, 4]]
+
+def test_frame_sem_colisao():
+    df = pd.DataFrame({"A": [1, 2, 1, 3, 2], "B": ["x", "y", "x", "z", "w"]})
+    row_index = RowHashIndex.from_dataframe(df)
+    np.testing.assert_array_equal(row_index.duplicated_mask, df.duplicated().to_numpy())
+    assert row_index.duplicate_groups["counts"].tolist() == [2]
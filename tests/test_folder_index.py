@@ -0,0 +1,51 @@
+from conftest import TOKEN
+from pipeline import Config, FolderIndex
+
+def names(files):
+    return [item["name"] for item in files]
+
+def test_delta_aplica_uploads_e_exclusoes(manager, standin):
+    manager.upload_file("a.csv", b"a", TOKEN, fazer_backup=False)
+    manager.upload_file("b.xlsx", b"b", TOKEN, fazer_backup=False)
+    index = FolderIndex(manager)
+    assert names(index.get_files(TOKEN)) == ["a.csv", "b.xlsx"]
+    
+    manager.upload_file("c.parquet", b"c", TOKEN, fazer_backup=False)
+    manager.delete_files(TOKEN, [standin.store.find(f"{Config.PASTA}/a.csv")["id"]])
+    # Sem invalidar, o índice ainda está dentro do TTL
+    assert names(index.get_files(TOKEN)) == ["a.csv", "b.xlsx"]
+    
+    index.invalidate()
+    assert names(index.get_files(TOKEN)) == ["b.xlsx", "c.parquet"]
+
+def test_ignora_itens_de_outras_pastas(manager, standin):
+    manager.upload_file("a.csv", b"a", TOKEN, fazer_backup=False)
+    index = FolderIndex(manager)
+    index.get_files(TOKEN)
+    standin.store.put("Outra pasta/x.csv", b"x")
+    manager.upload_file("b.txt", b"b", TOKEN, fazer_backup=False)
+    assert names(index.get_files(TOKEN, force_sync=True)) == ["a.csv"]
+
+def test_marcador_expirado_refaz_listagem(manager, standin):
+    manager.upload_file("a.csv", b"a", TOKEN, fazer_backup=False)
+    index = FolderIndex(manager)
+    index.get_files(TOKEN)
+    
+    manager.upload_file("b.csv", b"b", TOKEN, fazer_backup=False)
+    standin.store.delta_generation += 1
+    assert names(index.get_files(TOKEN, force_sync=True)) == ["a.csv", "b.csv"]
+    # O novo marcador volta a funcionar
+    manager.delete_files(TOKEN, [standin.store.find(f"{Config.PASTA}/b.csv")["id"]])
+    assert names(index.get_files(TOKEN, force_sync=True)) == ["a.csv"]
+
+def test_pasta_ainda_nao_criada_e_vazia(manager, standin):
+    index = FolderIndex(manager)
+    assert index.get_files(TOKEN) == []
+    assert manager.list_children(TOKEN) == []
+    
+    # O primeiro upload cria a pasta; a próxima sincronização passa a vê-la
+    manager.upload_file("a.csv", b"a", TOKEN, fazer_backup=False)
+    index.invalidate()
+    assert names(index.get_files(TOKEN)) == ["a.csv"]
+    manager.upload_file("b.csv", b"b", TOKEN, fazer_backup=False)
+    assert names(index.get_files(TOKEN, force_sync=True)) == ["a.csv", "b.csv"]
@@ -0,0 +1,17 @@
+from pipeline import MetricsRegistry
+
+def test_rotulos_escapados_no_formato_texto():
+    metrics = MetricsRegistry()
+    metrics.inc("upload_total", modo='multi\nplo "x"', status="erro\\fatal")
+    line = next(line for line in metrics.render().splitlines() if line.startswith("dsview_upload_total{"))
+    assert line == 'dsview_upload_total{modo="multi\\nplo \\"x\\"",status="erro\\\\fatal"} 1'
+
+def test_histograma_acumula_buckets():
+    metrics = MetricsRegistry(buckets=(1.0, 5.0))
+    metrics.observe("upload_seconds", 0.5, modo="individual")
+    metrics.observe("upload_seconds", 3.0, modo="individual")
+    lines = metrics.render().splitlines()
+    assert 'dsview_upload_seconds_bucket{modo="individual",le="1"} 1' in lines
+    assert 'dsview_upload_seconds_bucket{modo="individual",le="5"} 2' in lines
+    assert 'dsview_upload_seconds_bucket{modo="individual",le="+Inf"} 2' in lines
+    assert 'dsview_upload_seconds_count{modo="individual"} 2' in lines
@@ -0,0 +1,132 @@
+import base64
+import random
+
+from conftest import TOKEN, published
+from pipeline import AdaptiveConcurrencyLimiter, Config, quick_xor_hash
+
+def test_put_simples_informa_progresso(manager, standin):
+    calls = []
+    ok, status, _ = manager.upload_file("simples.csv", b"a;b\n1;2\n", TOKEN, fazer_backup=False,
+                                        progress_callback=lambda *args: calls.append(args))
+    assert ok and status == 201
+    assert calls[-1] == ("enviando", 8, 8)
+    assert published(standin, "simples.csv") == b"a;b\n1;2\n"
+
+def reference_quick_xor_hash(data):
+    """Definição do quickXorHash byte a byte: o byte i entra no bit (11 * i) mod 160"""
+    cell = 0
+    for i, value in enumerate(data):
+        shift = (i * 11) % 160
+        cell ^= ((value << shift) | (value >> (160 - shift))) & ((1 << 160) - 1)
+    digest = bytearray(cell.to_bytes(20, "little"))
+    for i, value in enumerate(len(data).to_bytes(8, "little")):
+        digest[12 + i] ^= value
+    return base64.b64encode(bytes(digest)).decode()
+
+def test_quick_xor_hash_confere_com_a_definicao():
+    assert quick_xor_hash(b"") == "AAAAAAAAAAAAAAAAAAAAAAAAAAA="
+    assert quick_xor_hash(b"J") == reference_quick_xor_hash(b"J")
+    rng = random.Random(7)
+    for size in (1, 159, 160, 161, 1000, 4099):
+        data = bytes(rng.getrandbits(8) for _ in range(size))
+        assert quick_xor_hash(data) == reference_quick_xor_hash(data)
+
+def test_conteudo_identico_nao_e_reenviado(manager, standin):
+    assert manager.upload_file("base.csv", b"a;b\n1;2\n", TOKEN)[1] == 201
+    etag = standin.store.find(f"{Config.PASTA}/base.csv")["etag"]
+    
+    ok, status, _ = manager.upload_file("base.csv", b"a;b\n1;2\n", TOKEN)
+    assert ok and status == 304
+    assert standin.store.find(f"{Config.PASTA}/base.csv")["etag"] == etag
+    assert not any("_backup_" in item["name"] for item in standin.store.items.values())
+
+def test_conteudo_alterado_vai_para_backup(manager, standin):
+    manager.upload_file("base.csv", b"a;b\n1;2\n", TOKEN)
+    ok, status, _ = manager.upload_file("base.csv", b"a;b\n3;4\n", TOKEN)
+    assert ok and status in (200, 201)
+    
+    backups = [item for item in standin.store.items.values() if item["name"].startswith("base_backup_")]
+    assert len(backups) == 1
+    assert backups[0]["content"] == b"a;b\n1;2\n"
+    assert published(standin, "base.csv") == b"a;b\n3;4\n"
+
+def test_put_repetido_apos_5xx_nao_faz_backup_do_proprio_upload(manager, standin, monkeypatch):
+    manager.upload_file("base.csv", b"a;b\n1;2\n", TOKEN)
+    session_request = manager.graph.session.request
+    failed = []
+    
+    def land_then_fail(method, url, **kwargs):
+        response = session_request(method, url, **kwargs)
+        if method == "PUT" and not failed:
+            # O primeiro PUT é gravado, mas a resposta se perde num 503
+            failed.append(response.status_code)
+            response.status_code = 503
+        return response
+    
+    monkeypatch.setattr(manager.graph.session, "request", land_then_fail)
+    ok, status, _ = manager.upload_file("base.csv", b"a;b\n3;4\n", TOKEN)
+    assert ok and status == 200 and failed == [201]
+    backups = [item["content"] for item in standin.store.items.values() if item["name"].startswith("base_backup_")]
+    assert backups == [b"a;b\n1;2\n"]
+    assert published(standin, "base.csv") == b"a;b\n3;4\n"
+
+def test_backup_nao_move_versao_diferente_da_lida(manager, standin):
+    manager.upload_file("base.csv", b"v1", TOKEN)
+    item = manager.get_item("base.csv", TOKEN)
+    standin.store.touch(standin.store.find(f"{Config.PASTA}/base.csv"))  # Alterado depois da leitura
+    
+    assert not manager.backup_existing_file("base.csv", TOKEN, item)
+    assert [item["name"] for item in standin.store.items.values()] == ["base.csv"]
+
+def test_sessao_de_upload_em_blocos(manager, standin, monkeypatch):
+    monkeypatch.setattr(Config, "SIMPLE_UPLOAD_MAX_BYTES", 1024)
+    monkeypatch.setattr(Config, "UPLOAD_CHUNK_UNIT_BYTES", 320)
+    monkeypatch.setattr(Config, "UPLOAD_CHUNK_MIN_BYTES", 320)
+    monkeypatch.setattr(Config, "UPLOAD_CHUNK_MAX_BYTES", 4 * 320)
+    standin.faults.configure(failure_rate=0.3, failure_status=503, match="PUT /upload/")
+    content = bytes(random.Random(3).getrandbits(8) for _ in range(10_000))
+    
+    calls = []
+    ok, status, _ = manager.upload_file("grande.bin", content, TOKEN, fazer_backup=False,
+                                        progress_callback=lambda *args: calls.append(args))
+    assert ok and status in (200, 201)
+    assert published(standin, "grande.bin") == content
+    assert len([call for call in calls if call[0] == "enviando"]) > 1
+    assert calls[-1] == ("enviando", len(content), len(content))
+    # O arquivo temporário da sessão foi renomeado para o destino
+    assert [item["name"] for item in standin.store.items.values()] == ["grande.bin"]
+
+def test_batch_renomeia_e_deleta(manager, standin):
+    for name in ("a.csv", "b.csv"):
+        manager.upload_file(name, name.encode(), TOKEN, fazer_backup=False)
+    a_id = standin.store.find(f"{Config.PASTA}/a.csv")["id"]
+    b_id = standin.store.find(f"{Config.PASTA}/b.csv")["id"]
+    
+    assert [r["status"] for r in manager.rename_files(TOKEN, {a_id: "c.csv"})] == [200]
+    assert [r["status"] for r in manager.delete_files(TOKEN, [b_id])] == [204]
+    assert sorted(item["name"] for item in standin.store.items.values()) == ["c.csv"]
+
+def test_batch_sem_resposta_vira_falha(manager, standin, monkeypatch):
+    manager.upload_file("a.csv", b"a", TOKEN, fazer_backup=False)
+    a_id = standin.store.find(f"{Config.PASTA}/a.csv")["id"]
+    request = manager.graph.request
+    
+    def drop_last_response(*args, **kwargs):
+        response = request(*args, **kwargs)
+        body = response.json()
+        body["responses"] = [item for item in body["responses"] if item["id"] != "1"]
+        response.json = lambda: body
+        return response
+    
+    monkeypatch.setattr(manager.graph, "request", drop_last_response)
+    results = manager.get_files_metadata(TOKEN, [a_id, a_id])
+    assert results[0]["status"] == 200
+    assert results[1]["status"] == 0 and "não retornou resposta" in results[1]["body"]
+
+def test_limitador_reduz_e_recupera():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=8)
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    for _ in range(4):
+        limiter.on_success()
+    assert limiter.limit == 5
@@ -0,0 +1,41 @@
+import logging
+
+import pandas as pd
+
+from pipeline import SpreadsheetReader
+
+def test_csv_com_milhar_nao_tenta_pyarrow(caplog):
+    data = 'A;B\n"1.234,50";x\n"2.000,00";y\n3,25;z\n'.encode("utf-8")
+    with caplog.at_level(logging.WARNING):
+        df, read_info = SpreadsheetReader.read_csv(data)
+    assert read_info["options"]["thousands"] == "."
+    assert read_info["engine"] == "c"
+    assert df["A"].tolist() == [1234.5, 2000.0, 3.25]
+    assert "falhou" not in caplog.text
+
+def test_csv_sem_milhar_mantem_preferencia():
+    options = SpreadsheetReader.sniff_csv(b"A;B\n1,5;x\n2,5;y\n")
+    assert "thousands" not in options
+    assert SpreadsheetReader.csv_engines(options) == SpreadsheetReader.csv_engines()
+
+def make_csv(rows=500):
+    lines = ["DATA;HORA;QTD;QTD_VAZIA;VALOR;NOME;FLAG"]
+    for i in range(rows):
+        vazia = "" if i % 7 == 0 and i > 300 else str(i)
+        data = "" if i % 11 == 0 else f"2024-01-{i % 28 + 1:02d}"
+        hora = f"{data} 10:00:00" if data else ""
+        lines.append(f"{data};{hora};{i};{vazia};{i},5;cliente {i % 13};{'True' if i % 2 else 'False'}")
+    return "\n".join(lines).encode("utf-8")
+
+def test_engines_retornam_os_mesmos_tipos(monkeypatch):
+    data = make_csv()
+    frames = []
+    for engine in ("pyarrow", "c"):
+        monkeypatch.setattr(SpreadsheetReader, "csv_engines", classmethod(lambda cls, options=None, engine=engine: [engine]))
+        frames.append(SpreadsheetReader.read_csv(data)[0])
+    pyarrow_df, c_df = frames
+    assert pyarrow_df.dtypes.to_dict() == c_df.dtypes.to_dict()
+    pd.testing.assert_frame_equal(pyarrow_df, c_df)
+    # Datas vazias continuam vazias (não viram o texto "None"/"NaT")
+    assert pyarrow_df["DATA"].isna().sum() == pyarrow_df["HORA"].isna().sum() == 46
+    assert pyarrow_df["DATA"].iloc[1] == "2024-01-02"
@@ -0,0 +1,26 @@
+import io
+import time
+
+import pandas as pd
+import pytest
+
+from pipeline import Config, SpreadsheetWriter
+
+def sample_frame():
+    return pd.DataFrame({
+        "LOJA": ["A", "B", None],
+        "VALOR": [1.5, None, 3.0],
+        "DATA FATURA": pd.to_datetime(["2024-01-05", None, "2024-02-10"])
+    })
+
+@pytest.mark.parametrize("fast_writer", [True, False])
+def test_mesmo_dataframe_gera_os_mesmos_bytes(monkeypatch, fast_writer):
+    monkeypatch.setattr(Config, "USE_FAST_WRITER", fast_writer)
+    first = SpreadsheetWriter.write_xlsx(sample_frame())
+    time.sleep(2.1)  # Datas no zip têm resolução de 2 segundos
+    second = SpreadsheetWriter.write_xlsx(sample_frame())
+    assert first == second
+    
+    df = pd.read_excel(io.BytesIO(second))
+    assert df["LOJA"].tolist()[:2] == ["A", "B"]
+    assert len(df) == 3
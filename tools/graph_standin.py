@@ -0,0 +1,600 @@
+"""
+Servidor local que imita os endpoints do Microsoft Graph e do Azure AD usados pelo app, para
+testes de carga de upload, backup e listagem sem tocar no tenant de produção.
+
+Um único drive em memória atende os caminhos /sites/{id}/drives/{id}/... e /users/{email}/drive/...:
+item por caminho (GET, PATCH, PUT content), children com paginação, itens por id (GET, PATCH,
+DELETE, content), sessões de upload, /delta e $batch. A mesma porta responde a descoberta OpenID
+e o endpoint de token, para o MSAL (que exige HTTPS: use --tls-cert/--tls-key).
+
+Latência, throttling (429 + Retry-After) e falhas são injetados por configuração, na linha de
+comando ou em tempo de execução via POST /_standin/faults.
+
+Uso:
+    python tools/graph_standin.py --port 8765 --latency-ms 80 --throttle-rate 0.05 --failure-rate 0.01
+    GRAPH_API_BASE=http://127.0.0.1:8765/v1.0 streamlit run app.py
+
+Com autenticação pelo MSAL (certificado autoassinado):
+    openssl req -x509 -newkey rsa:2048 -nodes -keyout key.pem -out cert.pem -days 30 \\
+        -subj /CN=localhost -addext subjectAltName=IP:127.0.0.1,DNS:localhost
+    python tools/graph_standin.py --tls-cert cert.pem --tls-key key.pem
+    GRAPH_API_BASE=https://127.0.0.1:8765/v1.0 GRAPH_AUTHORITY_BASE=https://127.0.0.1:8765 \\
+        GRAPH_CA_BUNDLE=cert.pem streamlit run app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import ssl
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+# Prefixo do drive nas URLs do app (com /v1.0) e nas sub-requisições do $batch (sem)
+DRIVE_PREFIX = r"(?:/v1\.0)?/(?:sites/[^/]+/drives/[^/]+|users/[^/]+/drive)"
+GRAPH_PATHS = ("/v1.0/", "/upload/", "/download/")
+DEFAULT_PAGE_SIZE = 200
+BATCH_MAX_REQUESTS = 20
+
+# (status, corpo JSON, headers extras, corpo binário)
+Response = Tuple[int, Any, Dict[str, str], Optional[bytes]]
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+def _json(status: int, body: Any = None, headers: Optional[Dict[str, str]] = None) -> Response:
+    return status, body, headers or {}, None
+
+def _error(status: int, code: str, message: str = "") -> Response:
+    return _json(status, {"error": {"code": code, "message": message or code}})
+
+class FaultInjector:
+    """
+    Latência, throttling e falhas sorteados por requisição. match (regex sobre "MÉTODO caminho")
+    restringe a injeção a algumas rotas, ex.: "PUT .*:/content" ou "POST .*/\\$batch".
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, throttle_rate: float = 0.0,
+                 retry_after: float = 1, failure_rate: float = 0.0, failure_status: int = 503,
+                 match: Optional[str] = None, seed: Optional[int] = None):
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.configure(latency_ms=latency_ms, jitter_ms=jitter_ms, throttle_rate=throttle_rate,
+                       retry_after=retry_after, failure_rate=failure_rate,
+                       failure_status=failure_status, match=match)
+
+    def configure(self, **settings):
+        with self.lock:
+            for name, value in settings.items():
+                if name not in ("latency_ms", "jitter_ms", "throttle_rate", "retry_after",
+                                "failure_rate", "failure_status", "match"):
+                    raise ValueError(f"Parâmetro de falha desconhecido: {name}")
+                setattr(self, name, value)
+            self._pattern = re.compile(self.match) if self.match else None
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "latency_ms": self.latency_ms, "jitter_ms": self.jitter_ms,
+            "throttle_rate": self.throttle_rate, "retry_after": self.retry_after,
+            "failure_rate": self.failure_rate, "failure_status": self.failure_status, "match": self.match
+        }
+
+    def _applies(self, method: str, path: str) -> bool:
+        return self._pattern is None or self._pattern.search(f"{method} {path}") is not None
+
+    def delay(self, method: str, path: str) -> float:
+        """Segundos de latência a simular para a requisição"""
+        with self.lock:
+            if not self._applies(method, path):
+                return 0.0
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            return max(self.latency_ms + jitter, 0.0) / 1000
+
+    def inject(self, method: str, path: str) -> Optional[Response]:
+        """Resposta de throttling ou falha sorteada para a requisição, ou None para seguir normalmente"""
+        with self.lock:
+            if not self._applies(method, path):
+                return None
+            draw = self.random.random()
+            if draw < self.throttle_rate:
+                response = _error(429, "activityLimitReached", "The request has been throttled")
+                response[2]["Retry-After"] = f"{self.retry_after:g}"
+                return response
+            if draw < self.throttle_rate + self.failure_rate:
+                return _error(self.failure_status, "serviceNotAvailable", "Falha injetada pelo stand-in")
+        return None
+
+class DriveStore:
+    """Arquivos do drive em memória; pastas existem implicitamente pelo caminho dos arquivos"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.items: Dict[str, Dict[str, Any]] = {}
+            self.sessions: Dict[str, Dict[str, Any]] = {}
+            # Log de mudanças do /delta: o token é "geração.posição no log"
+            self.changes: List[str] = []
+            self.delta_generation = 0
+
+    @staticmethod
+    def folder_id(folder: str) -> str:
+        return hashlib.md5(folder.strip("/").encode()).hexdigest()
+
+    def find(self, path: str) -> Optional[Dict[str, Any]]:
+        folder, _, name = path.strip("/").rpartition("/")
+        for item in self.items.values():
+            if item["folder"] == folder and item["name"] == name:
+                return item
+        return None
+
+    def subfolders(self, folder: str) -> List[str]:
+        prefix = folder.strip("/") + "/"
+        return sorted({item["folder"][len(prefix):].split("/")[0]
+                       for item in self.items.values() if item["folder"].startswith(prefix)})
+
+    def folder_exists(self, path: str) -> bool:
+        path = path.strip("/")
+        return any(item["folder"] == path or item["folder"].startswith(path + "/") for item in self.items.values())
+
+    def touch(self, item: Dict[str, Any]):
+        item.update(etag=f'"{uuid.uuid4().hex}"', modified=_now())
+        self.changes.append(item["id"])
+
+    def put(self, path: str, content: bytes) -> Dict[str, Any]:
+        item = self.find(path)
+        if item is None:
+            folder, _, name = path.strip("/").rpartition("/")
+            item = {"id": uuid.uuid4().hex, "folder": folder, "name": name}
+            self.items[item["id"]] = item
+        item["content"] = content
+        self.touch(item)
+        return item
+
+    def delete(self, item: Dict[str, Any]):
+        del self.items[item["id"]]
+        self.changes.append(item["id"])
+
+    def rename(self, item: Dict[str, Any], name: str, conflict: str) -> Optional[Response]:
+        """Aplica o novo nome seguindo o conflictBehavior; retorna a resposta de erro, se houver"""
+        other = self.find(f"{item['folder']}/{name}")
+        if other is not None and other is not item:
+            if conflict == "fail":
+                return _error(409, "nameAlreadyExists", "The specified item name already exists")
+            if conflict == "replace":
+                self.delete(other)
+            else:
+                stem, dot, ext = name.rpartition(".")
+                if not dot:
+                    stem, ext = name, ""
+                suffix = 1
+                while self.find(f"{item['folder']}/{stem} {suffix}{dot}{ext}"):
+                    suffix += 1
+                name = f"{stem} {suffix}{dot}{ext}"
+        item["name"] = name
+        return None
+
+    def metadata(self, item: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+        return {
+            "id": item["id"],
+            "name": item["name"],
+            "size": len(item["content"]),
+            "eTag": item["etag"],
+            "lastModifiedDateTime": item["modified"],
+            "file": {"hashes": {"sha256Hash": hashlib.sha256(item["content"]).hexdigest().upper()}},
+            "parentReference": {"id": self.folder_id(item["folder"]), "path": f"/drive/root:/{item['folder']}"},
+            "@microsoft.graph.downloadUrl": f"{base_url}/download/{item['id']}"
+        }
+
+    def folder_metadata(self, folder: str) -> Dict[str, Any]:
+        parent, _, name = folder.strip("/").rpartition("/")
+        return {
+            "id": self.folder_id(folder), "name": name, "folder": {"childCount": 0},
+            "parentReference": {"id": self.folder_id(parent), "path": f"/drive/root:/{parent}"}
+        }
+
+class GraphStandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Definidos pela subclasse criada em GraphStandIn
+    store: DriveStore
+    faults: FaultInjector
+    options: Dict[str, Any]
+    tokens: set
+    stats: Dict[str, int]
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def base_url(self) -> str:
+        scheme = "https" if isinstance(self.connection, ssl.SSLSocket) else "http"
+        return f"{scheme}://{self.headers['Host']}"
+
+    def _send(self, response: Response):
+        status, body, headers, raw = response
+        payload = raw if raw is not None else (json.dumps(body).encode() if body is not None else b"")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream" if raw is not None else "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _dispatch(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        parts = urlsplit(self.path)
+        path = unquote(parts.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+
+        if path.startswith("/_standin/"):
+            response = self.handle_control(self.command, path, body)
+        else:
+            # Latência fora do lock: requisições simultâneas esperam em paralelo, como no Graph
+            delay = self.faults.delay(self.command, path)
+            if delay:
+                time.sleep(delay)
+            # Throttling e falhas só nas rotas do Graph; a autoridade de tokens responde sempre
+            injected = self.faults.inject(self.command, path) if path.startswith(GRAPH_PATHS) else None
+            response = injected or self.route(self.command, path, query, body, self.headers)
+
+        with self.store.lock:
+            key = f"{self.command} {response[0]}"
+            self.stats[key] = self.stats.get(key, 0) + 1
+        self._send(response)
+
+    do_GET = do_PUT = do_POST = do_PATCH = do_DELETE = _dispatch
+
+    # --- Controle do stand-in ---
+    def handle_control(self, method: str, path: str, body: bytes) -> Response:
+        if path == "/_standin/faults" and method == "POST":
+            try:
+                self.faults.configure(**json.loads(body or b"{}"))
+            except (ValueError, TypeError, re.error) as e:
+                return _error(400, "invalidRequest", str(e))
+            return _json(200, self.faults.settings())
+        if path == "/_standin/faults" and method == "GET":
+            return _json(200, self.faults.settings())
+        if path == "/_standin/state" and method == "GET":
+            with self.store.lock:
+                return _json(200, {
+                    "items": len(self.store.items), "upload_sessions": len(self.store.sessions),
+                    "changes": len(self.store.changes), "requests": dict(self.stats),
+                    "faults": self.faults.settings()
+                })
+        if path == "/_standin/reset" and method == "POST":
+            self.store.reset()
+            with self.store.lock:
+                self.stats.clear()
+            return _json(204)
+        if path == "/_standin/expire-delta" and method == "POST":
+            # Invalida os tokens de /delta emitidos até agora (o próximo uso recebe 410)
+            with self.store.lock:
+                self.store.delta_generation += 1
+            return _json(204)
+        return _error(404, "itemNotFound", f"Controle desconhecido: {method} {path}")
+
+    # --- Roteamento ---
+    def route(self, method: str, path: str, query: Dict[str, str], body: bytes, headers) -> Response:
+        # Autoridade de tokens (descoberta OpenID e client credentials do MSAL)
+        match = re.fullmatch(r"/([^/]+)/v2\.0/\.well-known/openid-configuration", path)
+        if match and method == "GET":
+            return self.openid_configuration(match.group(1))
+        match = re.fullmatch(r"/([^/]+)/oauth2/v2\.0/token", path)
+        if match and method == "POST":
+            return self.issue_token(body)
+
+        # URLs pré-autenticadas (sessões de upload e download) dispensam o token
+        match = re.fullmatch(r"/upload/(\w+)", path)
+        if match:
+            with self.store.lock:
+                return self.upload_session(method, match.group(1), body, headers)
+        match = re.fullmatch(r"/download/(\w+)", path)
+        if match and method == "GET":
+            with self.store.lock:
+                item = self.store.items.get(match.group(1))
+                return (200, None, {}, item["content"]) if item else _error(404, "itemNotFound")
+
+        denied = self.check_auth(headers)
+        if denied:
+            return denied
+        if re.fullmatch(r"/v1\.0/\$batch", path) and method == "POST":
+            return self.batch(body, headers)
+        with self.store.lock:
+            return self.route_drive(method, path, query, body, headers)
+
+    def route_drive(self, method: str, path: str, query: Dict[str, str], body: bytes, headers) -> Response:
+        store = self.store
+
+        match = re.fullmatch(DRIVE_PREFIX + r"/root/delta", path)
+        if match and method == "GET":
+            return self.delta(path, query)
+
+        # Item pelo caminho: root:/pasta/arquivo[:/ação]
+        match = re.fullmatch(DRIVE_PREFIX + r"/root:/(.+?)(?::/(content|createUploadSession|children))?", path)
+        if match:
+            item_path, action = match.group(1).strip("/"), match.group(2)
+            item = store.find(item_path)
+            if action == "content" and method == "PUT":
+                if item is not None and query.get("@microsoft.graph.conflictBehavior") == "fail":
+                    return _error(409, "nameAlreadyExists", "The specified item name already exists")
+                return _json(200 if item else 201, store.metadata(store.put(item_path, body), self.base_url))
+            if action == "content" and method == "GET":
+                return (200, None, {}, item["content"]) if item else _error(404, "itemNotFound")
+            if action == "createUploadSession" and method == "POST":
+                session_id = uuid.uuid4().hex
+                store.sessions[session_id] = {"path": item_path, "data": bytearray()}
+                return _json(200, {"uploadUrl": f"{self.base_url}/upload/{session_id}",
+                                   "nextExpectedRanges": ["0-"]})
+            if action == "children" and method == "GET":
+                return self.children(path, item_path, query)
+            if action is None and method == "GET":
+                if item is not None:
+                    return _json(200, self.select(store.metadata(item, self.base_url), query))
+                if store.folder_exists(item_path):
+                    return _json(200, self.select(store.folder_metadata(item_path), query))
+                return _error(404, "itemNotFound", "The resource could not be found")
+            if action is None and method == "PATCH":
+                return self.patch(item, body, query, headers)
+            if action is None and method == "DELETE":
+                return self.delete(item, headers)
+            return _error(405, "notSupported", f"{method} não suportado em {path}")
+
+        # Item pelo id
+        match = re.fullmatch(DRIVE_PREFIX + r"/items/(\w+)(/content)?", path)
+        if match:
+            item = store.items.get(match.group(1))
+            if item is None:
+                return _error(404, "itemNotFound", "The resource could not be found")
+            if match.group(2):
+                return (200, None, {}, item["content"]) if method == "GET" else _error(405, "notSupported")
+            if method == "GET":
+                return _json(200, self.select(store.metadata(item, self.base_url), query))
+            if method == "PATCH":
+                return self.patch(item, body, query, headers)
+            if method == "DELETE":
+                return self.delete(item, headers)
+
+        return _error(400, "invalidRequest", f"Endpoint não suportado pelo stand-in: {method} {path}")
+
+    # --- Autenticação ---
+    def openid_configuration(self, tenant: str) -> Response:
+        authority = f"{self.base_url}/{tenant}"
+        return _json(200, {
+            "issuer": f"{authority}/v2.0",
+            "authorization_endpoint": f"{authority}/oauth2/v2.0/authorize",
+            "token_endpoint": f"{authority}/oauth2/v2.0/token",
+            "token_endpoint_auth_methods_supported": ["client_secret_post", "client_secret_basic"],
+            "response_types_supported": ["code", "token"],
+            "subject_types_supported": ["pairwise"],
+            "id_token_signing_alg_values_supported": ["RS256"]
+        })
+
+    def issue_token(self, body: bytes) -> Response:
+        form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        if form.get("grant_type") != "client_credentials":
+            return _json(400, {"error": "unsupported_grant_type",
+                               "error_description": "O stand-in só emite tokens de client credentials"})
+        token = f"standin-{uuid.uuid4().hex}"
+        with self.store.lock:
+            self.tokens.add(token)
+        return _json(200, {"token_type": "Bearer", "expires_in": self.options["token_expires_in"],
+                           "ext_expires_in": self.options["token_expires_in"], "access_token": token})
+
+    def check_auth(self, headers) -> Optional[Response]:
+        scheme, _, token = (headers.get("Authorization") or "").partition(" ")
+        if scheme != "Bearer" or not token:
+            return _error(401, "InvalidAuthenticationToken", "Access token is empty.")
+        if self.options["strict_auth"] and token not in self.tokens:
+            return _error(401, "InvalidAuthenticationToken", "Access token has expired or is not yet valid.")
+        return None
+
+    # --- Operações do drive ---
+    @staticmethod
+    def select(metadata: Dict[str, Any], query: Dict[str, str]) -> Dict[str, Any]:
+        if "$select" not in query:
+            return metadata
+        fields = {"id", *query["$select"].split(",")}
+        return {key: value for key, value in metadata.items() if key in fields}
+
+    def children(self, path: str, folder: str, query: Dict[str, str]) -> Response:
+        if "$filter" in query and (self.options["reject_filter"] or query["$filter"] != "file ne null"):
+            return _error(400, "invalidRequest", "Invalid filter clause")
+        store = self.store
+        entries = sorted(
+            [store.metadata(item, self.base_url) for item in store.items.values() if item["folder"] == folder] +
+            [store.folder_metadata(f"{folder}/{name}") for name in store.subfolders(folder)],
+            key=lambda entry: entry["name"].lower()
+        )
+        if query.get("$filter") == "file ne null":
+            entries = [entry for entry in entries if "file" in entry]
+
+        top = int(query.get("$top", DEFAULT_PAGE_SIZE))
+        offset = int(query.get("$skiptoken", 0))
+        page = {"value": [self.select(entry, query) for entry in entries[offset:offset + top]]}
+        if offset + top < len(entries):
+            next_query = {key: value for key, value in query.items() if key != "$skiptoken"}
+            page["@odata.nextLink"] = f"{self.base_url}{path}?{urlencode({**next_query, '$skiptoken': offset + top})}"
+        return _json(200, page)
+
+    def delta(self, path: str, query: Dict[str, str]) -> Response:
+        store = self.store
+        link = f"{self.base_url}{path}?{urlencode({'token': f'{store.delta_generation}.{len(store.changes)}'})}"
+        if query.get("token") == "latest":
+            return _json(200, {"value": [], "@odata.deltaLink": link})
+        try:
+            generation, position = map(int, query.get("token", f"{store.delta_generation}.0").split("."))
+        except ValueError:
+            return _error(400, "invalidRequest", "Invalid delta token")
+        if generation != store.delta_generation:
+            return _error(410, "resyncRequired", "Resync required. Replace any local items with the server's version")
+        # Cada item aparece uma vez, com o estado atual
+        entries = [
+            self.select(store.metadata(store.items[item_id], self.base_url), query)
+            if item_id in store.items else {"id": item_id, "deleted": {"state": "deleted"}}
+            for item_id in dict.fromkeys(store.changes[position:])
+        ]
+        return _json(200, {"value": entries, "@odata.deltaLink": link})
+
+    def patch(self, item: Optional[Dict[str, Any]], body: bytes, query: Dict[str, str], headers) -> Response:
+        if item is None:
+            return _error(404, "itemNotFound", "The resource could not be found")
+        if headers.get("If-Match") and headers["If-Match"] != item["etag"]:
+            return _error(412, "preconditionFailed", "ETag does not match current item's value")
+        try:
+            changes = json.loads(body or b"{}")
+        except ValueError:
+            return _error(400, "invalidRequest", "Invalid JSON body")
+        if "parentReference" in changes:
+            destination = changes["parentReference"].get("path", "")
+            if "root:" not in destination:
+                return _error(400, "invalidRequest", "parentReference.path inválido")
+            item["folder"] = destination.split("root:", 1)[1].strip("/")
+        if "name" in changes:
+            error = self.store.rename(item, changes["name"], query.get("@microsoft.graph.conflictBehavior", "fail"))
+            if error:
+                return error
+        self.store.touch(item)
+        return _json(200, self.store.metadata(item, self.base_url))
+
+    def delete(self, item: Optional[Dict[str, Any]], headers) -> Response:
+        if item is None:
+            return _error(404, "itemNotFound", "The resource could not be found")
+        if headers.get("If-Match") and headers["If-Match"] != item["etag"]:
+            return _error(412, "preconditionFailed", "ETag does not match current item's value")
+        self.store.delete(item)
+        return _json(204)
+
+    def upload_session(self, method: str, session_id: str, body: bytes, headers) -> Response:
+        store = self.store
+        session = store.sessions.get(session_id)
+        if session is None:
+            return _error(404, "itemNotFound", "Upload session not found")
+        if method == "DELETE":
+            del store.sessions[session_id]
+            return _json(204)
+        if method == "GET":
+            return _json(200, {"nextExpectedRanges": [f"{len(session['data'])}-"]})
+        if method != "PUT":
+            return _error(405, "notSupported")
+        match = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+)", headers.get("Content-Range") or "")
+        if match is None:
+            return _error(400, "invalidRequest", "Content-Range ausente ou inválido")
+        first, last, total = map(int, match.groups())
+        if first != len(session["data"]) or last - first + 1 != len(body):
+            return _error(416, "invalidRange", "The uploaded fragment overlaps with data that has already been received")
+        session["data"] += body
+        if len(session["data"]) < total:
+            return _json(202, {"nextExpectedRanges": [f"{len(session['data'])}-"]})
+        del store.sessions[session_id]
+        item = store.put(session["path"], bytes(session["data"]))
+        return _json(201, store.metadata(item, self.base_url))
+
+    def batch(self, body: bytes, headers) -> Response:
+        try:
+            requests_ = json.loads(body or b"{}")["requests"]
+        except (ValueError, KeyError):
+            return _error(400, "invalidRequest", "Invalid batch payload")
+        if len(requests_) > BATCH_MAX_REQUESTS:
+            return _error(400, "invalidRequest", f"A batch can contain at most {BATCH_MAX_REQUESTS} requests")
+
+        responses = []
+        for request in requests_:
+            parts = urlsplit(request["url"])
+            path = unquote(parts.path)
+            query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+            sub_headers = {**(request.get("headers") or {}), "Authorization": headers.get("Authorization")}
+            payload = json.dumps(request["body"]).encode() if "body" in request else b""
+            # Throttling e falhas também atingem operações individuais dentro do lote
+            response = self.faults.inject(request["method"], path)
+            if response is None:
+                with self.store.lock:
+                    response = self.route_drive(request["method"], path, query, payload, sub_headers)
+            status, result, extra_headers, raw = response
+            responses.append({"id": request["id"], "status": status, "headers": extra_headers,
+                              "body": result if raw is None else None})
+        return _json(200, {"responses": responses})
+
+class GraphStandIn:
+    """Sobe o servidor numa thread; graph_base e authority_base vão em Config.GRAPH_API_BASE/AUTHORITY_BASE"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, faults: Optional[FaultInjector] = None,
+                 tls_cert: Optional[str] = None, tls_key: Optional[str] = None, strict_auth: bool = False,
+                 reject_filter: bool = False, token_expires_in: int = 3600):
+        self.store = DriveStore()
+        self.faults = faults or FaultInjector()
+        handler = type("Handler", (GraphStandInHandler,), {
+            "store": self.store, "faults": self.faults, "tokens": set(), "stats": {},
+            "options": {"strict_auth": strict_auth, "reject_filter": reject_filter,
+                        "token_expires_in": token_expires_in}
+        })
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.scheme = "http"
+        if tls_cert:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(tls_cert, tls_key)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+            self.scheme = "https"
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"{self.scheme}://{host}:{port}"
+
+    @property
+    def graph_base(self) -> str:
+        return f"{self.url}/v1.0"
+
+    @property
+    def authority_base(self) -> str:
+        return self.url
+
+    def start(self) -> "GraphStandIn":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="latência adicionada a cada requisição")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="variação aleatória (±) da latência")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fração de respostas 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="segundos no header Retry-After dos 429")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fração de respostas de falha")
+    parser.add_argument("--failure-status", type=int, default=503, help="status HTTP das falhas injetadas")
+    parser.add_argument("--fault-match", help='regex sobre "MÉTODO caminho" que limita a injeção')
+    parser.add_argument("--seed", type=int, help="semente do sorteio de falhas (execuções reproduzíveis)")
+    parser.add_argument("--reject-filter", action="store_true", help="responde 400 a $filter na listagem")
+    parser.add_argument("--strict-auth", action="store_true", help="aceita só tokens emitidos pelo stand-in")
+    parser.add_argument("--token-expires-in", type=int, default=3600)
+    parser.add_argument("--tls-cert", help="certificado PEM (HTTPS, necessário para o MSAL)")
+    parser.add_argument("--tls-key", help="chave privada PEM do certificado")
+    args = parser.parse_args()
+
+    faults = FaultInjector(args.latency_ms, args.jitter_ms, args.throttle_rate, args.retry_after,
+                           args.failure_rate, args.failure_status, args.fault_match, args.seed)
+    standin = GraphStandIn(args.host, args.port, faults, args.tls_cert, args.tls_key,
+                           args.strict_auth, args.reject_filter, args.token_expires_in)
+    print(f"Graph stand-in em {standin.graph_base} (autoridade: {standin.authority_base})")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        standin.server.server_close()
+
+if __name__ == "__main__":
+    main()